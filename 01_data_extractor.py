@@ -1,8 +1,16 @@
-import win32com.client
 import pandas as pd
 import re
 import datetime
+import hashlib
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import feature_store
+import mailbox_access
+import pipeline
+import profiling
+import raw_archive
 
 # --- ⚙️ CONFIGURACIÓN MASIVA ---
 MI_EMAIL_CORPORATIVO = "wllana@unibanca.pe"
@@ -10,9 +18,35 @@ MI_NOMBRE_MOSTRAR = "Walter Llana"
 DIAS_HISTORIAL = 365  # ¡EXTRAER 1 AÑO COMPLETO!
 DIAS_PARA_IGNORADO = 7
 SEPARADOR_CSV = "|"
+EXTRAER_CUERPO = True  # Cuerpo_Snippet no se usa como feature: False ahorra la lectura del cuerpo
+MAX_CHARS_CUERPO = 500
+FACTOR_HOLGURA_CUERPO = 2  # Se lee el doble en crudo: la limpieza elimina caracteres
+TAMANO_LOTE = 64  # Correos por tarea de limpieza (pipeline.N_TRABAJADORES hilos)
+ARCHIVO_DATASET = "dataset_masivo.csv"
+
+# --- 🗜️ ARCHIVO CRUDO ---
+# Las propiedades leídas de Outlook se guardan comprimidas (raw_archive.py): un cambio en la
+# limpieza, la audiencia o el ground truth se re-deriva con --desde-archivo sin volver a Outlook.
+GUARDAR_ARCHIVO_CRUDO = True
+N_PROCESOS_DERIVACION = None  # None = todos los núcleos; 0 = en este proceso
 
 # MAPI Tags
 MAPI_LAST_VERB = "http://schemas.microsoft.com/mapi/proptag/0x10810003"
+MAPI_INTERNET_MESSAGE_ID = "http://schemas.microsoft.com/mapi/proptag/0x1035001F"
+PR_BODY_W = 0x1000001F
+IID_IMESSAGE = "{00020307-0000-0000-C000-000000000046}"
+IID_ISTREAM = "{0000000C-0000-0000-C000-000000000046}"
+_mapi_inicializado = False
+# Instante de referencia del ground truth ("ignorado" = no leído hace DIAS_PARA_IGNORADO días):
+# el de la extracción, también al re-derivar desde el archivo crudo
+_momento_extraccion = None
+# Identidad del buzón extraído: al re-derivar manda la guardada en el archivo crudo
+IDENTIDAD = ("MI_EMAIL_CORPORATIVO", "MI_NOMBRE_MOSTRAR")
+
+def reglas_derivacion():
+    """Entradas de la derivación que no vienen del correo (se guardan en el archivo crudo)"""
+    return {"MI_EMAIL_CORPORATIVO": MI_EMAIL_CORPORATIVO, "MI_NOMBRE_MOSTRAR": MI_NOMBRE_MOSTRAR,
+            "DIAS_PARA_IGNORADO": DIAS_PARA_IGNORADO, "MAX_CHARS_CUERPO": MAX_CHARS_CUERPO}
 
 def limpiar_texto(texto):
     """Limpieza profunda: Emojis, URLs y caracteres raros"""
@@ -26,19 +60,51 @@ def limpiar_texto(texto):
     texto = re.sub(r'[\n\r\t|]', ' ', texto)
     return re.sub(' +', ' ', texto).strip()
 
-def obtener_info_remitente(item):
+def _inicializar_mapi():
+    """Extended MAPI (pywin32) se inicializa una sola vez por proceso"""
+    global _mapi_inicializado
+    if _mapi_inicializado: return
+    _mapi_inicializado = True
+    try:
+        from win32com.mapi import mapi
+        mapi.MAPIInitialize(None)
+    except Exception: pass
+
+def leer_prefijo_cuerpo(item, max_chars=MAX_CHARS_CUERPO * FACTOR_HOLGURA_CUERPO):
+    """Lee solo los primeros `max_chars` caracteres del cuerpo.
+    Abre PR_BODY_W como IStream y lee un prefijo acotado, en lugar de traer por COM
+    el cuerpo completo (hilos HTML gigantes, newsletters). Si el stream no está
+    disponible se recurre a item.Body."""
+    try:
+        _inicializar_mapi()
+        mensaje = item.MAPIOBJECT.QueryInterface(IID_IMESSAGE)
+        stream = mensaje.OpenProperty(PR_BODY_W, IID_ISTREAM, 0, 0)
+        return stream.Read(max_chars * 2).decode("utf-16-le", errors="ignore")  # UTF-16: 2 bytes/char
+    except Exception:
+        try: return (item.Body or "")[:max_chars]
+        except: return ""
+
+def calcular_huella(item, fecha):
+    """Huella estable del contenido: Internet Message-ID, o remitente+asunto+minuto normalizados.
+    Identifica la misma pieza de correo copiada en varias carpetas o duplicada por reglas."""
+    try:
+        mid = item.PropertyAccessor.GetProperty(MAPI_INTERNET_MESSAGE_ID)
+        if mid: return "m" + hashlib.sha1(mid.strip().encode("utf-8")).hexdigest()[:20]
+    except: pass
+    remitente = (item.SenderEmailAddress or item.SenderName or "").strip().lower()
+    asunto = " ".join((item.Subject or "").lower().split())
+    clave = f"{remitente}|{asunto}|{fecha:%Y-%m-%d %H:%M}"
+    return "h" + hashlib.sha1(clave.encode("utf-8")).hexdigest()[:20]
+
+def obtener_info_remitente(crudo):
     email_final = "desconocido"
     nombre_final = "desconocido"
     dominio = "interno"
     try:
-        nombre_final = item.SenderName
-        direccion = item.SenderEmailAddress
+        nombre_final = crudo["nombre"]
+        direccion = crudo["direccion"]
         if direccion and "/o=" in direccion.lower():
-            try:
-                ex_user = item.Sender.GetExchangeUser()
-                if ex_user: email_final = ex_user.PrimarySmtpAddress.lower()
-                else: email_final = nombre_final.lower()
-            except: email_final = nombre_final.lower()
+            email_final = crudo["smtp_exchange"].lower() if crudo["smtp_exchange"] else nombre_final.lower()
         else:
             email_final = direccion.lower() if direccion else nombre_final.lower()
         
@@ -47,50 +113,127 @@ def obtener_info_remitente(item):
     except: pass
     return email_final, dominio, nombre_final
 
-def analizar_audiencia(item):
+def analizar_audiencia(crudo):
     estoy_en_to = 0
     estoy_en_cc = 0
-    total = 0
-    try:
-        recipients = item.Recipients
-        total = recipients.Count
-        mi_email = MI_EMAIL_CORPORATIVO.lower()
-        mi_nombre = MI_NOMBRE_MOSTRAR.lower()
-        
-        # Analizamos primeros 50 destinatarios
-        for i, r in enumerate(recipients):
-            if i > 50: break 
-            try:
-                addr = r.Address.lower() if r.Address else ""
-                name = r.Name.lower() if r.Name else ""
-                soy_yo = (mi_email in addr) or (mi_nombre in name)
-                
-                if soy_yo:
-                    if r.Type == 1: estoy_en_to = 1
-                    elif r.Type == 2: estoy_en_cc = 1
-            except: pass
-    except: pass
-    return estoy_en_to, estoy_en_cc, total
+    mi_email = MI_EMAIL_CORPORATIVO.lower()
+    mi_nombre = MI_NOMBRE_MOSTRAR.lower()
+    for addr, name, tipo in crudo["destinatarios"]:
+        try:
+            addr = addr.lower() if addr else ""
+            name = name.lower() if name else ""
+            soy_yo = (mi_email in addr) or (mi_nombre in name)
+            
+            if soy_yo:
+                if tipo == 1: estoy_en_to = 1
+                elif tipo == 2: estoy_en_cc = 1
+        except: pass
+    return estoy_en_to, estoy_en_cc, crudo["total_destinatarios"]
 
-def verificar_accion_realizada(item):
-    try:
-        verb = item.PropertyAccessor.GetProperty(MAPI_LAST_VERB)
-        if verb in [102, 103]: return 1 
-        if verb == 104: return 2
-    except: pass
+def verificar_accion_realizada(verb):
+    if verb in [102, 103]: return 1 
+    if verb == 104: return 2
     return 0
 
-def calcular_ground_truth(item, accion_realizada):
+def calcular_ground_truth(crudo, accion_realizada):
     if accion_realizada > 0: return 2
     try:
-        if item.UnRead:
-            fecha = item.ReceivedTime.replace(tzinfo=None)
-            if (datetime.datetime.now() - fecha).days >= DIAS_PARA_IGNORADO:
+        if crudo["no_leido"]:
+            ahora = _momento_extraccion or mailbox_access.ahora().replace(tzinfo=None)
+            if (ahora - crudo["fecha"]).days >= DIAS_PARA_IGNORADO:
                 return 0
     except: pass
     return 1
 
-def procesar_carpeta_recursiva(carpeta, lista_datos, ruta_actual, fecha_limite):
+def fusionar_duplicado(duplicado, registro):
+    """La fila canónica acumula la multiplicidad y conserva la acción más fuerte entre copias"""
+    registro["Multiplicidad_Carpetas"] += 1
+    if duplicado["TARGET_IA"] > registro["TARGET_IA"]:
+        for campo in ("TARGET_IA", "Estado_Lectura", "Accion_Detectada"):
+            registro[campo] = duplicado[campo]
+
+# --- 🧵 ETAPAS DEL PIPELINE ---
+def leer_crudo(item, fecha, huella, carpeta, duplicado, extraer_cuerpo, ruta=""):
+    """Etapa COM (hilo STA): solo lecturas de propiedades, sin limpieza ni cálculos.
+    De una copia duplicada basta con lo necesario para fusionar su acción."""
+    crudo = {"fecha": fecha, "huella": huella, "duplicado": duplicado, "no_leido": item.UnRead, "verbo": None}
+    try: crudo["verbo"] = item.PropertyAccessor.GetProperty(MAPI_LAST_VERB)
+    except: pass
+    if duplicado: return crudo
+
+    crudo.update({"carpeta": carpeta, "ruta": ruta, "nombre": "desconocido", "direccion": None, "smtp_exchange": None,
+                  "destinatarios": [], "total_destinatarios": 0, "entry_id": ""})
+    try: crudo["entry_id"] = item.EntryID  # Para aplicar categorías después (04_backfill_scorer)
+    except: pass
+    try:
+        crudo["nombre"] = item.SenderName
+        crudo["direccion"] = item.SenderEmailAddress
+        if crudo["direccion"] and "/o=" in crudo["direccion"].lower():
+            try:
+                ex_user = item.Sender.GetExchangeUser()
+                if ex_user: crudo["smtp_exchange"] = ex_user.PrimarySmtpAddress
+            except: pass
+    except: pass
+    try:
+        recipients = item.Recipients
+        crudo["total_destinatarios"] = recipients.Count
+        # Analizamos primeros 50 destinatarios
+        for i, r in enumerate(recipients):
+            if i > 50: break
+            try: crudo["destinatarios"].append((r.Address, r.Name, r.Type))
+            except: pass
+    except: pass
+    crudo["asunto"] = item.Subject
+    crudo["cuerpo"] = leer_prefijo_cuerpo(item) if extraer_cuerpo else ""
+    return crudo
+
+def derivar_registro(crudo):
+    """Etapa CPU (trabajadores): limpieza de texto y columnas derivadas"""
+    accion = verificar_accion_realizada(crudo["verbo"])
+    registro = {
+        "TARGET_IA": calcular_ground_truth(crudo, accion),
+        "Estado_Lectura": "No Leído" if crudo["no_leido"] else "Leído",
+        "Accion_Detectada": "Respondido" if accion==1 else ("Reenviado" if accion==2 else "Ninguna"),
+        "Huella": crudo["huella"],
+    }
+    if crudo["duplicado"]: return registro
+
+    email, dominio, nombre = obtener_info_remitente(crudo)
+    en_to, en_cc, total_recip = analizar_audiencia(crudo)
+    return {
+        "Remitente_ID": email,
+        "Dominio": dominio,
+        "Nombre_Mostrar": limpiar_texto(nombre),
+        "Asunto": limpiar_texto(crudo["asunto"]),
+        "Cuerpo_Snippet": limpiar_texto(crudo["cuerpo"])[:MAX_CHARS_CUERPO],
+        "Estoy_En_To": en_to,
+        "Estoy_En_CC": en_cc,
+        "Total_Destinatarios": total_recip,
+        "Carpeta_Origen": limpiar_texto(crudo["carpeta"]),
+        "Estado_Lectura": registro["Estado_Lectura"],
+        "Fecha_Recepcion": crudo["fecha"].strftime("%Y-%m-%d %H:%M"),
+        "Accion_Detectada": registro["Accion_Detectada"],
+        "TARGET_IA": registro["TARGET_IA"],
+        "Huella": crudo["huella"],
+        "Entry_ID": crudo["entry_id"],
+        "Multiplicidad_Carpetas": 1
+    }
+
+def consolidar(resultados):
+    """Etapa final: orden de lectura original + fusión de copias en su fila canónica"""
+    lista_datos, indice = [], {}
+    for _, registro in sorted(resultados, key=lambda r: r[0]):
+        huella = registro["Huella"]
+        if huella in indice: fusionar_duplicado(registro, lista_datos[indice[huella]])
+        elif "Remitente_ID" in registro:
+            indice[huella] = len(lista_datos)
+            lista_datos.append(registro)
+    return lista_datos
+
+def leer_carpeta_recursiva(carpeta, tuberia, ruta_actual, fecha_limite, extraer_cuerpo=True, vistas=None,
+                           archivo=None):
+    """Recorre el árbol en el hilo STA y alimenta el pipeline con propiedades crudas"""
+    if vistas is None: vistas = set()  # huellas ya leídas (las copias solo leen su acción)
     nombre_carpeta = carpeta.Name
     ruta_completa = f"{ruta_actual} > {nombre_carpeta}" if ruta_actual else nombre_carpeta
     
@@ -108,6 +251,7 @@ def procesar_carpeta_recursiva(carpeta, lista_datos, ruta_actual, fecha_limite):
         local_count = 0
         
         for item in items:
+            if tuberia.cancelada: return
             # OPTIMIZACIÓN: No leer todo, solo mails
             if item.Class != 43: continue
             
@@ -120,25 +264,18 @@ def procesar_carpeta_recursiva(carpeta, lista_datos, ruta_actual, fecha_limite):
                 if fecha_item < fecha_limite:
                     break 
 
-                email, dominio, nombre = obtener_info_remitente(item)
-                en_to, en_cc, total_recip = analizar_audiencia(item)
-                accion = verificar_accion_realizada(item)
-                target = calcular_ground_truth(item, accion)
-                
-                lista_datos.append({
-                    "Remitente_ID": email,
-                    "Dominio": dominio,
-                    "Nombre_Mostrar": limpiar_texto(nombre),
-                    "Asunto": limpiar_texto(item.Subject),
-                    "Cuerpo_Snippet": limpiar_texto(item.Body)[:500],
-                    "Estoy_En_To": en_to,
-                    "Estoy_En_CC": en_cc,
-                    "Total_Destinatarios": total_recip,
-                    "Carpeta_Origen": limpiar_texto(nombre_carpeta),
-                    "Estado_Lectura": "No Leído" if item.UnRead else "Leído",
-                    "Accion_Detectada": "Respondido" if accion==1 else ("Reenviado" if accion==2 else "Ninguna"),
-                    "TARGET_IA": target
-                })
+                huella = calcular_huella(item, fecha_item)
+                duplicado = huella in vistas
+                vistas.add(huella)
+                crudo = leer_crudo(item, fecha_item, huella, nombre_carpeta, duplicado, extraer_cuerpo,
+                                   ruta_completa)
+                # El número de lectura es el contexto: consolidar() restaura el orden del recorrido
+                tuberia.enviar(crudo, tuberia.secuencia)
+                if archivo is not None:
+                    # Un fallo al archivar no le quita la fila al dataset: se cuenta y cerrar() avisa
+                    try: archivo.agregar(crudo)
+                    except Exception: archivo.fallidos += 1
+                if duplicado: continue
                 local_count += 1
                 
                 # Feedback visual cada 100 correos para que sepas que sigue vivo
@@ -148,35 +285,128 @@ def procesar_carpeta_recursiva(carpeta, lista_datos, ruta_actual, fecha_limite):
             except Exception as e: pass
             
         print(f"   ✅ Terminada carpeta {nombre_carpeta}: {local_count} registros.")
+        profiling.marca_carpeta(ruta_completa)
 
         # Recursividad
         for sub in carpeta.Folders:
-            procesar_carpeta_recursiva(sub, lista_datos, ruta_completa, fecha_limite)
+            if tuberia.cancelada: return
+            leer_carpeta_recursiva(sub, tuberia, ruta_completa, fecha_limite, extraer_cuerpo, vistas, archivo)
             
     except Exception as e:
         print(f"⚠️ Error carpeta {nombre_carpeta}: {e}")
 
-def generar_dataset_masivo(dias=None):
+def procesar_carpeta_recursiva(carpeta, lista_datos, ruta_actual, fecha_limite, extraer_cuerpo=True, archivo=None,
+                               cancelar=None):
+    """Extrae el subárbol de `carpeta` y agrega sus filas (ya deduplicadas) a lista_datos"""
+    resultados = []
+    with pipeline.Pipeline("extraccion", lambda crudos: [derivar_registro(c) for c in crudos],
+                           lambda orden, registro: resultados.append((orden, registro)),
+                           tamano_lote=TAMANO_LOTE, cancelar=cancelar) as tuberia:
+        leer_carpeta_recursiva(carpeta, tuberia, ruta_actual, fecha_limite, extraer_cuerpo, archivo=archivo)
+    lista_datos.extend(consolidar(resultados))
+    return not tuberia.cancelada
+
+@profiling.perfilable("extraccion")
+def generar_dataset_masivo(dias=None, extraer_cuerpo=None, cancelar=None):
+    """`cancelar`: threading.Event de esta ejecución (botón Detener de la vista de configuración)"""
+    global _momento_extraccion
     if dias is None: dias = DIAS_HISTORIAL
+    if extraer_cuerpo is None: extraer_cuerpo = EXTRAER_CUERPO
     
     print("--- 🚀 DATA MINING MASIVO ---")
-    print(f"📅 Fecha límite: {(datetime.datetime.now() - datetime.timedelta(days=dias)).date()}")
+    outlook = profiling.envolver_com(mailbox_access.abrir_outlook().GetNamespace("MAPI"), "Namespace")
+    # Después de abrir: al grabar, el reloj es el de la grabación (el mismo que al reproducir)
+    ahora = mailbox_access.ahora().replace(tzinfo=None)
+    print(f"📅 Fecha límite: {(ahora - datetime.timedelta(days=dias)).date()}")
+    if not extraer_cuerpo: print("✂️ Extracción de cuerpo desactivada (Cuerpo_Snippet vacío)")
     
-    outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
     inbox = outlook.GetDefaultFolder(6) 
     
     # Calcular fecha de corte
-    fecha_limite = datetime.datetime.now() - datetime.timedelta(days=dias)
-    
-    datos_totales = []
-    procesar_carpeta_recursiva(inbox, datos_totales, "", fecha_limite)
+    fecha_limite = ahora - datetime.timedelta(days=dias)
+    _momento_extraccion = ahora
+    archivo = raw_archive.EscritorArchivo({"extraido": ahora, "dias": dias, "extraer_cuerpo": extraer_cuerpo,
+                                           "reglas": reglas_derivacion()}) if GUARDAR_ARCHIVO_CRUDO else None
     
+    datos_totales, completo = [], False
+    try:
+        completo = procesar_carpeta_recursiva(inbox, datos_totales, "", fecha_limite, extraer_cuerpo, archivo,
+                                              cancelar)
+    finally:
+        _momento_extraccion = None
+        # Interrumpida: el archivo crudo anterior se conserva junto con el dataset anterior
+        if archivo is not None: archivo.cerrar(completo)
+    mailbox_access.finalizar()
+    if not completo:
+        print(f"⏹️ Extracción detenida: {len(datos_totales)} registros leídos, dataset anterior conservado.")
+        return
+    guardar_dataset(datos_totales)
+    if archivo is not None: print(raw_archive.resumen())
+
+def guardar_dataset(datos_totales):
     df = pd.DataFrame(datos_totales)
-    archivo = "dataset_masivo.csv"
+    archivo = ARCHIVO_DATASET
     df.to_csv(archivo, index=False, sep=SEPARADOR_CSV, encoding='utf-8-sig')
     
     print(f"\n✅ Dataset generado: {archivo}")
     print(f"📊 Registros totales: {len(df)}")
+    if len(df):
+        print(f"♻️ Copias duplicadas fusionadas: {int(df['Multiplicidad_Carpetas'].sum()) - len(df)}")
+        almacen = feature_store.construir_desde_dataset(df)
+        almacen.guardar()
+        print(f"🗃️ Almacén de features actualizado: {len(almacen.remitentes)} remitentes, "
+              f"{len(almacen.dominios)} dominios ({feature_store.ARCHIVO_ALMACEN})")
+
+# --- 🗜️ RE-DERIVACIÓN DESDE EL ARCHIVO CRUDO ---
+def _inicializar_derivacion(momento, reglas):
+    """También en cada trabajador: con spawn (Windows) re-importan el módulo con los valores por defecto"""
+    global _momento_extraccion
+    _momento_extraccion = momento
+    globals().update(reglas)
+
+def derivar_bloque(bloque):
+    """Trabajador: descomprime un bloque y deriva sus filas con la lógica actual"""
+    return [derivar_registro(crudo) for crudo in raw_archive.leer_bloque(bloque)]
+
+def rederivar_dataset(n_procesos=None):
+    """Reconstruye dataset_masivo.csv (y el almacén) desde el archivo crudo, sin Outlook"""
+    print("--- 🗜️ RE-DERIVANDO EL DATASET DESDE EL ARCHIVO CRUDO ---")
+    contenido = raw_archive.leer_indice()
+    if contenido is None:
+        print(f"❌ No hay archivo crudo ({raw_archive.ARCHIVO_CRUDO}): ejecuta primero la extracción.")
+        return
+    meta, bloques = contenido
+    if n_procesos is None:
+        n_procesos = N_PROCESOS_DERIVACION if N_PROCESOS_DERIVACION is not None else os.cpu_count()
+    print(raw_archive.resumen())
+    print(f"📅 Extracción del {meta['extraido']:%Y-%m-%d %H:%M} ({meta['dias']} días) | "
+          f"{n_procesos or 1} proceso(s)")
+    # Identidad: la del buzón extraído. Reglas (días, recorte): las actuales, que es lo que se re-deriva
+    previas = reglas_derivacion()
+    reglas = {**previas, **{k: v for k, v in meta.get("reglas", {}).items() if k in IDENTIDAD}}
+    cambios = [f"{k} {v} -> {reglas[k]}" for k, v in meta.get("reglas", {}).items()
+               if k not in IDENTIDAD and v != reglas.get(k)]
+    print(f"👤 Buzón de {reglas['MI_EMAIL_CORPORATIVO']}" + (f" | reglas: {', '.join(cambios)}" if cambios else ""))
+
+    inicio = time.perf_counter()
+    if n_procesos:
+        with ProcessPoolExecutor(n_procesos, initializer=_inicializar_derivacion,
+                                 initargs=(meta["extraido"], reglas)) as pool:
+            por_bloque = list(pool.map(derivar_bloque, bloques))
+    else:
+        _inicializar_derivacion(meta["extraido"], reglas)
+        try: por_bloque = [derivar_bloque(b) for b in bloques]
+        finally: _inicializar_derivacion(None, previas)
+    # Mismo orden de lectura que la extracción original: consolidar() fusiona las copias igual
+    registros = [registro for bloque in por_bloque for registro in bloque]
+    print(f"⏱️ {len(registros)} crudos derivados en {time.perf_counter() - inicio:.1f}s")
+    guardar_dataset(consolidar(list(enumerate(registros))))
 
 if __name__ == "__main__":
-    generar_dataset_masivo()
\ No newline at end of file
+    profiling.ACTIVO = "--perfilar" in sys.argv
+    mailbox_access.configurar_desde_argv(sys.argv)
+    if "--desde-archivo" in sys.argv:
+        procesos = int(sys.argv[sys.argv.index("--procesos") + 1]) if "--procesos" in sys.argv else None
+        rederivar_dataset(procesos)
+    else:
+        generar_dataset_masivo(extraer_cuerpo=False if "--sin-cuerpo" in sys.argv else None)
@@ -1,19 +1,57 @@
 import pandas as pd
+import numpy as np
 import joblib
-from catboost import CatBoostClassifier
-from sklearn.feature_extraction.text import TfidfVectorizer
+import hashlib
+import json
+import os
+import sys
+import time
+from scipy import sparse
+from joblib import Parallel, delayed
+import feature_store
+import profiling
+import text_features
+import threshold_calibration
+from catboost import CatBoostClassifier, Pool
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.pipeline import Pipeline
 from sklearn.base import BaseEstimator, ClassifierMixin
 # --- NUEVAS LIBRERÍAS PARA MÉTRICAS ---
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 
 # --- CONFIGURACIÓN ---
 ARCHIVO_DATASET = "dataset_masivo.csv"
 ARCHIVO_MODELO = "cerebro_priorizacion.joblib" 
 
+# --- CACHÉ DE FEATURES ---
+# La matriz dispersa (TF-IDF + one-hot + escalado) se guarda en disco, indexada por
+# el hash del contenido del dataset + la configuración del featurizador.
+DIRECTORIO_CACHE = "cache_features"
+MAX_ENTRADAS_CACHE = 5
+TAMANO_CHUNK_FEATURES = 20000
+N_JOBS_FEATURES = -1
+CONFIG_FEATURIZADOR = {"max_features": 500, "ngram_range": [1, 2], "asunto_normalizado": True}
+COLUMNAS_X = ['Asunto', 'Dominio', 'Estoy_En_To', 'Estoy_En_CC', 'Total_Destinatarios'] + feature_store.COLUMNAS_ALMACEN
+
+# --- PROBABILIDADES OUT-OF-FOLD ---
+# La evaluación es una validación cruzada con los mismos folds del almacén de features:
+# cada fila se puntúa con un modelo que no la vio y las probabilidades se guardan junto
+# al modelo (<modelo>_oof.npz) para calibrar umbrales sin reentrenar (threshold_calibration.py).
+PARAMETROS_CATBOOST = dict(iterations=300, depth=6, learning_rate=0.1, auto_class_weights='Balanced', verbose=0)
+
+# --- MODO STREAMING (Out-of-core) ---
+# Memoria acotada: el dataset se lee por bloques y el texto se proyecta a un
+# espacio de tamaño fijo (hashing), sin construir vocabulario en memoria.
+TAMANO_CHUNK = 50000
+N_FEATURES_TEXTO = 2 ** 12
+N_FEATURES_DOMINIO = 2 ** 8
+ITERACIONES_TOTALES = 300  # Tope de árboles del modelo final, sea cual sea el nº de filas
+# La recencia depende del orden global del historial: no se calcula bloque a bloque
+COLUMNAS_NUM = ['Total_Destinatarios', 'Estoy_En_To', 'Estoy_En_CC',
+                'Remitente_Volumen', 'Remitente_Tasa_Accion', 'Dominio_Tasa_Accion']
+
 # --- WRAPPER PARA CORREGIR ERROR DE SKLEARN 1.6 ---
 class CatBoostWrapper(BaseEstimator, ClassifierMixin):
     def __init__(self, **kwargs):
@@ -34,6 +72,77 @@ class CatBoostWrapper(BaseEstimator, ClassifierMixin):
         from sklearn.utils._tags import _safe_tags
         return _safe_tags(BaseEstimator(), key=None)
 
+def construir_preprocesador(config=CONFIG_FEATURIZADOR):
+    # sparse_threshold=1.0: la salida siempre es dispersa (igual en todos los bloques)
+    return ColumnTransformer(
+        transformers=[
+            # Asunto normalizado (sin RE:/FW:) y memoizado: ver text_features.py
+            ('txt', text_features.VectorizadorAsuntos(
+                TfidfVectorizer(max_features=config["max_features"], ngram_range=tuple(config["ngram_range"]))),
+             'Asunto'),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), ['Dominio']),
+            ('num', StandardScaler(), ['Total_Destinatarios', 'Estoy_En_To', 'Estoy_En_CC']
+                                      + feature_store.COLUMNAS_ALMACEN)
+        ],
+        sparse_threshold=1.0
+    )
+
+def huella_dataset(X, config=CONFIG_FEATURIZADOR):
+    """Hash del contenido de las columnas usadas + configuración del featurizador"""
+    h = hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8"))
+    h.update(",".join(X.columns).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    return h.hexdigest()[:16]
+
+def _podar_cache():
+    entradas = sorted((e for e in os.scandir(DIRECTORIO_CACHE) if e.name.endswith(".npz")),
+                      key=lambda e: e.stat().st_mtime, reverse=True)
+    for e in entradas[MAX_ENTRADAS_CACHE:]:
+        for ruta in (e.path, e.path[:-4] + ".joblib"):
+            try: os.remove(ruta)
+            except OSError: pass
+
+def featurizar_dataset(X, config=CONFIG_FEATURIZADOR):
+    """Etapa cacheable: devuelve (preprocesador ajustado, matriz dispersa CSR).
+    El ajuste es una sola pasada; la transformación se reparte por bloques entre núcleos."""
+    clave = huella_dataset(X, config)
+    ruta_matriz = os.path.join(DIRECTORIO_CACHE, f"{clave}.npz")
+    ruta_prep = os.path.join(DIRECTORIO_CACHE, f"{clave}.joblib")
+    if os.path.exists(ruta_matriz) and os.path.exists(ruta_prep):
+        try:
+            preprocessor, matriz = joblib.load(ruta_prep), sparse.load_npz(ruta_matriz)
+            print(f"♻️ Features cargadas de caché ({clave}): {matriz.shape[0]}x{matriz.shape[1]}")
+            return preprocessor, matriz
+        except Exception as e:
+            print(f"[WARN] Caché de features ilegible, se regenera: {e}")
+
+    inicio = time.perf_counter()
+    preprocessor = construir_preprocesador(config).fit(X)
+    if len(X) > TAMANO_CHUNK_FEATURES:
+        bloques = [X.iloc[i:i + TAMANO_CHUNK_FEATURES] for i in range(0, len(X), TAMANO_CHUNK_FEATURES)]
+        partes = Parallel(n_jobs=N_JOBS_FEATURES)(delayed(preprocessor.transform)(b) for b in bloques)
+        matriz = sparse.vstack(partes).tocsr()
+    else:
+        matriz = sparse.csr_matrix(preprocessor.transform(X))
+    print(f"🧮 Features calculadas en {time.perf_counter() - inicio:.1f}s: {matriz.shape[0]}x{matriz.shape[1]}")
+
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        sparse.save_npz(ruta_matriz, matriz)
+        joblib.dump(preprocessor, ruta_prep)
+        _podar_cache()
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar la caché de features: {e}")
+    return preprocessor, matriz
+
+def _almacen_para(n_filas):
+    """Almacén del extractor si corresponde a este dataset (el leave-one-out lo exige); si no, None"""
+    almacen = feature_store.cargar_almacen()
+    if almacen is not None and almacen.volumen_total == n_filas: return almacen
+    print("[WARN] Almacén de features ausente o desactualizado: se recalcula desde el dataset.")
+    return None
+
+@profiling.perfilable("entrenamiento")
 def entrenar_modelo_definitivo():
     print("--- 🐱 Entrenando el CEREBRO FINAL (CatBoost) ---")
     
@@ -44,6 +153,8 @@ def entrenar_modelo_definitivo():
         df['Dominio'] = df['Dominio'].fillna("desconocido")
         df = df.fillna(0)
         print(f"✅ Datos cargados: {len(df)} registros.")
+        folds = np.random.RandomState(42).randint(0, feature_store.N_FOLDS, len(df))
+        df = feature_store.unir_almacen(df, _almacen_para(len(df)), folds)
     except Exception as e:
         print(f"❌ Error: {e}")
         return
@@ -51,46 +162,35 @@ def entrenar_modelo_definitivo():
     # 2. Preparar Target
     df['TARGET_BINARIO'] = df['TARGET_IA'].apply(lambda x: 1 if x == 2 else 0)
     
-    X = df[['Asunto', 'Dominio', 'Estoy_En_To', 'Estoy_En_CC', 'Total_Destinatarios']]
-    y = df['TARGET_BINARIO']
+    X = df[COLUMNAS_X]
+    y = df['TARGET_BINARIO'].values
 
-    # 3. Pipeline de Preprocesamiento
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('txt', TfidfVectorizer(max_features=500, ngram_range=(1, 2)), 'Asunto'),
-            ('cat', OneHotEncoder(handle_unknown='ignore'), ['Dominio']),
-            ('num', StandardScaler(), ['Total_Destinatarios', 'Estoy_En_To', 'Estoy_En_CC'])
-        ]
-    )
+    # 3. Featurización (una sola vez, cacheada en disco; la comparten evaluación y entrenamiento final)
+    preprocessor, X_mat = featurizar_dataset(X)
 
     # 4. Definición del Modelo
-    cat_model = CatBoostWrapper(
-        iterations=300,
-        depth=6,
-        learning_rate=0.1,
-        auto_class_weights='Balanced', 
-        verbose=0
-    )
-
-    clf = Pipeline(steps=[('preprocessor', preprocessor), ('classifier', cat_model)])
+    cat_model = CatBoostWrapper(**PARAMETROS_CATBOOST)
 
     # --- 5. EVALUACIÓN DE RENDIMIENTO (Nuevo Bloque) ---
-    print("\n--- 📊 Evaluando Métricas (Validación Cruzada 80/20) ---")
-    
-    # Separamos solo para ver qué tan bueno es (simulación de la realidad)
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    
-    clf.fit(X_train, y_train)
-    y_pred = clf.predict(X_test)
+    print(f"\n--- 📊 Evaluando Métricas (Validación Cruzada {feature_store.N_FOLDS} folds, out-of-fold) ---")
+
+    # Cada fold se predice con un modelo entrenado en los demás (simulación de la realidad)
+    prob_oof = np.zeros(len(y))
+    for k in range(feature_store.N_FOLDS):
+        entrenar, evaluar = folds != k, folds == k
+        if not evaluar.any(): continue
+        modelo_fold = CatBoostWrapper(**PARAMETROS_CATBOOST)
+        modelo_fold.fit(X_mat[entrenar], y[entrenar])
+        prob_oof[evaluar] = modelo_fold.predict_proba(X_mat[evaluar])[:, 1]
+        print(f"   ... fold {k + 1}/{feature_store.N_FOLDS} evaluado ({int(evaluar.sum())} registros)")
+    y_pred = (prob_oof >= 0.5).astype(int)
     
     # Reporte detallado
     print("\nREPORTE DE CLASIFICACIÓN:")
-    print(classification_report(y_test, y_pred, target_names=['Normal (0)', 'Urgente (1)']))
+    print(classification_report(y, y_pred, target_names=['Normal (0)', 'Urgente (1)']))
     
     # Matriz de Confusión manual para claridad
-    cm = confusion_matrix(y_test, y_pred)
+    cm = confusion_matrix(y, y_pred)
     tn, fp, fn, tp = cm.ravel()
     print("MATRIZ DE CONFUSIÓN:")
     print(f"✅ Aciertos Normales: {tn}")
@@ -98,18 +198,192 @@ def entrenar_modelo_definitivo():
     print(f"⚠️ Urgentes Perdidos (Peligro): {fn}")
     print(f"🏆 Urgentes Detectados: {tp}")
     
-    acc = accuracy_score(y_test, y_pred)
+    acc = accuracy_score(y, y_pred)
     print(f"\nExactitud Global (Accuracy): {acc:.2%}")
     print("-" * 40)
 
     # --- 6. ENTRENAMIENTO FINAL Y GUARDADO ---
     print("\n🧠 Re-entrenando con el 100% de la historia para producción...")
     # Ahora sí usamos TODO (X, y) para que el archivo guardado sea lo más potente posible
-    clf.fit(X, y)
+    cat_model.fit(X_mat, y)
+    clf = Pipeline(steps=[('preprocessor', preprocessor), ('classifier', cat_model)])
 
     joblib.dump(clf, ARCHIVO_MODELO)
     print(f"✅ ¡CEREBRO CATBOOST LISTO! Guardado en: {ARCHIVO_MODELO}")
     print("El modelo guardado ha aprendido de todos los datos disponibles.")
+    guardar_oof(y, prob_oof, _dias_cubiertos(df))
+
+def _dias_cubiertos(df):
+    """Días que abarca el historial (0 si el dataset no trae fechas)"""
+    if 'Fecha_Recepcion' not in df: return 0
+    fechas = pd.to_datetime(df['Fecha_Recepcion'], errors='coerce').dropna()
+    return (fechas.max() - fechas.min()).days + 1 if len(fechas) else 0
+
+def guardar_oof(y, prob, dias):
+    """Guarda las probabilidades out-of-fold y reaplica el criterio de la última calibración"""
+    try:
+        threshold_calibration.guardar_oof(ARCHIVO_MODELO, y, prob, dias)
+        calibracion = threshold_calibration.recalibrar(ARCHIVO_MODELO)
+    except Exception as e:
+        print(f"[WARN] No se pudieron guardar las probabilidades out-of-fold: {e}")
+        return
+    print(f"🎚️ Probabilidades out-of-fold ({len(y)}) en {threshold_calibration.ruta_oof(ARCHIVO_MODELO)}")
+    if calibracion:
+        print(f"🎚️ Umbrales recalibrados con el criterio anterior: urgente ≥ {calibracion['umbral_rojo']:.3f} | "
+              f"revisar ≥ {calibracion['umbral_amarillo']:.3f}")
+    else:
+        print("   Elige umbrales con: python threshold_calibration.py")
+
+def _leer_chunks(tamano_chunk, almacen=None):
+    """Lee el dataset por bloques aplicando la misma limpieza que el modo clásico"""
+    for chunk in pd.read_csv(ARCHIVO_DATASET, sep='|', chunksize=tamano_chunk):
+        chunk['Asunto'] = chunk['Asunto'].fillna("").astype(str)
+        chunk['Dominio'] = chunk['Dominio'].fillna("desconocido").astype(str)
+        chunk = chunk.fillna(0)
+        chunk['TARGET_BINARIO'] = (chunk['TARGET_IA'] == 2).astype(int)
+        if almacen is not None: chunk = feature_store.unir_almacen(chunk, almacen)
+        yield chunk
+
+def _contar_filas():
+    """Filas del CSV sin parsearlo (el extractor elimina los saltos de línea de los textos)"""
+    with open(ARCHIVO_DATASET, "rb") as f:
+        return sum(bloque.count(b"\n") for bloque in iter(lambda: f.read(1 << 20), b"")) - 1
+
+def repartir_iteraciones(n_chunks, total=ITERACIONES_TOTALES):
+    """Árboles por bloque: suman exactamente `total` (tamaño del modelo, memoria al cargar y
+    latencia de inferencia acotados). Con más bloques que árboles, los bloques sin árbol
+    quedan espaciados de forma uniforme y solo se usan para la validación progresiva."""
+    return [total * i // n_chunks - total * (i - 1) // n_chunks for i in range(1, n_chunks + 1)]
+
+def construir_preprocesador_streaming():
+    """Featurizador sin estado para texto/dominio: su tamaño no depende del nº de filas"""
+    return ColumnTransformer(
+        transformers=[
+            ('txt', text_features.VectorizadorAsuntos(
+                HashingVectorizer(n_features=N_FEATURES_TEXTO, ngram_range=(1, 2), alternate_sign=False)),
+             'Asunto'),
+            ('cat', HashingVectorizer(n_features=N_FEATURES_DOMINIO, token_pattern=r'\S+',
+                                      alternate_sign=False, norm=None), 'Dominio'),
+            ('num', StandardScaler(), COLUMNAS_NUM)
+        ]
+    )
+
+@profiling.perfilable("entrenamiento_streaming")
+def entrenar_modelo_streaming(tamano_chunk=TAMANO_CHUNK):
+    print("--- 🐱 Entrenando el CEREBRO FINAL (CatBoost, modo streaming) ---")
+    inicio = time.perf_counter()
+
+    # 0. Almacén de features: memoria proporcional a remitentes distintos, no a filas
+    almacen = feature_store.cargar_almacen()
+    try:
+        if almacen is None or almacen.volumen_total != _contar_filas():
+            print("[WARN] Almacén de features ausente o desactualizado: se recalcula por bloques.")
+            almacen = None
+            for chunk in _leer_chunks(tamano_chunk):
+                almacen = feature_store.construir_desde_dataset(chunk, almacen)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return
+
+    # 1. Primera pasada: conteos y estadísticas del escalado numérico
+    scaler = StandardScaler()
+    total, positivos, n_chunks = 0, 0, 0
+    for chunk in _leer_chunks(tamano_chunk, almacen):
+        scaler.partial_fit(chunk[COLUMNAS_NUM])
+        total += len(chunk)
+        positivos += int(chunk['TARGET_BINARIO'].sum())
+        n_chunks += 1
+    if total == 0 or positivos in (0, total):
+        print("❌ Error: el dataset necesita ejemplos de ambas clases.")
+        return
+    print(f"✅ Datos escaneados: {total} registros en {n_chunks} bloques de {tamano_chunk}.")
+
+    # Pesos balanceados (equivalente a auto_class_weights='Balanced' sobre el total)
+    pesos = [total / (2 * (total - positivos)), total / (2 * positivos)]
+    iteraciones = repartir_iteraciones(n_chunks)
+
+    # 2. Preprocesador: hashing sin estado + escalado ya ajustado en la pasada 1
+    preprocessor = construir_preprocesador_streaming()
+    preprocessor.fit(next(_leer_chunks(tamano_chunk, almacen)).head(1))
+    preprocessor.transformers_ = [
+        (nombre, scaler if nombre == 'num' else trans, cols)
+        for nombre, trans, cols in preprocessor.transformers_
+    ]
+
+    # 3. Segunda pasada: CatBoost incremental (init_model) bloque a bloque.
+    # Cada bloque se evalúa con el modelo ANTES de aprender de él (validación progresiva).
+    print("\n--- 📊 Evaluando Métricas (Validación Progresiva por bloques) ---")
+    modelo = None
+    tn = fp = fn = tp = 0
+    # y/prob de la validación progresiva van a disco a medida que se evalúan (memoria acotada)
+    rutas_prog = (ARCHIVO_MODELO + ".y_prog.tmp", ARCHIVO_MODELO + ".prob_prog.tmp")
+    y_prog = np.memmap(rutas_prog[0], dtype=np.int8, mode='w+', shape=(total,))
+    prob_prog = np.memmap(rutas_prog[1], dtype=np.float32, mode='w+', shape=(total,))
+    n_prog = 0
+    for i, chunk in enumerate(_leer_chunks(tamano_chunk, almacen), start=1):
+        X = preprocessor.transform(chunk)
+        y = chunk['TARGET_BINARIO'].values
+        if modelo is not None:
+            prob = modelo.predict_proba(X)[:, 1]
+            y_pred = (prob >= 0.5).astype(int)
+            y_prog[n_prog:n_prog + len(y)] = y
+            prob_prog[n_prog:n_prog + len(y)] = prob
+            n_prog += len(y)
+            tp += int(((y_pred == 1) & (y == 1)).sum())
+            tn += int(((y_pred == 0) & (y == 0)).sum())
+            fp += int(((y_pred == 1) & (y == 0)).sum())
+            fn += int(((y_pred == 0) & (y == 1)).sum())
+
+        if iteraciones[i - 1] == 0:
+            print(f"   ... bloque {i}/{n_chunks} solo evaluado (tope de {ITERACIONES_TOTALES} árboles)")
+            del X, y, chunk
+            continue
+        siguiente = CatBoostClassifier(
+            iterations=iteraciones[i - 1],
+            depth=6,
+            learning_rate=0.1,
+            class_weights=pesos,
+            verbose=0
+        )
+        siguiente.fit(Pool(X, y), init_model=modelo)
+        # CatBoost copia los metadatos del modelo previo con el prefijo "initModel:" en cada etapa:
+        # sin limpiarlos crecen de forma cuadrática con el nº de bloques
+        metadatos = siguiente.get_metadata()
+        for clave in [k for k in metadatos.keys() if k.startswith("initModel:")]: del metadatos[clave]
+        modelo = siguiente
+        print(f"   ... bloque {i}/{n_chunks} entrenado ({len(chunk)} registros, {iteraciones[i - 1]} árboles)")
+        del X, y, chunk
+
+    evaluados = tn + fp + fn + tp
+    if evaluados:
+        print("MATRIZ DE CONFUSIÓN:")
+        print(f"✅ Aciertos Normales: {tn}")
+        print(f"🚨 Falsas Alarmas (Ruido): {fp}")
+        print(f"⚠️ Urgentes Perdidos (Peligro): {fn}")
+        print(f"🏆 Urgentes Detectados: {tp}")
+        print(f"\nExactitud Global (Accuracy): {(tn + tp) / evaluados:.2%}")
+    else:
+        print("ℹ️ Un solo bloque: no hay datos para validación progresiva.")
+    print("-" * 40)
+
+    # 4. Mismo formato de artefacto que el modo clásico (Pipeline + Wrapper)
+    cat_model = CatBoostWrapper()
+    cat_model.model = modelo
+    cat_model.classes_ = modelo.classes_
+    clf = Pipeline(steps=[('preprocessor', preprocessor), ('classifier', cat_model)])
+
+    joblib.dump(clf, ARCHIVO_MODELO)
+    print(f"✅ ¡CEREBRO CATBOOST LISTO! Guardado en: {ARCHIVO_MODELO}")
+    if n_prog: guardar_oof(y_prog[:n_prog], prob_prog[:n_prog], 0)
+    del y_prog, prob_prog  # Cierra los mapeos antes de borrar (Windows no borra un archivo mapeado)
+    for ruta in rutas_prog: os.remove(ruta)
+    print(f"⏱️ Tiempo total: {time.perf_counter() - inicio:.1f}s")
 
 if __name__ == "__main__":
-    entrenar_modelo_definitivo()
\ No newline at end of file
+    profiling.ACTIVO = "--perfilar" in sys.argv
+    # --salida RUTA: guarda el modelo aparte (p.ej. un retador para el scoring en sombra)
+    if "--salida" in sys.argv: ARCHIVO_MODELO = sys.argv[sys.argv.index("--salida") + 1]
+    if "--streaming" in sys.argv:
+        entrenar_modelo_streaming()
+    else:
+        entrenar_modelo_definitivo()
\ No newline at end of file
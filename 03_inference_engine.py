@@ -1,7 +1,22 @@
-import win32com.client
 import pandas as pd
 import joblib
 import re
+import os
+import json
+import hashlib
+import feature_store
+import mailbox_access
+import pipeline
+import profiling
+import shadow_scoring
+import text_features
+import threshold_calibration
+import sys
+import time
+import heapq
+import threading
+import functools
+from collections import deque
 from sklearn.base import BaseEstimator, ClassifierMixin
 from catboost import CatBoostClassifier # Necesario para que reconozca el objeto
 
@@ -9,8 +24,66 @@ from catboost import CatBoostClassifier # Necesario para que reconozca el objeto
 ARCHIVO_MODELO = "cerebro_priorizacion.joblib"
 MI_EMAIL = "wllana@unibanca.pe"
 MI_NOMBRE = "Walter Llana"
-UMBRAL_ROJO = 0.75
-UMBRAL_AMARILLO = 0.60
+UMBRAL_ROJO = 0.75      # Por defecto: se usan los calibrados para la versión del modelo si existen
+UMBRAL_AMARILLO = 0.60  # (threshold_calibration.py -> <modelo>_umbrales.json)
+CATEGORIAS_IA = ("IA Urgente", "IA Revisar")  # Las que pone la vigilancia (solo estas se quitan)
+TAMANO_LOTE_SCORING = 32  # Correos por predict_proba en los trabajadores del pipeline
+MAX_ITEMS_ABIERTOS = 128  # Items COM retenidos a la vez por el pipeline (Exchange limita los objetos abiertos)
+
+# --- 🗂️ SNAPSHOT DEL ÁRBOL DE CARPETAS ---
+# Solo se consultan (Restrict/Sort) las carpetas con no leídos cuyo conteo o
+# marcador de cambio se movió desde la última vigilancia.
+USAR_SNAPSHOT = True
+ARCHIVO_SNAPSHOT = "snapshot_carpetas.json"
+# Rutas o nombres de carpeta (sin distinguir mayúsculas), p.ej. "Bandeja de entrada > Boletines".
+CARPETAS_INCLUIDAS = []  # Vacío = todas
+CARPETAS_EXCLUIDAS = ["Correo no deseado", "RSS Feeds"]  # Se omite también su subárbol
+MAPI_COMMIT_TIME_MAX = "http://schemas.microsoft.com/mapi/proptag/0x670A0040"
+
+# --- ⏱️ PROGRAMACIÓN ---
+# "recientes": una cola global más-nuevo-primero entre todas las carpetas con no leídos;
+#              con presupuesto, el ciclo se corta al agotarlo y lo pendiente sigue en el siguiente.
+# "arbol": recorrido en profundidad carpeta por carpeta (comportamiento clásico).
+# Una vigilancia suelta (CLI, una ejecución) recorre todo sin límite de tiempo; el presupuesto
+# solo aplica a los ciclos de vigilar_continuamente, donde el siguiente ciclo retoma lo pendiente.
+MODO_PROGRAMACION = "arbol"    # Vigilancia suelta
+MODO_CICLOS = "recientes"      # Ciclos de la vigilancia continua
+PRESUPUESTO_CICLO = 60.0  # Segundos por ciclo de la vigilancia continua en modo "recientes" (None = sin límite)
+
+# --- ♻️ ÍNDICE DE DUPLICADOS ---
+# Copias del mismo correo (varias carpetas, reglas, re-ejecuciones) reutilizan su score.
+ARCHIVO_INDICE_DUPLICADOS = "indice_duplicados.json"
+MAX_ENTRADAS_INDICE = 50000
+MAPI_INTERNET_MESSAGE_ID = "http://schemas.microsoft.com/mapi/proptag/0x1035001F"
+
+# --- 🧵 CACHÉ POR CONVERSACIÓN ---
+# Un hilo "responder a todos" trae decenas de no leídos casi idénticos. Si un mensaje coincide
+# con la firma cacheada de su ConversationID (remitente, posición To/CC, asunto sin prefijos
+# RE:/FW:, tamaño de la audiencia), se reutiliza el score sin evaluar el modelo. Cambiar de
+# remitente o de posición invalida la entrada; cambiar de modelo invalida el archivo completo.
+USAR_CACHE_CONVERSACIONES = True
+ARCHIVO_CACHE_CONVERSACIONES = "cache_conversaciones.json"
+MAX_ENTRADAS_CONVERSACIONES = 20000
+
+# --- ♾️ VIGILANCIA CONTINUA ---
+# La GUI (y `--continuo` en CLI) encadena ciclos en el mismo proceso. Entre ciclos se sueltan
+# las referencias COM y se registra RSS / handles / hilos para detectar crecimiento.
+INTERVALO_CICLOS = 60.0  # Segundos entre el fin de un ciclo y el inicio del siguiente
+MAX_HISTORIAL_SALUD = 1440  # Ciclos conservados en memoria (24 h a un ciclo por minuto)
+
+# --- 🥊 CAMPEÓN / RETADORES ---
+# Modelos candidatos que puntúan en sombra los mismos correos con la misma fila de features;
+# solo ARCHIVO_MODELO etiqueta. Scores, acuerdo y latencia van a shadow_scoring.ARCHIVO_SOMBRA.
+MODELOS_RETADORES = []  # p.ej. ["cerebro_retador.joblib"]; en CLI: --retador RUTA (repetible)
+
+# Agregados históricos por remitente/dominio (se carga en ejecutar_vigilancia)
+almacen_features = feature_store.AlmacenFeatures()
+# Umbrales vigentes (se cargan con el modelo en ejecutar_vigilancia)
+umbral_rojo, umbral_amarillo = UMBRAL_ROJO, UMBRAL_AMARILLO
+# (versión, modelo): entre vigilancias del mismo proceso (GUI) se conserva el memo de asuntos
+_modelo_en_memoria = None
+# Salud del proceso por ciclo de la vigilancia continua (acotado)
+historial_salud = deque(maxlen=MAX_HISTORIAL_SALUD)
 
 # --- 🧠 CLASE WRAPPER (CRÍTICO: DEBE ESTAR AQUÍ PARA PODER CARGAR EL MODELO) ---
 class CatBoostWrapper(BaseEstimator, ClassifierMixin):
@@ -47,6 +120,7 @@ def inicializar_categorias(outlook_app):
         print("🛠️ Creando categoría 'IA Revisar'...")
         categories.Add("IA Revisar", 2) # 2 = Naranja
 
+@functools.lru_cache(maxsize=10000)  # Solo se usa con asuntos, que se repiten mucho
 def limpiar_texto(texto):
     if not texto: return ""
     texto = str(texto)
@@ -54,113 +128,614 @@ def limpiar_texto(texto):
     texto = re.sub(r'[^a-zA-Z0-9áéíóúÁÉÍÓÚñÑ.,:;?!\s@\-_]', '', texto)
     return re.sub(' +', ' ', re.sub(r'[\n\r\t|]', ' ', texto)).strip()
 
-def obtener_features(item):
+def calcular_huella(item):
+    """Internet Message-ID o, en su defecto, remitente+asunto+minuto normalizados"""
+    try:
+        mid = item.PropertyAccessor.GetProperty(MAPI_INTERNET_MESSAGE_ID)
+        if mid: return "m" + hashlib.sha1(mid.strip().encode("utf-8")).hexdigest()[:20]
+    except: pass
+    remitente = (item.SenderEmailAddress or item.SenderName or "").strip().lower()
+    asunto = " ".join((item.Subject or "").lower().split())
+    clave = f"{remitente}|{asunto}|{item.ReceivedTime.replace(tzinfo=None):%Y-%m-%d %H:%M}"
+    return "h" + hashlib.sha1(clave.encode("utf-8")).hexdigest()[:20]
+
+def leer_crudo(item, asunto, huella, carpeta):
+    """Etapa COM (hilo STA): solo las propiedades que el modelo necesita"""
+    crudo = {"asunto": asunto, "huella": huella, "carpeta": carpeta, "nombre": None, "direccion": None,
+             "smtp_exchange": None, "destinatarios": [], "total_destinatarios": 0, "conversacion": ""}
+    try: crudo["conversacion"] = item.ConversationID or ""
+    except: pass
+    try:
+        crudo["direccion"] = item.SenderEmailAddress
+        if crudo["direccion"] and "/o=" in crudo["direccion"].lower():
+            try: crudo["smtp_exchange"] = item.Sender.GetExchangeUser().PrimarySmtpAddress
+            except: crudo["nombre"] = item.SenderName
+        elif not crudo["direccion"]:
+            crudo["nombre"] = item.SenderName
+    except: pass
+    try:
+        recipients = item.Recipients
+        crudo["total_destinatarios"] = recipients.Count
+        for i, r in enumerate(recipients):
+            if i > 50: break
+            try: crudo["destinatarios"].append((r.Address, r.Name, r.Type))
+            except: pass
+    except: pass
+    return crudo
+
+def obtener_features(crudo):
     """Extrae toda la data necesaria para la IA"""
     email, dominio = "desconocido", "interno"
     try:
         # Remitente
-        if item.SenderEmailAddress and "/o=" in item.SenderEmailAddress.lower():
-            try: email = item.Sender.GetExchangeUser().PrimarySmtpAddress.lower()
-            except: email = item.SenderName.lower()
-        else:
-            email = item.SenderEmailAddress.lower() if item.SenderEmailAddress else item.SenderName.lower()
+        if crudo["smtp_exchange"]: email = crudo["smtp_exchange"].lower()
+        elif crudo["direccion"] and "/o=" not in crudo["direccion"].lower(): email = crudo["direccion"].lower()
+        else: email = crudo["nombre"].lower()
         
         if "@" in email: dominio = email.split("@")[1].strip()
         else: dominio = "unibanca.pe"
     except: pass
 
     # Audiencia
-    en_to, en_cc, total = 0, 0, 0
-    try:
-        recipients = item.Recipients
-        total = recipients.Count
-        mi_id = MI_EMAIL.lower()
-        mi_name = MI_NOMBRE.lower()
-        for i, r in enumerate(recipients):
-            if i > 50: break
-            try:
-                addr = r.Address.lower() if r.Address else ""
-                nm = r.Name.lower() if r.Name else ""
-                if mi_id in addr or mi_name in nm:
-                    if r.Type == 1: en_to = 1
-                    elif r.Type == 2: en_cc = 1
-            except: pass
-    except: pass
+    en_to, en_cc = 0, 0
+    mi_id = MI_EMAIL.lower()
+    mi_name = MI_NOMBRE.lower()
+    for addr, nm, tipo in crudo["destinatarios"]:
+        try:
+            addr = addr.lower() if addr else ""
+            nm = nm.lower() if nm else ""
+            if mi_id in addr or mi_name in nm:
+                if tipo == 1: en_to = 1
+                elif tipo == 2: en_cc = 1
+        except: pass
 
-    return email, dominio, en_to, en_cc, total
+    return email, dominio, en_to, en_cc, crudo["total_destinatarios"]
 
-def procesar_carpeta_recursiva(carpeta, clf, counter):
-    try:
-        # 1. Procesar correos de ESTA carpeta
-        items = carpeta.Items.Restrict("[UnRead] = True")
-        items.Sort("[ReceivedTime]", True)
+def firma_conversacion(asunto, email, en_to, en_cc, total):
+    """Lo que debe coincidir para reutilizar el score de la conversación"""
+    asunto = text_features.normalizar_asunto(asunto).lower()
+    return hashlib.sha1(f"{email}|{en_to}|{en_cc}|{total}|{asunto}".encode("utf-8")).hexdigest()[:16]
+
+class CacheConversaciones:
+    """ConversationID -> [firma, probabilidad], compartido por los trabajadores del pipeline"""
+    def __init__(self, entradas=None):
+        self.entradas = entradas or {}
+        self.cerrojo = threading.Lock()
+        self.consultas = 0    # Correos con ConversationID
+        self.aciertos = 0     # ... que no necesitaron evaluar el modelo
+        self.invalidadas = 0  # Entradas descartadas por cambio de remitente/posición/asunto
+
+    def resolver(self, claves, evaluar):
+        """`claves`: (conversacion, firma) por correo; `evaluar(indices) -> probs` solo corre una vez
+        por conversación y firma distintas que no estén en la caché."""
+        probs = [None] * len(claves)
+        grupos = {}  # (conversacion, firma) -> índices del lote que esperan el mismo score
+        with self.cerrojo:
+            for i, (conversacion, firma) in enumerate(claves):
+                if not conversacion:
+                    grupos[(None, i)] = [i]
+                    continue
+                self.consultas += 1
+                entrada = self.entradas.get(conversacion)
+                if entrada is not None and entrada[0] == firma:
+                    probs[i] = entrada[1]
+                    continue
+                if entrada is not None and (conversacion, firma) not in grupos: self.invalidadas += 1
+                grupos.setdefault((conversacion, firma), []).append(i)
+            self.aciertos += sum(len(ids) - 1 for (c, _), ids in grupos.items() if c) + \
+                sum(1 for p in probs if p is not None)
+        if not grupos: return probs
+
+        nuevas = evaluar([ids[0] for ids in grupos.values()])
+        with self.cerrojo:
+            for ((conversacion, firma), ids), p in zip(grupos.items(), nuevas):
+                for i in ids: probs[i] = float(p)
+                if conversacion:
+                    self.entradas.pop(conversacion, None)  # Al final: las más usadas sobreviven al recorte
+                    self.entradas[conversacion] = [firma, float(p)]
+        return probs
+
+    def resumen(self):
+        tasa = self.aciertos / self.consultas if self.consultas else 0.0
+        return (f"🧵 Conversaciones: {self.aciertos}/{self.consultas} aciertos ({tasa:.0%}) | "
+                f"{self.aciertos} evaluaciones del modelo ahorradas | {self.invalidadas} entradas invalidadas")
+
+def puntuar_lote(clf, crudos, comite=None, conversaciones=None):
+    """Etapa CPU (trabajadores): features + lookup en el almacén + un solo predict_proba por lote.
+    Con retadores, el comité reutiliza el mismo DataFrame (y la matriz transformada si comparten
+    preprocesador) y devuelve las probabilidades del campeón. Con caché por conversación, el
+    campeón solo evalúa las filas sin score reutilizable; los retadores, todas."""
+    ahora = feature_store.segundos_epoch(mailbox_access.ahora())
+    filas, claves = [], []
+    for crudo in crudos:
+        email, dom, to, cc, tot = obtener_features(crudo)
+        filas.append({
+            'Asunto': crudo["asunto"], 
+            'Dominio': dom,
+            'Estoy_En_To': to, 
+            'Estoy_En_CC': cc, 
+            'Total_Destinatarios': tot,
+            **almacen_features.features(email, dom, ahora)
+        })
+        if conversaciones is not None:
+            claves.append((crudo["conversacion"], firma_conversacion(crudo["asunto"], email, to, cc, tot)))
+
+    evaluados = []
+
+    def evaluar(indices):
+        evaluados.extend(indices)
+        df = pd.DataFrame([filas[i] for i in indices])
+        if comite is not None:
+            return comite.puntuar(df, [crudos[i]["huella"] for i in indices])
+        return clf.predict_proba(df)[:, 1]
+
+    if conversaciones is not None:
+        probs = conversaciones.resolver(claves, evaluar)
+        if comite is not None:
+            # Los retadores también puntúan las filas con score reutilizado (con el del campeón como
+            # referencia): si no, nunca verían los hilos "responder a todos" y el acuerdo quedaría sesgado
+            vistos = set(evaluados)
+            reutilizados = [i for i in range(len(crudos)) if i not in vistos]
+            if reutilizados:
+                comite.puntuar(pd.DataFrame([filas[i] for i in reutilizados]),
+                               [crudos[i]["huella"] for i in reutilizados], [probs[i] for i in reutilizados])
+    else:
+        probs = evaluar(range(len(crudos)))
+    return [{"prob": float(p), "asunto": c["asunto"], "huella": c["huella"], "carpeta": c["carpeta"]}
+            for c, p in zip(crudos, probs)]
+
+def etiquetar(item, categoria):
+    """Un no leído ya etiquetado en un ciclo anterior no se vuelve a guardar"""
+    if item.Categories == categoria: return
+    item.Categories = categoria
+    item.Save()
+
+def crear_pipeline(clf, counter, indice, comite=None, conversaciones=None, cancelar=None):
+    """Lectura COM -> trabajadores (scoring por lotes) -> escritura COM de categorías"""
+    def escribir(item, resultado):
+        prob = resultado["prob"]
+        if resultado.get("reutilizado"): counter[1] += 1
+        else: indice[resultado["huella"]] = prob
         
-        # print(f"� Revisando: {carpeta.Name} ({items.Count} pendientes)...")
+        accion = ""
+        if prob >= umbral_rojo:
+            etiquetar(item, "IA Urgente")
+            accion = f"🔴 [URGENTE {prob:.0%}]"
+        elif prob >= umbral_amarillo:
+            etiquetar(item, "IA Revisar")
+            accion = f"🔴 [REVISAR {prob:.0%}]"
+        else:
+            # Etiquetado con umbrales anteriores (recalibración) y ahora por debajo: se quita
+            if item.Categories in CATEGORIAS_IA: etiquetar(item, "")
+            accion = f"🟡 [IGNORADO {prob:.0%}]"
         
-        for item in items:
-            if item.Class != 43: continue
-            try:
-                email, dom, to, cc, tot = obtener_features(item)
-                asunto = limpiar_texto(item.Subject)
-                
-                # Crear DataFrame
-                df = pd.DataFrame([{
-                    'Asunto': asunto, 
-                    'Dominio': dom,
-                    'Estoy_En_To': to, 
-                    'Estoy_En_CC': cc, 
-                    'Total_Destinatarios': tot
-                }])
-                
-                prob = clf.predict_proba(df)[:, 1][0]
-                
-                accion = ""
-                if prob >= UMBRAL_ROJO:
-                    item.Categories = "IA Urgente"
-                    item.Save()
-                    accion = f"🔴 [URGENTE {prob:.0%}]"
-                elif prob >= UMBRAL_AMARILLO:
-                    item.Categories = "IA Revisar"
-                    item.Save()
-                    accion = f"🔴 [REVISAR {prob:.0%}]"
-                else:
-                    accion = f"🟡 [IGNORADO {prob:.0%}]"
-                
-                if accion:
-                    print(f"{accion} [{carpeta.Name}] {asunto[:30]}...")
-                counter[0] += 1
-                    
-            except Exception as e: 
-                pass
+        if accion:
+            print(f"{accion} [{resultado['carpeta']}] {resultado['asunto'][:30]}...")
+        counter[0] += 1
+
+    return pipeline.Pipeline("vigilancia", lambda crudos: puntuar_lote(clf, crudos, comite, conversaciones), escribir,
+                             tamano_lote=TAMANO_LOTE_SCORING, max_en_vuelo=MAX_ITEMS_ABIERTOS, cancelar=cancelar)
+
+def procesar_carpeta(carpeta, tuberia, indice=None):
+    """Envía al pipeline los no leídos de UNA carpeta (sin recursividad)"""
+    if indice is None: indice = {}
+    items = carpeta.Items.Restrict("[UnRead] = True")
+    items.Sort("[ReceivedTime]", True)
+    nombre = carpeta.Name
+    
+    # print(f"� Revisando: {carpeta.Name} ({items.Count} pendientes)...")
+    
+    for item in items:
+        if tuberia.cancelada: return
+        if item.Class != 43: continue
+        procesar_item(item, nombre, tuberia, indice)
+
+def procesar_item(item, nombre_carpeta, tuberia, indice):
+    try:
+        asunto = limpiar_texto(item.Subject)
+        huella = calcular_huella(item)
+        prob = indice.get(huella)
+        if prob is not None:
+            tuberia.escribir_directo(item, {"prob": prob, "asunto": asunto, "carpeta": nombre_carpeta,
+                                            "reutilizado": True})
+        else:
+            tuberia.enviar(leer_crudo(item, asunto, huella, nombre_carpeta), item)
+    except Exception as e: 
+        pass
+
+def procesar_carpeta_recursiva(carpeta, tuberia, indice=None):
+    try:
+        # 1. Procesar correos de ESTA carpeta
+        procesar_carpeta(carpeta, tuberia, indice)
+        profiling.marca_carpeta(carpeta.Name)
         
         # 2. Recursividad: Ir a las subcarpetas
         for subfolder in carpeta.Folders:
-            procesar_carpeta_recursiva(subfolder, clf, counter)
+            if tuberia.cancelada: return
+            procesar_carpeta_recursiva(subfolder, tuberia, indice)
             
     except Exception as e:
         print(f"⚠️ Error leyendo carpeta {carpeta.Name}: {e}")
 
-def ejecutar_vigilancia():
+def cargar_modelo(version):
+    global _modelo_en_memoria
+    if _modelo_en_memoria is None or _modelo_en_memoria[0] != version:
+        _modelo_en_memoria = (version, joblib.load(ARCHIVO_MODELO))
+    return _modelo_en_memoria[1]
+
+def cargar_comite(clf, version):
+    """Comité campeón/retadores, o None si no hay retadores configurados (o ninguno carga)"""
+    retadores = []
+    for ruta in MODELOS_RETADORES:
+        try:
+            retadores.append((ruta, version_modelo(ruta), joblib.load(ruta)))
+            print(f"🥊 Retador cargado: {ruta}")
+        except Exception as e:
+            print(f"[WARN] Retador {ruta} no disponible: {e}")
+    if not retadores: return None
+    return shadow_scoring.Comite(clf, version, retadores, umbral_rojo, umbral_amarillo, ruta_campeon=ARCHIVO_MODELO)
+
+# --- 🗂️ SNAPSHOT ---
+def version_modelo(ruta=ARCHIVO_MODELO):
+    """Huella corta del archivo del modelo: un modelo nuevo invalida todo lo cacheado"""
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""): h.update(bloque)
+    return h.hexdigest()[:12]
+
+def clave_cache(version, rojo, amarillo):
+    """Modelo + umbrales cargados: tras recalibrar, snapshot, índice y caché por conversación se
+    descartan y los no leídos ya vistos se vuelven a categorizar con los umbrales nuevos"""
+    return f"{version}@{rojo:.6g}/{amarillo:.6g}"
+
+def cargar_snapshot(version):
+    """Snapshot previo; se descarta si fue generado con otro modelo u otros umbrales (clave_cache)"""
+    try:
+        with open(ARCHIVO_SNAPSHOT, encoding="utf-8") as f:
+            snap = json.load(f)
+        if snap.get("version_modelo") == version: return snap.get("carpetas", {})
+    except (OSError, ValueError): pass
+    return {}
+
+def guardar_snapshot(version, carpetas):
+    _guardar_json(ARCHIVO_SNAPSHOT, {"version_modelo": version, "carpetas": carpetas})
+
+def _guardar_json(ruta, datos):
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(tmp, ruta)
+
+def cargar_indice_duplicados(version):
+    """huella -> probabilidad; solo válido para la misma clave_cache (modelo y umbrales)"""
+    try:
+        with open(ARCHIVO_INDICE_DUPLICADOS, encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos.get("version_modelo") == version: return datos.get("scores", {})
+    except (OSError, ValueError): pass
+    return {}
+
+def guardar_indice_duplicados(version, indice):
+    # Los dicts conservan el orden de inserción: se descartan las huellas más antiguas
+    recientes = dict(list(indice.items())[-MAX_ENTRADAS_INDICE:])
+    _guardar_json(ARCHIVO_INDICE_DUPLICADOS, {"version_modelo": version, "scores": recientes})
+
+def cargar_cache_conversaciones(version):
+    try:
+        with open(ARCHIVO_CACHE_CONVERSACIONES, encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos.get("version_modelo") == version: return CacheConversaciones(datos.get("conversaciones", {}))
+    except (OSError, ValueError): pass
+    return CacheConversaciones()
+
+def guardar_cache_conversaciones(version, cache):
+    recientes = dict(list(cache.entradas.items())[-MAX_ENTRADAS_CONVERSACIONES:])
+    _guardar_json(ARCHIVO_CACHE_CONVERSACIONES, {"version_modelo": version, "conversaciones": recientes})
+
+def _coincide(ruta, nombre, patrones):
+    ruta, nombre = ruta.lower(), nombre.lower()
+    for p in patrones:
+        p = p.lower()
+        if p == nombre or ruta == p or ruta.startswith(p + " > "): return True
+    return False
+
+def estado_carpeta(carpeta):
+    """Lectura barata (sin tocar Items): no leídos + marcador de último cambio"""
+    marcador = None
+    try: marcador = str(carpeta.PropertyAccessor.GetProperty(MAPI_COMMIT_TIME_MAX))
+    except: pass
+    return carpeta.UnReadItemCount, marcador
+
+def recolectar_carpetas(carpeta, previo, nuevo, stats, ruta_actual="", candidatas=None):
+    """Recorre el árbol leyendo solo propiedades baratas.
+    Devuelve las carpetas a consultar [(entry_id, ruta, carpeta, estado, cursor)] en orden de
+    árbol, con `estado` = (no leídos, marcador) ANTES de consultarlas; las omitidas ya quedan
+    registradas en `nuevo` (con su cursor, si tenían)."""
+    if candidatas is None: candidatas = []
+    nombre = carpeta.Name
+    ruta = f"{ruta_actual} > {nombre}" if ruta_actual else nombre
+    if _coincide(ruta, nombre, CARPETAS_EXCLUIDAS):
+        stats['excluidas'] += 1
+        return candidatas
+    try:
+        entry_id = carpeta.EntryID
+        no_leidos, marcador = estado_carpeta(carpeta)
+        anterior = previo.get(entry_id) or {}
+        incluida = not CARPETAS_INCLUIDAS or _coincide(ruta, nombre, CARPETAS_INCLUIDAS)
+        sin_cambios = (anterior and marcador is not None
+                       and anterior["no_leidos"] == no_leidos and anterior["marcador"] == marcador)
+
+        if not incluida or no_leidos == 0 or sin_cambios:
+            stats['omitidas'] += 1
+            nuevo[entry_id] = {"ruta": ruta, "no_leidos": no_leidos, "marcador": marcador,
+                               "cursor": anterior.get("cursor")}
+        else:
+            stats['consultadas'] += 1
+            candidatas.append((entry_id, ruta, carpeta, (no_leidos, marcador), anterior.get("cursor")))
+
+        for subfolder in carpeta.Folders:
+            recolectar_carpetas(subfolder, previo, nuevo, stats, ruta, candidatas)
+    except Exception as e:
+        print(f"⚠️ Error leyendo carpeta {nombre}: {e}")
+    return candidatas
+
+def procesar_arbol_con_snapshot(carpeta, tuberia, previo, nuevo, stats, ruta_actual="", indice=None, releer=None):
+    """Consulta, carpeta por carpeta y en orden de árbol, solo las que cambiaron.
+    Las consultadas se agregan a `releer` con su estado previo a la consulta."""
+    for entry_id, ruta, subcarpeta, estado, _ in recolectar_carpetas(carpeta, previo, nuevo, stats, ruta_actual):
+        if tuberia.cancelada: return
+        try:
+            procesar_carpeta(subcarpeta, tuberia, indice)
+            profiling.marca_carpeta(ruta)
+            if releer is not None: releer.append((entry_id, ruta, estado, True, None))
+        except Exception as e:
+            print(f"⚠️ Error leyendo carpeta {ruta}: {e}")
+
+def _timestamp(item):
+    try: return item.ReceivedTime.replace(tzinfo=None).timestamp()
+    except: return None
+
+class CursorCarpeta:
+    """No leídos de una carpeta, del más nuevo al más viejo, saltando la franja ya
+    etiquetada en ciclos anteriores (cursor {"nuevo": ts, "viejo": ts, "n": no leídos}):
+    primero las llegadas posteriores a "nuevo" y luego, tras una búsqueda binaria sobre la
+    colección ordenada, lo anterior a "viejo". La franja solo se salta si hoy no tiene más
+    no leídos que los que cubrió: un no leído viejo movido o archivado en la carpeta conserva
+    su ReceivedTime y cae dentro de ella, así que en ese caso se recorre entera (los ya
+    etiquetados salen del índice de duplicados sin volver a puntuarse)."""
+
+    def __init__(self, carpeta, cursor=None):
+        self.nombre = carpeta.Name
+        self.items = carpeta.Items.Restrict("[UnRead] = True")
+        self.items.Sort("[ReceivedTime]", True)
+        self.total = self.items.Count
+        self.anterior = cursor
+        self.pos = 1  # Items.Item() es 1-based
+        self.en_llegadas = cursor is not None
+        self.nuevo = self.viejo = None  # Franja etiquetada en este ciclo
+        self.cubiertos = 0  # No leídos dentro de la franja acumulada (etiquetados, saltados o no-correo)
+
+    @property
+    def agotada(self):
+        return self.pos > self.total
+
+    def siguiente(self):
+        """(ts, item) del próximo correo a etiquetar, o None si no queda nada"""
+        while self.pos <= self.total:
+            item = self.items.Item(self.pos)
+            ts = _timestamp(item)
+            if self.en_llegadas and ts is not None and ts <= self.anterior["nuevo"]:
+                self.en_llegadas = False
+                self._saltar_franja()
+                continue
+            self.pos += 1
+            try:
+                if ts is not None and item.Class == 43: return ts, item
+            except: pass
+            # Sin nada que etiquetar (reunión, informe, sin fecha): queda cubierto igual
+            if ts is not None: self.marcar(ts)
+            else: self.cubiertos += 1
+        self.en_llegadas = False
+        self.cerrar()
+        return None
+
+    def cerrar(self):
+        """Suelta la colección COM (una carpeta agotada no la necesita más)"""
+        self.items = None
+
+    def _buscar(self, limite, incluido):
+        """Primera posición (desde la actual) con ts <= limite (incluido) o ts < limite"""
+        bajo, alto = self.pos, self.total + 1
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            ts = _timestamp(self.items.Item(medio))
+            if ts is None or ts < limite or (incluido and ts == limite): alto = medio
+            else: bajo = medio + 1
+        return bajo
+
+    def _saltar_franja(self):
+        viejo = self.anterior["viejo"]
+        # No leídos con ts en [viejo, nuevo] hoy: más de los que cubrió la franja = algo entró
+        hoy = self._buscar(viejo, incluido=False) - self.pos
+        if hoy > self.anterior.get("n", -1): return
+        # Empates en el borde se vuelven a leer (su score se reutiliza del índice)
+        destino = self._buscar(viejo, incluido=True)
+        self.cubiertos += destino - self.pos
+        self.pos = destino
+
+    def marcar(self, ts):
+        self.nuevo = ts if self.nuevo is None else max(self.nuevo, ts)
+        self.viejo = ts if self.viejo is None else min(self.viejo, ts)
+        self.cubiertos += 1
+
+    def cursor(self):
+        """Franja etiquetada acumulada para el próximo ciclo (0.0 = hasta el fondo)"""
+        previo = self.anterior
+        if previo is None:
+            if self.nuevo is None: return None
+            return {"nuevo": self.nuevo, "viejo": 0.0 if self.agotada else self.viejo, "n": self.cubiertos}
+        if self.en_llegadas: return previo  # Quedaron llegadas sin etiquetar: la franja no es contigua
+        return {"nuevo": max(previo["nuevo"], self.nuevo or previo["nuevo"]),
+                "viejo": 0.0 if self.agotada else min(previo["viejo"], self.viejo or previo["viejo"]),
+                "n": self.cubiertos}
+
+def procesar_recientes(candidatas, tuberia, indice, limite=None):
+    """Cola global más-nuevo-primero: mezcla (heap) las cabezas de todas las carpetas.
+    Devuelve ([(entry_id, ruta, estado, completa, cursor)], no leídos pendientes)."""
+    cola, cursores = [], {}
+
+    def avanzar(n):
+        siguiente = cursores[n].siguiente()
+        if siguiente is not None:
+            heapq.heappush(cola, (-siguiente[0], n, cursores[n].pos, siguiente[1]))
+        else:
+            profiling.marca_carpeta(candidatas[n][1])  # Carpeta agotada
+
+    for n, (_, ruta, carpeta, _, cursor) in enumerate(candidatas):
+        try:
+            cursores[n] = CursorCarpeta(carpeta, cursor)
+            avanzar(n)
+        except Exception as e:
+            print(f"⚠️ Error leyendo carpeta {ruta}: {e}")
+
+    while cola:
+        if tuberia.cancelada or (limite is not None and time.perf_counter() >= limite): break
+        ts, n, _, item = heapq.heappop(cola)
+        procesar_item(item, cursores[n].nombre, tuberia, indice)
+        cursores[n].marcar(-ts)
+        avanzar(n)
+
+    en_cola = {n for _, n, _, _ in cola}
+    cola.clear()  # Items COM que quedaron en las cabezas sin etiquetar
+    carpetas, backlog = [], 0
+    for n, cursor in cursores.items():
+        entry_id, ruta, _, estado, _ = candidatas[n]
+        if n in en_cola:
+            backlog += cursor.total - cursor.pos + 2
+            profiling.marca_carpeta(ruta)  # Cortada por el presupuesto
+        carpetas.append((entry_id, ruta, estado, n not in en_cola, cursor.cursor()))
+        cursor.cerrar()
+    return carpetas, backlog
+
+@profiling.perfilable("vigilancia")
+def ejecutar_vigilancia(cancelar=None, modo=None, presupuesto=None):
+    """`cancelar`: threading.Event de esta ejecución (botón Detener de la vista de vigilancia).
+    `modo`: MODO_PROGRAMACION por defecto; `presupuesto`: segundos (None = recorrer todo)."""
+    global almacen_features, umbral_rojo, umbral_amarillo
+    modo = modo or MODO_PROGRAMACION
     print("--- 👁️ INICIANDO VIGILANCIA IA UNIVERSAL (Inbox + Subcarpetas) ---")
     
     try:
-        clf = joblib.load(ARCHIVO_MODELO)
+        version = version_modelo()
+        clf = cargar_modelo(version)
         print("✅ Cerebro cargado correctamente.")
     except Exception as e:
         print(f"❌ Error cargando modelo: {e}")
         return
+    umbral_rojo, umbral_amarillo, origen = threshold_calibration.cargar_umbrales(
+        ARCHIVO_MODELO, version, (UMBRAL_ROJO, UMBRAL_AMARILLO))
+    print(f"🎚️ Umbrales: urgente ≥ {umbral_rojo:.2f} | revisar ≥ {umbral_amarillo:.2f} ({origen})")
+
+    almacen = feature_store.cargar_almacen()
+    if almacen is None:
+        print("[WARN] Sin almacén de features: remitentes evaluados con tasas a priori.")
+        almacen = feature_store.AlmacenFeatures()
+    almacen_features = almacen
 
-    outlook_app = win32com.client.Dispatch("Outlook.Application")
+    outlook_app = profiling.envolver_com(mailbox_access.abrir_outlook(), "Application")
     inicializar_categorias(outlook_app)
     
     inbox = outlook_app.GetNamespace("MAPI").GetDefaultFolder(6)
     
     print("🚀 Escaneando carpetas... (Esto puede tomar un momento)")
     
-    contador_total = [0] # Referencia mutable
-    procesar_carpeta_recursiva(inbox, clf, contador_total)
+    contador_total = [0, 0] # Referencia mutable: [escaneados, scores reutilizados]
+    memo_asuntos = text_features.buscar_memo(clf)
+    memo_previo = memo_asuntos.estadisticas() if memo_asuntos is not None else None
+    clave = clave_cache(version, umbral_rojo, umbral_amarillo)
+    indice = cargar_indice_duplicados(clave)
+    comite = cargar_comite(clf, version)
+    conversaciones = cargar_cache_conversaciones(clave) if USAR_CACHE_CONVERSACIONES else None
+    nuevo_snapshot, releer, backlog = {}, [], 0
+    stats = {'consultadas': 0, 'omitidas': 0, 'excluidas': 0}
+    inicio_ciclo = time.perf_counter()
+    with crear_pipeline(clf, contador_total, indice, comite, conversaciones, cancelar) as tuberia:
+        if modo == "recientes":
+            previo = cargar_snapshot(clave) if USAR_SNAPSHOT else {}
+            limite = inicio_ciclo + presupuesto if presupuesto else None
+            releer, backlog = procesar_recientes(recolectar_carpetas(inbox, previo, nuevo_snapshot, stats),
+                                                 tuberia, indice, limite)
+        elif USAR_SNAPSHOT:
+            procesar_arbol_con_snapshot(inbox, tuberia, cargar_snapshot(clave), nuevo_snapshot, stats,
+                                        indice=indice, releer=releer)
+        else:
+            procesar_carpeta_recursiva(inbox, tuberia, indice)
+    if tuberia.cancelada:
+        print("⏹️ Vigilancia detenida: el snapshot de carpetas no se actualiza.")
+    elif USAR_SNAPSHOT:
+        for entry_id, ruta, estado, completa, cursor in releer:
+            # Se guarda el estado de ANTES de la consulta: un correo que llegó mientras se procesaba
+            # mueve el conteo o el marcador y la carpeta se vuelve a consultar. Los Save() propios
+            # también mueven el marcador: el ciclo siguiente la consulta una vez más (sin re-guardar
+            # nada, el score sale del índice) y a partir de ahí se omite.
+            # Una carpeta a medias no guarda marcador: se vuelve a consultar en el próximo ciclo
+            no_leidos, marcador = estado if completa else (None, None)
+            nuevo_snapshot[entry_id] = {"ruta": ruta, "no_leidos": no_leidos, "marcador": marcador,
+                                        "cursor": cursor}
+        guardar_snapshot(clave, nuevo_snapshot)
+        print(f"📊 Carpetas: {stats['consultadas']} consultadas | {stats['omitidas']} omitidas (sin cambios) | "
+              f"{stats['excluidas']} excluidas")
+    guardar_indice_duplicados(clave, indice)
+    if conversaciones is not None: guardar_cache_conversaciones(clave, conversaciones)
+    if comite is not None: comite.cerrar()
+    mailbox_access.finalizar()
     
-    print(f"✅ Vigilancia terminada. {contador_total[0]} correos escaneados en total.")
+    if tuberia.primera_escritura is not None:
+        print(f"⏱️ Primera etiqueta a los {tuberia.primera_escritura - inicio_ciclo:.2f}s del inicio del ciclo")
+    if modo == "recientes":
+        print(f"📬 Backlog: {backlog} no leídos quedan para el próximo ciclo"
+              + (" (presupuesto agotado)" if backlog and not tuberia.cancelada else ""))
+    if conversaciones is not None: print(conversaciones.resumen())
+    if memo_asuntos is not None: print(memo_asuntos.resumen(desde=memo_previo))
+    print(f"✅ Vigilancia terminada. {contador_total[0]} correos escaneados en total "
+          f"({contador_total[1]} duplicados con score reutilizado).")
+
+def ciclo_vigilancia(numero, cancelar=None):
+    """Un ciclo de la vigilancia continua + limpieza y registro de la salud del proceso"""
+    inicio = time.perf_counter()
+    try: ejecutar_vigilancia(cancelar, MODO_CICLOS, PRESUPUESTO_CICLO)
+    except Exception as e: print(f"❌ Error en el ciclo {numero}: {e}")
+    mailbox_access.liberar_com()
+    salud = {"ciclo": numero, "segundos": time.perf_counter() - inicio, **profiling.salud_proceso()}
+    historial_salud.append(salud)
+    primero = historial_salud[0]
+    texto = f"🩺 Ciclo {numero} en {salud['segundos']:.1f}s"
+    if salud["rss_mb"] is not None:
+        texto += f" | RSS {salud['rss_mb']:.1f} MB ({salud['rss_mb'] - primero['rss_mb']:+.1f} desde el ciclo {primero['ciclo']})"
+    if salud["handles"] is not None: texto += f" | handles {salud['handles']}"
+    if salud.get("gdi") is not None: texto += f" | GDI {salud['gdi']}"
+    print(texto + f" | hilos {salud['hilos']}")
+    return salud
+
+def vigilar_continuamente(intervalo=None, max_ciclos=None, cancelar=None):
+    """Ciclos de vigilancia hasta que se active `cancelar` (Detener) o se alcance max_ciclos"""
+    intervalo = INTERVALO_CICLOS if intervalo is None else intervalo
+    cancelar = cancelar or threading.Event()
+    print(f"--- ♾️ VIGILANCIA CONTINUA: un ciclo cada {intervalo:g}s ---")
+    numero = 0
+    while not cancelar.is_set() and (max_ciclos is None or numero < max_ciclos):
+        numero += 1
+        ciclo_vigilancia(numero, cancelar)
+        if cancelar.wait(intervalo): break
+    print(f"⏹️ Vigilancia continua detenida tras {numero} ciclos.")
 
 if __name__ == "__main__":
-    ejecutar_vigilancia()
\ No newline at end of file
+    profiling.ACTIVO = "--perfilar" in sys.argv
+    mailbox_access.configurar_desde_argv(sys.argv)
+    if "--arbol" in sys.argv: MODO_CICLOS = "arbol"
+    if "--recientes" in sys.argv: MODO_PROGRAMACION = "recientes"
+    MODELOS_RETADORES += [sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == "--retador"]
+    if "--presupuesto" in sys.argv: PRESUPUESTO_CICLO = float(sys.argv[sys.argv.index("--presupuesto") + 1])
+    if "--intervalo" in sys.argv: INTERVALO_CICLOS = float(sys.argv[sys.argv.index("--intervalo") + 1])
+    if "--continuo" in sys.argv: vigilar_continuamente()
+    else: ejecutar_vigilancia()
\ No newline at end of file
@@ -0,0 +1,293 @@
+import pandas as pd
+import numpy as np
+import joblib
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import feature_store
+import mailbox_access
+import profiling
+import threshold_calibration
+from sklearn.base import BaseEstimator, ClassifierMixin
+from catboost import CatBoostClassifier # Necesario para que reconozca el objeto
+
+# --- ⚙️ CONFIGURACIÓN ---
+# Scoring offline de todo el historial extraído (auditar un modelo nuevo, pre-etiquetar un
+# buzón migrado). El dataset se lee por bloques y se puntúa en un pool de procesos; los
+# resultados se escriben en orden y un punto de control permite retomar tras una interrupción.
+ARCHIVO_DATASET = "dataset_masivo.csv"
+ARCHIVO_MODELO = "cerebro_priorizacion.joblib"
+ARCHIVO_RESULTADOS = "backfill_scores.csv"
+ARCHIVO_PUNTO_CONTROL = "backfill_checkpoint.json"
+SEPARADOR_CSV = "|"
+UMBRAL_ROJO = 0.75      # Por defecto, si no hay umbrales calibrados para esta versión del modelo
+UMBRAL_AMARILLO = 0.60
+TAMANO_CHUNK = 20000
+N_PROCESOS = None  # None = todos los núcleos; 0 = en este proceso (depuración)
+COLUMNAS_X = ['Asunto', 'Dominio', 'Estoy_En_To', 'Estoy_En_CC', 'Total_Destinatarios'] + feature_store.COLUMNAS_ALMACEN
+
+# --- 🏷️ APLICAR AL BUZÓN (opcional, --aplicar) ---
+# Segunda pasada en el hilo COM: GetItemFromID + Save a ritmo acotado para no saturar Outlook/Exchange.
+APLICAR_POR_SEGUNDO = 10.0
+GUARDAR_CONTROL_CADA = 200  # Items aplicados entre escrituras del punto de control
+
+# --- 🧠 CLASE WRAPPER (CRÍTICO: DEBE ESTAR AQUÍ PARA PODER CARGAR EL MODELO) ---
+class CatBoostWrapper(BaseEstimator, ClassifierMixin):
+    def __init__(self, **kwargs):
+        self.model = CatBoostClassifier(**kwargs)
+
+    def fit(self, X, y):
+        self.model.fit(X, y)
+        self.classes_ = self.model.classes_
+        return self
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+    def __sklearn_tags__(self):
+        from sklearn.utils._tags import _safe_tags
+        return _safe_tags(BaseEstimator(), key=None)
+# ---------------------------------------------------------------------------
+
+def version_modelo(ruta=ARCHIVO_MODELO):
+    """Huella corta del archivo del modelo: un modelo nuevo invalida el punto de control"""
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""): h.update(bloque)
+    return h.hexdigest()[:12]
+
+def firma_dataset(ruta=ARCHIVO_DATASET):
+    estado = os.stat(ruta)
+    return f"{estado.st_size}-{int(estado.st_mtime)}"
+
+def categoria(prob):
+    if prob >= _umbrales[0]: return "IA Urgente"
+    if prob >= _umbrales[1]: return "IA Revisar"
+    return ""
+
+# --- 💾 PUNTO DE CONTROL ---
+def cargar_punto_control():
+    try:
+        with open(ARCHIVO_PUNTO_CONTROL, encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def guardar_punto_control(control):
+    tmp = ARCHIVO_PUNTO_CONTROL + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(control, f, ensure_ascii=False)
+    os.replace(tmp, ARCHIVO_PUNTO_CONTROL)
+
+# --- 🧮 TRABAJADORES (un modelo cargado por proceso) ---
+_modelo = None
+_almacen = None
+_umbrales = (UMBRAL_ROJO, UMBRAL_AMARILLO)
+
+def _inicializar_trabajador(ruta_modelo, almacen, umbrales):
+    global _modelo, _almacen, _umbrales
+    _modelo, _almacen, _umbrales = joblib.load(ruta_modelo), almacen, umbrales
+
+def preparar_chunk(chunk, dias_previo, almacen):
+    """Mismas columnas que el entrenamiento. Las tasas del almacén excluyen el propio bloque
+    (como un fold del entrenamiento): el score de una fila no ve su propia etiqueta.
+    La recencia llega calculada sobre el dataset completo (ver _recencia_global)."""
+    chunk = chunk.reset_index(drop=True)
+    chunk['Asunto'] = chunk['Asunto'].fillna("").astype(str)
+    chunk['Dominio'] = chunk['Dominio'].fillna("desconocido")
+    return feature_store.unir_almacen(chunk.fillna(0), almacen, dias_previo=dias_previo)
+
+def puntuar_chunk(inicio, chunk, dias_previo):
+    chunk = preparar_chunk(chunk, dias_previo, _almacen)
+    probs = _modelo.predict_proba(chunk[COLUMNAS_X])[:, 1]
+    resultado = pd.DataFrame({
+        "Fila": np.arange(inicio, inicio + len(chunk)),
+        "Huella": chunk["Huella"] if "Huella" in chunk else "",
+        "Entry_ID": chunk["Entry_ID"] if "Entry_ID" in chunk else "",
+        "TARGET_IA": chunk["TARGET_IA"],
+        "Probabilidad": probs.round(4),
+    })
+    resultado["Categoria"] = [categoria(p) for p in probs]
+    return resultado
+
+def _leer_chunks(saltar_filas=0):
+    # skiprows salta las filas ya puntuadas sin parsearlas
+    lector = pd.read_csv(ARCHIVO_DATASET, sep=SEPARADOR_CSV, encoding='utf-8-sig', chunksize=TAMANO_CHUNK,
+                         skiprows=range(1, saltar_filas + 1), dtype={"Entry_ID": str})
+    inicio = saltar_filas
+    for chunk in lector:
+        yield inicio, chunk
+        inicio += len(chunk)
+
+def _almacen_para(n_filas):
+    """Almacén del extractor si corresponde a este dataset; si no, se reconstruye por bloques"""
+    almacen = feature_store.cargar_almacen()
+    if almacen is not None and almacen.volumen_total == n_filas: return almacen
+    print("[WARN] Almacén de features ausente o desactualizado: se reconstruye desde el dataset.")
+    almacen = None
+    for _, chunk in _leer_chunks():
+        almacen = feature_store.construir_desde_dataset(chunk, almacen)
+    return almacen
+
+def _recencia_global():
+    """Remitente_Dias_Previo de cada fila sobre el historial completo: depende del correo
+    anterior del remitente, que puede caer en otro bloque. Solo se leen dos columnas."""
+    columnas = lambda c: c in ("Remitente_ID", "Fecha_Recepcion")
+    df = pd.read_csv(ARCHIVO_DATASET, sep=SEPARADOR_CSV, encoding='utf-8-sig', usecols=columnas)
+    df['Remitente_ID'] = df['Remitente_ID'].fillna(0)  # Igual que preparar_chunk
+    return feature_store.dias_previos(df).values
+
+def _contar_filas():
+    with open(ARCHIVO_DATASET, "rb") as f:
+        return max(sum(bloque.count(b"\n") for bloque in iter(lambda: f.read(1 << 20), b"")) - 1, 0)
+
+# --- 🚀 BACKFILL ---
+@profiling.perfilable("backfill")
+def ejecutar_backfill(reiniciar=False, n_procesos=None, cancelar=None):
+    """`cancelar`: threading.Event de esta ejecución; al activarse se escribe lo ya puntuado y se
+    detiene (el punto de control permite retomar)"""
+    print("--- 🗄️ BACKFILL: SCORING OFFLINE DEL HISTORIAL ---")
+    cancelar = cancelar or threading.Event()
+    if n_procesos is None: n_procesos = N_PROCESOS if N_PROCESOS is not None else os.cpu_count()
+    try:
+        version, firma = version_modelo(ARCHIVO_MODELO), firma_dataset()
+    except OSError as e:
+        print(f"❌ Falta el modelo o el dataset: {e}")
+        return False
+
+    rojo, amarillo, origen = threshold_calibration.cargar_umbrales(ARCHIVO_MODELO, version,
+                                                                   (UMBRAL_ROJO, UMBRAL_AMARILLO))
+    umbrales = [rojo, amarillo]
+    control = None if reiniciar else cargar_punto_control()
+    if control and (control.get("version_modelo"), control.get("dataset"), control.get("tamano_chunk"),
+                    control.get("umbrales")) != (version, firma, TAMANO_CHUNK, umbrales):
+        print("♻️ El modelo, sus umbrales o el dataset cambiaron desde el último backfill: se empieza de cero.")
+        control = None
+    if control and control.get("completo"):
+        print(f"✅ Backfill ya completo para este modelo ({control['filas']} filas en {ARCHIVO_RESULTADOS}).")
+        return True
+    if control is None:
+        control = {"version_modelo": version, "dataset": firma, "tamano_chunk": TAMANO_CHUNK, "umbrales": umbrales,
+                   "filas": 0, "bytes": 0, "completo": False, "aplicadas": 0}
+    elif control["filas"]:
+        print(f"⏯️ Retomando desde la fila {control['filas']}")
+
+    # Lo escrito después del último punto de control (interrupción a mitad de bloque) se descarta
+    with open(ARCHIVO_RESULTADOS, "a+b") as f: f.truncate(control["bytes"])
+
+    total = _contar_filas()
+    almacen = _almacen_para(total)
+    recencia = _recencia_global()
+    print(f"📊 {total} filas | bloques de {TAMANO_CHUNK} | "
+          f"{n_procesos or 1} proceso(s) | modelo {version}")
+    print(f"🎚️ Umbrales: urgente ≥ {rojo:.2f} | revisar ≥ {amarillo:.2f} ({origen})")
+
+    inicio = time.perf_counter()
+    filas_sesion = 0
+    pool = ProcessPoolExecutor(n_procesos, initializer=_inicializar_trabajador,
+                               initargs=(ARCHIVO_MODELO, almacen, tuple(umbrales))) if n_procesos else None
+    if pool is None: _inicializar_trabajador(ARCHIVO_MODELO, almacen, tuple(umbrales))
+    try:
+        with open(ARCHIVO_RESULTADOS, "a", encoding="utf-8", newline="") as salida:
+            en_vuelo = deque()
+            chunks = _leer_chunks(control["filas"])
+
+            def escribir(resultado):
+                nonlocal filas_sesion
+                resultado.to_csv(salida, index=False, sep=SEPARADOR_CSV, header=salida.tell() == 0)
+                salida.flush()
+                control["filas"] += len(resultado)
+                control["bytes"] = salida.tell()
+                guardar_punto_control(control)
+                filas_sesion += len(resultado)
+                duracion = time.perf_counter() - inicio
+                print(f"   ... {control['filas']}/{total} filas ({filas_sesion / duracion * 60:,.0f} filas/min)")
+
+            for fila_inicio, chunk in chunks:
+                if cancelar.is_set(): break
+                dias_previo = recencia[fila_inicio:fila_inicio + len(chunk)]
+                if pool is None:
+                    escribir(puntuar_chunk(fila_inicio, chunk, dias_previo))
+                    continue
+                en_vuelo.append(pool.submit(puntuar_chunk, fila_inicio, chunk, dias_previo))
+                # Pocos bloques en vuelo: memoria acotada y resultados escritos en orden
+                while len(en_vuelo) >= 2 * n_procesos: escribir(en_vuelo.popleft().result())
+            while en_vuelo:
+                futuro = en_vuelo.popleft()
+                if cancelar.is_set(): futuro.cancel()
+                else: escribir(futuro.result())
+    finally:
+        if pool is not None: pool.shutdown(cancel_futures=True)
+
+    duracion = time.perf_counter() - inicio
+    if cancelar.is_set() or control["filas"] < total:
+        print(f"⏹️ Backfill detenido en la fila {control['filas']}: se retoma en la próxima ejecución.")
+        return False
+    control["completo"] = True
+    guardar_punto_control(control)
+    print(f"✅ Backfill terminado: {filas_sesion} filas en {duracion:.1f}s "
+          f"({filas_sesion / max(duracion, 1e-9) * 60:,.0f} filas/min) → {ARCHIVO_RESULTADOS}")
+    resumen = pd.read_csv(ARCHIVO_RESULTADOS, sep=SEPARADOR_CSV, usecols=["Categoria"],
+                          keep_default_na=False)["Categoria"].replace("", "(ninguna)").value_counts()
+    for nombre, n in resumen.items(): print(f"   {nombre}: {n}")
+    return True
+
+# --- 🏷️ APLICAR CATEGORÍAS ---
+def etiquetar(item, categoria):
+    if item.Categories == categoria: return False
+    item.Categories = categoria
+    item.Save()
+    return True
+
+def aplicar_categorias(cancelar=None):
+    """Pasada COM (un solo hilo) con ritmo limitado; retoma donde quedó la anterior"""
+    cancelar = cancelar or threading.Event()
+    control = cargar_punto_control()
+    if not control or not control.get("completo"):
+        print("❌ Primero completa el backfill (python 04_backfill_scorer.py).")
+        return
+    print(f"--- 🏷️ APLICANDO CATEGORÍAS ({APLICAR_POR_SEGUNDO:g} items/s máx.) ---")
+    resultados = pd.read_csv(ARCHIVO_RESULTADOS, sep=SEPARADOR_CSV, dtype={"Entry_ID": str},
+                             usecols=["Entry_ID", "Categoria"], keep_default_na=False)
+    if control["aplicadas"]: print(f"⏯️ Retomando desde la fila {control['aplicadas']}")
+
+    outlook_app = profiling.envolver_com(mailbox_access.abrir_outlook(), "Application")
+    namespace = outlook_app.GetNamespace("MAPI")
+    for nombre, color in (("IA Urgente", 1), ("IA Revisar", 2)):
+        try: namespace.Categories.Item(nombre)
+        except: namespace.Categories.Add(nombre, color)
+
+    inicio, consultas, guardados, errores = time.perf_counter(), 0, 0, 0
+    pendientes = resultados.iloc[control["aplicadas"]:]
+    for fila, (entry_id, cat) in enumerate(zip(pendientes["Entry_ID"], pendientes["Categoria"]),
+                                            start=control["aplicadas"]):
+        if cancelar.is_set(): break
+        if cat and entry_id:
+            # El ritmo cuenta cada GetItemFromID (también ya etiquetados o no encontrados), no solo los Save
+            espera = inicio + consultas / APLICAR_POR_SEGUNDO - time.perf_counter()
+            if espera > 0: time.sleep(espera)
+            consultas += 1
+            try:
+                if etiquetar(namespace.GetItemFromID(entry_id), cat): guardados += 1
+            except: errores += 1  # Movido o eliminado desde la extracción
+        control["aplicadas"] = fila + 1
+        if control["aplicadas"] % GUARDAR_CONTROL_CADA == 0: guardar_punto_control(control)
+    guardar_punto_control(control)
+    mailbox_access.finalizar()
+    print(f"✅ Categorías aplicadas: {guardados} guardados | {consultas - guardados - errores} ya etiquetados | "
+          f"{errores} no encontrados | "
+          f"{control['aplicadas']}/{len(resultados)} filas revisadas en {time.perf_counter() - inicio:.1f}s")
+
+if __name__ == "__main__":
+    profiling.ACTIVO = "--perfilar" in sys.argv
+    mailbox_access.configurar_desde_argv(sys.argv)
+    if "--modelo" in sys.argv: ARCHIVO_MODELO = sys.argv[sys.argv.index("--modelo") + 1]
+    procesos = int(sys.argv[sys.argv.index("--procesos") + 1]) if "--procesos" in sys.argv else None
+    if ejecutar_backfill(reiniciar="--reiniciar" in sys.argv, n_procesos=procesos) and "--aplicar" in sys.argv:
+        aplicar_categorias()
@@ -22,6 +22,7 @@ from catboost import CatBoostClassifier
 from sklearn.base import BaseEstimator, ClassifierMixin
 from collections import Counter
 import re
+import profiling
 
 # --- CONFIGURACIÓN GLOBAL ---
 ctk.set_appearance_mode("Dark")
@@ -40,6 +41,9 @@ FONT_HEADER = ("Segoe UI", 24, "bold")
 FONT_KPI_VAL = ("Segoe UI", 36, "bold")
 FONT_KPI_TITLE = ("Segoe UI", 11, "bold")
 
+# Consola: en vigilancia continua se conservan solo las últimas líneas (memoria y objetos GDI acotados)
+MAX_LINEAS_CONSOLA = 2000
+
 # --- IMPORTACIÓN DINÁMICA DE MÓDULOS ---
 try:
     import importlib
@@ -47,14 +51,17 @@ try:
     trainer = importlib.import_module("02_model_trainer")
     inference = importlib.import_module("03_inference_engine")
 except ImportError as e:
-    # Mocking
+    # Mocking (visible: antes esto ocultaba cualquier error de importación)
+    print(f"[WARN] Módulos backend no disponibles ({e}). La interfaz usará módulos simulados.")
     class MockModule:
         MI_NOMBRE_MOSTRAR = ""
         MI_EMAIL_CORPORATIVO = ""
         DIAS_HISTORIAL = 0
-        def generar_dataset_masivo(self): pass
+        def generar_dataset_masivo(self, dias=None, extraer_cuerpo=None, cancelar=None): pass
         def entrenar_modelo_definitivo(self): pass
-        def ejecutar_vigilancia(self): pass
+        def entrenar_modelo_streaming(self): pass
+        def ejecutar_vigilancia(self, cancelar=None): pass
+        def vigilar_continuamente(self, intervalo=None, max_ciclos=None, cancelar=None): pass
     extractor = MockModule()
     trainer = MockModule()
     inference = MockModule()
@@ -85,6 +92,9 @@ class CommandRedirector:
         if not text.strip(): return
         self.widget.insert("end", text + "\n")
         if self.tag_parser: self.tag_parser(text)
+        lineas = int(self.widget.index("end-1c").split(".")[0])
+        if lineas > MAX_LINEAS_CONSOLA:
+            self.widget.delete("1.0", f"{lineas - MAX_LINEAS_CONSOLA + 1}.0")
         self.widget.see("end")
 
     def flush(self): pass
@@ -222,6 +232,10 @@ class MonitorView_V3(ctk.CTkFrame):
                                  command=self.run)
         self.btn.pack(fill="x", pady=20)
         
+        self.btn_stop = ctk.CTkButton(self, text="DETENER", height=35, fg_color="#B71C1C", hover_color="#7F0000",
+                                      font=("Segoe UI", 12, "bold"), command=self.stop)
+        self.cancelar = threading.Event()  # Propio de esta vista: nuevo en cada INICIAR
+        
         # Loader
         self.loader = ctk.CTkProgressBar(self, mode="indeterminate", height=4, fg_color="#1A1A1A", progress_color=COLOR_ACCENT)
         self.loader.pack(fill="x")
@@ -234,6 +248,9 @@ class MonitorView_V3(ctk.CTkFrame):
         self.counts = {'total':0, 'urgent':0, 'low':0}
         self.update_ui()
         self.btn.configure(state="disabled", text="VIGILANDO...")
+        self.cancelar = threading.Event()
+        self.btn_stop.configure(state="normal", text="DETENER")
+        self.btn_stop.pack(fill="x", pady=(0, 10), after=self.btn)
         
         # Mostrar Loader
         self.loader.pack(fill="x")
@@ -241,15 +258,23 @@ class MonitorView_V3(ctk.CTkFrame):
         
         threading.Thread(target=self._thread, daemon=True).start()
 
+    def stop(self):
+        # El pipeline deja de leer, escribe lo ya puntuado y termina sus hilos
+        self.cancelar.set()
+        self.btn_stop.configure(state="disabled", text="DETENIENDO...")
+
     def _thread(self):
         pythoncom.CoInitialize()
         sys.stdout = CommandRedirector(self.console, self._parse)
-        try: inference.ejecutar_vigilancia()
+        # Ciclos en el mismo proceso hasta DETENER; entre ciclos se liberan COM y caches
+        try: inference.vigilar_continuamente(cancelar=self.cancelar)
         except Exception as e: print(f"Error: {e}")
         finally:
+            pythoncom.CoUninitialize()
             # Ocultar Loader
             self.loader.stop()
             self.loader.pack_forget()
+            self.btn_stop.pack_forget()
             self.btn.configure(state="normal", text="REINICIAR VIGILANCIA")
 
     def _parse(self, text):
@@ -475,6 +500,7 @@ class SetupView_V3(ctk.CTkFrame):
         # Estilo de config limpio
         self._section("1. Minería de Datos", "Configura tus credenciales y rango de extracción.", self._build_etl)
         self._section("2. Entrenamiento AI", "Entrena el cerebro con los datos extraídos.", self._build_train)
+        self._section("3. Diagnóstico", "Perfila extracción, entrenamiento y vigilancia (CPU, llamadas COM, memoria).", self._build_diag)
 
         # Console Log (Restaurado)
         ctk.CTkLabel(self, text="Registro de Operaciones:", font=("Segoe UI", 12, "bold"), text_color="gray").pack(anchor="w", pady=(10,0))
@@ -487,6 +513,10 @@ class SetupView_V3(ctk.CTkFrame):
         self.console = ctk.CTkTextbox(self, height=150, font=("Consolas", 11), fg_color="#0D0D0D", border_width=1, border_color="#333", text_color="#00FF00")
         self.console.pack(fill="both", expand=True, pady=10)
 
+        self.btn_stop = ctk.CTkButton(self, text="DETENER", height=30, fg_color="#B71C1C", hover_color="#7F0000",
+                                      font=("Segoe UI", 11, "bold"), command=self.stop)
+        self.cancelar = None  # Event de la tarea detenible en curso (independiente de la vigilancia)
+
     def _section(self, title, sub, builder):
         f = ctk.CTkFrame(self, fg_color=COLOR_CARD, corner_radius=12)
         f.pack(fill="x", pady=(0,15))
@@ -502,6 +532,11 @@ class SetupView_V3(ctk.CTkFrame):
         self.entry_email = self._input(grid, "Tu Email", "wllana@unibanca.pe")
         self.entry_days = self._input(grid, "Días", "365", width=60)
         
+        self.chk_cuerpo = ctk.CTkCheckBox(parent, text="Extraer fragmento del cuerpo (no se usa para entrenar)",
+                                          text_color="gray", font=("Segoe UI", 11))
+        self.chk_cuerpo.select()
+        self.chk_cuerpo.pack(anchor="w", padx=20)
+        
         self.btn_etl = ctk.CTkButton(parent, text="EJECUTAR DATA MINING", fg_color="#F9A825", text_color="black", height=40, font=("Segoe UI", 12, "bold"),
                       command=self.run_etl)
         self.btn_etl.pack(fill="x", padx=20, pady=20)
@@ -516,26 +551,51 @@ class SetupView_V3(ctk.CTkFrame):
         return e
 
     def _build_train(self, parent):
+        self.chk_streaming = ctk.CTkCheckBox(parent, text="Modo streaming (memoria acotada, buzones grandes)",
+                                             text_color="gray", font=("Segoe UI", 11))
+        self.chk_streaming.pack(anchor="w", padx=20, pady=(10,0))
         self.btn_train = ctk.CTkButton(parent, text="ENTRENAR MODELO", fg_color="#0277BD", height=40, font=("Segoe UI", 12, "bold"),
                       command=self.run_train)
         self.btn_train.pack(fill="x", padx=20, pady=20)
 
+    def _build_diag(self, parent):
+        self.chk_perfil = ctk.CTkCheckBox(parent, text=f"Modo perfilado (reporte en la carpeta '{profiling.DIRECTORIO_REPORTES}')",
+                                          text_color="gray", font=("Segoe UI", 11), command=self._toggle_perfil)
+        self.chk_perfil.pack(anchor="w", padx=20, pady=(0,15))
+
+    def _toggle_perfil(self):
+        profiling.ACTIVO = bool(self.chk_perfil.get())
+
     def run_etl(self): 
         extractor.MI_NOMBRE_MOSTRAR = self.entry_name.get()
         extractor.MI_EMAIL_CORPORATIVO = self.entry_email.get()
         dias = 365
         try: dias = int(self.entry_days.get())
         except: pass
-        self._run_thread(lambda: extractor.generar_dataset_masivo(dias), self.btn_etl)
-
-    def run_train(self): self._run_thread(trainer.entrenar_modelo_definitivo, self.btn_train)
+        cuerpo = bool(self.chk_cuerpo.get())
+        cancelar = threading.Event()
+        self._run_thread(lambda: extractor.generar_dataset_masivo(dias, extraer_cuerpo=cuerpo, cancelar=cancelar),
+                         self.btn_etl, cancelar=cancelar)
+
+    def run_train(self):
+        if self.chk_streaming.get(): self._run_thread(trainer.entrenar_modelo_streaming, self.btn_train)
+        else: self._run_thread(trainer.entrenar_modelo_definitivo, self.btn_train)
     
-    def _run_thread(self, target, active_btn=None):
+    def stop(self):
+        if self.cancelar is not None: self.cancelar.set()
+        self.btn_stop.configure(state="disabled", text="DETENIENDO...")
+
+    def _run_thread(self, target, active_btn=None, cancelar=None):
+        """`cancelar`: Event que `target` consulta; solo entonces se muestra DETENER"""
         self.console.delete("1.0", "end")
         
         if active_btn: active_btn.configure(state="disabled")
         self.loader.pack(fill="x", pady=(5,0), before=self.console)
         self.loader.start()
+        self.cancelar = cancelar
+        if cancelar is not None:
+            self.btn_stop.configure(state="normal", text="DETENER")
+            self.btn_stop.pack(fill="x", pady=(5,0), before=self.console)
         
         def task_wrapper():
             pythoncom.CoInitialize()
@@ -550,6 +610,7 @@ class SetupView_V3(ctk.CTkFrame):
                 sys.stdout = original
                 self.loader.stop()
                 self.loader.pack_forget()
+                self.btn_stop.pack_forget()
                 if active_btn: active_btn.configure(state="normal")
 
         threading.Thread(target=task_wrapper, daemon=True).start()
@@ -0,0 +1,62 @@
+"""
+Latencia de lookup y memoria del almacén de features con 100k remitentes distintos.
+
+Uso: python benchmarks/bench_almacen.py [n_remitentes] [correos_por_remitente]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import feature_store
+
+
+def main(n_remitentes=100000, por_remitente=5):
+    rnd = np.random.default_rng(0)
+    n = n_remitentes * por_remitente
+    remitentes = np.array([f"usuario{i}@dominio{i % 2000}.com" for i in range(n_remitentes)])
+    idx = rnd.integers(0, n_remitentes, n)
+    idx[:n_remitentes] = np.arange(n_remitentes)  # Garantiza todos los remitentes
+    df = pd.DataFrame({
+        'Remitente_ID': remitentes[idx],
+        'Dominio': [r.split("@")[1] for r in remitentes[idx]],
+        'TARGET_IA': rnd.choice([0, 1, 2], n),
+        'Fecha_Recepcion': pd.Timestamp("2025-01-01") + pd.to_timedelta(rnd.integers(0, 365 * 1440, n), unit="min"),
+    })
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    almacen = feature_store.construir_desde_dataset(df)
+    construccion = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "almacen.joblib")
+        almacen.guardar(ruta)
+        tamano = os.path.getsize(ruta)
+        inicio = time.perf_counter()
+        feature_store.cargar_almacen(ruta)
+        carga = time.perf_counter() - inicio
+
+    consultas = remitentes[rnd.integers(0, n_remitentes, 200000)]
+    dominios = [c.split("@")[1] for c in consultas]
+    inicio = time.perf_counter()
+    for r, d in zip(consultas, dominios):
+        almacen.features(r, d)
+    lookup = (time.perf_counter() - inicio) / len(consultas)
+
+    print(f"{len(almacen.remitentes):,} remitentes / {len(almacen.dominios):,} dominios ({n:,} correos)")
+    print(f"Construcción:        {construccion:.2f} s")
+    print(f"Memoria del almacén: {memoria / 2**20:.1f} MB (tracemalloc)")
+    print(f"Archivo joblib:      {tamano / 2**20:.1f} MB, carga en {carga * 1000:.0f} ms")
+    print(f"Lookup features():   {lookup * 1e6:.2f} µs por consulta")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
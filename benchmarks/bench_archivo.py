@@ -0,0 +1,107 @@
+"""
+Archivo crudo (raw_archive.py): costo en la extracción, tamaño y re-derivación sin Outlook.
+
+Buzón falso con cuerpos de texto variado (palabras con frecuencia Zipf, no un párrafo
+repetido que comprimiría de forma irreal). Mide:
+  1. extracción sin / con archivo crudo (mismo dataset en ambos casos),
+  2. tamaño del archivo: total, por 100k mensajes y frente a dataset_masivo.csv,
+  3. re-derivación --desde-archivo en este proceso y con 1..N procesos: el dataset debe
+     ser idéntico al de la extracción; con otra regla de ground truth, cambia sin Outlook.
+
+Uso: python benchmarks/bench_archivo.py [n_mensajes] [max_procesos]
+"""
+import hashlib
+import importlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+import comun
+import mailbox_access
+import raw_archive
+from buzon_falso import generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+
+
+def _silencio(funcion, *args, **kwargs):
+    with redirect_stdout(io.StringIO()) as salida:
+        inicio = time.perf_counter()
+        funcion(*args, **kwargs)
+    return time.perf_counter() - inicio, salida.getvalue()
+
+
+def _md5(ruta):
+    with open(ruta, "rb") as f: return hashlib.md5(f.read()).hexdigest()
+
+
+def _cuerpos_variados(aplicacion, semilla=5):
+    rnd = np.random.RandomState(semilla)
+    vocab = np.array([f"palabra{i}" for i in range(20000)])
+    pesos = 1 / np.arange(1, len(vocab) + 1)
+    pesos /= pesos.sum()
+    for carpeta in aplicacion.Session._carpetas():
+        for item in carpeta._items:
+            item._cuerpo = " ".join(rnd.choice(vocab, size=260, p=pesos))
+
+
+def main(n_mensajes=20000, max_procesos=None):
+    max_procesos = max_procesos or os.cpu_count()
+    carpeta = tempfile.mkdtemp()
+    os.chdir(carpeta)
+    try:
+        aplicacion, _ = generar_outlook(n_mensajes)
+        _cuerpos_variados(aplicacion)
+        mailbox_access.configurar("objeto", aplicacion=aplicacion)
+
+        extractor.GUARDAR_ARCHIVO_CRUDO = False
+        t_sin, _ = _silencio(extractor.generar_dataset_masivo, 365)
+        md5_sin = _md5(extractor.ARCHIVO_DATASET)
+        extractor.GUARDAR_ARCHIVO_CRUDO = True
+        t_con, salida = _silencio(extractor.generar_dataset_masivo, 365)
+        md5_extraccion = _md5(extractor.ARCHIVO_DATASET)
+        print(f"1) Extracción de {n_mensajes} mensajes | sin archivo {t_sin:.1f}s | con archivo {t_con:.1f}s "
+              f"({(t_con / t_sin - 1):+.0%}) | mismo dataset: {md5_sin == md5_extraccion}")
+
+        meta, bloques = raw_archive.leer_indice()
+        crudos = sum(b["n"] for b in bloques)
+        tamano = os.path.getsize(raw_archive.ARCHIVO_CRUDO)
+        sin_comprimir = sum(b["sin_comprimir"] for b in bloques)
+        csv = os.path.getsize(extractor.ARCHIVO_DATASET)
+        print(f"\n2) {raw_archive.resumen()}")
+        print(f"   {crudos} crudos (incluye copias) | {tamano / crudos:.0f} B/mensaje comprimido, "
+              f"{sin_comprimir / crudos:.0f} B sin comprimir | dataset_masivo.csv {csv / 2 ** 20:.1f} MB "
+              f"({csv / crudos * 100000 / 2 ** 20:.0f} MB por 100k)")
+
+        print(f"\n3) Re-derivación desde el archivo ({len(bloques)} bloques de {raw_archive.TAMANO_BLOQUE})")
+        for procesos in [0] + list(range(1, max_procesos + 1)):
+            os.remove(extractor.ARCHIVO_DATASET)
+            duracion, _ = _silencio(extractor.rederivar_dataset, procesos)
+            nombre = "en proceso" if procesos == 0 else f"{procesos} proceso(s)"
+            print(f"   {nombre:<14} {duracion:5.1f}s | {crudos / duracion * 60:>9,.0f} mensajes/min | "
+                  f"~{duracion / crudos * 100000 / 60:.1f} min por 100k | "
+                  f"idéntico a la extracción: {_md5(extractor.ARCHIVO_DATASET) == md5_extraccion}")
+
+        antes = {k: int(v) for k, v in pd.read_csv(extractor.ARCHIVO_DATASET, sep="|")["TARGET_IA"]
+                 .value_counts().sort_index().items()}
+        extractor.DIAS_PARA_IGNORADO = 30
+        duracion, _ = _silencio(extractor.rederivar_dataset, 0)
+        despues = {k: int(v) for k, v in pd.read_csv(extractor.ARCHIVO_DATASET, sep="|")["TARGET_IA"]
+                   .value_counts().sort_index().items()}
+        print(f"   Regla nueva (ignorado = no leído hace 30 días) en {duracion:.1f}s sin tocar el buzón: "
+              f"TARGET_IA {antes} -> {despues}")
+    finally:
+        os.chdir(comun.RAIZ_REPO)
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20000, int(args[1]) if len(args) > 1 else None)
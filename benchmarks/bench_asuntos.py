@@ -0,0 +1,72 @@
+"""
+Memo de asuntos (text_features.VectorizadorAsuntos) vs. TfidfVectorizer directo.
+
+Corpus sintético con la repetición de un buzón real: pocos asuntos muy frecuentes
+(reportes diarios, notificaciones) con cola larga (Zipf), prefijos RE:/FW: variables
+y espacios irregulares. Mide:
+  * ajuste + transformación del entrenamiento (todo el corpus),
+  * scoring por lotes de 32 como en la vigilancia, con distintos tamaños de memo.
+
+Uso: python benchmarks/bench_asuntos.py [n_filas] [n_asuntos_distintos]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import text_features
+
+PREFIJOS = ["", "", "", "RE: ", "RE: RE: ", "FW: ", "RE: FW: ", "RV: ", "re:  "]
+
+
+def generar_asuntos(n_filas, n_distintos, semilla=3):
+    rnd = random.Random(semilla)
+    vocab = [f"pal{i}" for i in range(5000)]
+    base = [" ".join(rnd.choice(vocab) for _ in range(rnd.randint(3, 9))) for _ in range(n_distintos)]
+    pesos = 1 / np.arange(1, n_distintos + 1) ** 1.1  # Zipf: "Reporte diario" domina
+    elegidos = np.random.RandomState(semilla).choice(n_distintos, size=n_filas, p=pesos / pesos.sum())
+    return pd.Series([rnd.choice(PREFIJOS) + base[i].replace(" ", rnd.choice([" ", "  "]), 1) for i in elegidos])
+
+
+def _tiempo(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def main(n_filas=200000, n_distintos=20000):
+    asuntos = generar_asuntos(n_filas, n_distintos)
+    normalizados = pd.Series([text_features.normalizar_asunto(a) for a in asuntos])
+    print(f"{n_filas} asuntos | {asuntos.nunique()} distintos en crudo | {normalizados.str.lower().nunique()} "
+          f"normalizados\n")
+
+    # Entrenamiento: ajuste + transformación de todo el corpus
+    config = dict(max_features=500, ngram_range=(1, 2))
+    t_base, _ = _tiempo(lambda: TfidfVectorizer(**config).fit_transform(asuntos))
+    memo = text_features.VectorizadorAsuntos(TfidfVectorizer(**config))
+    t_memo, matriz = _tiempo(lambda: memo.fit_transform(asuntos))
+    referencia = TfidfVectorizer(**config).fit(normalizados)
+    diferencia = abs(referencia.transform(normalizados) - matriz).max()
+    print(f"entrenamiento | TfidfVectorizer {t_base:.2f}s | memo {t_memo:.2f}s ({t_base / t_memo:.1f}x) | "
+          f"máx. diferencia vs TF-IDF sobre asuntos normalizados: {diferencia:.1e}")
+
+    # Vigilancia: lotes de 32, memo frío, con distintos límites de tamaño
+    lotes = [asuntos.iloc[i:i + 32] for i in range(0, min(n_filas, 50000), 32)]
+    vectorizador = memo.vectorizador_
+    t_base, _ = _tiempo(lambda: [vectorizador.transform(l) for l in lotes])
+    print(f"scoring (lotes de 32) | TfidfVectorizer {t_base / (32 * len(lotes)) * 1e6:.0f} µs/asunto")
+    for tamano in (1000, 5000, text_features.TAMANO_MEMO):
+        memo.set_params(tamano_memo=tamano)
+        memo._reiniciar_memo()
+        t_memo, _ = _tiempo(lambda: [memo.transform(l) for l in lotes])
+        print(f"   memo {tamano:>6} | {t_memo / (32 * len(lotes)) * 1e6:.0f} µs/asunto "
+              f"({t_base / t_memo:.1f}x) | {memo.resumen()}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200000, int(args[1]) if len(args) > 1 else 20000)
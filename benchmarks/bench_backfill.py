@@ -0,0 +1,157 @@
+"""
+Backfill offline (04_backfill_scorer.py): throughput, reanudación y aplicación al buzón.
+
+1. Throughput: modelo entrenado sobre 20k filas, backfill de un dataset sintético grande
+   en este proceso y con 1..N procesos del pool.
+2. Reanudación: un backfill en subproceso se mata a mitad de camino y se retoma; el archivo
+   de resultados debe quedar idéntico al de una sola pasada.
+3. Aplicar: buzón falso -> extracción -> entrenamiento -> backfill -> categorías aplicadas
+   con ritmo limitado.
+4. Features por bloques: las columnas del almacén que no excluyen el propio bloque (volumen y
+   recencia del remitente) deben ser idénticas a las calculadas sobre el dataset completo.
+
+Uso: python benchmarks/bench_backfill.py [n_filas] [max_procesos]
+"""
+import hashlib
+import importlib
+import io
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+import comun
+import feature_store
+import mailbox_access
+from buzon_falso import generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+backfill = importlib.import_module("04_backfill_scorer")
+
+
+def _silencio(funcion, *args, **kwargs):
+    with redirect_stdout(io.StringIO()) as salida:
+        resultado = funcion(*args, **kwargs)
+    return resultado, salida.getvalue()
+
+
+def _md5(ruta):
+    with open(ruta, "rb") as f: return hashlib.md5(f.read()).hexdigest()
+
+
+def _limpiar():
+    for ruta in (backfill.ARCHIVO_RESULTADOS, backfill.ARCHIVO_PUNTO_CONTROL):
+        if os.path.exists(ruta): os.remove(ruta)
+
+
+def throughput(n_filas, max_procesos):
+    comun.generar_dataset_sintetico("dataset_masivo.csv", 20000)
+    _silencio(trainer.entrenar_modelo_definitivo)
+    comun.generar_dataset_sintetico("dataset_masivo.csv", n_filas, semilla=7)
+    print(f"1) Throughput sobre {n_filas} filas (bloques de {backfill.TAMANO_CHUNK})")
+    for procesos in [0] + list(range(1, max_procesos + 1)):
+        _limpiar()
+        inicio = time.perf_counter()
+        _silencio(backfill.ejecutar_backfill, n_procesos=procesos)
+        duracion = time.perf_counter() - inicio
+        nombre = "en proceso" if procesos == 0 else f"{procesos} proceso(s)"
+        print(f"   {nombre:<14} {duracion:6.1f}s | {n_filas / duracion * 60:>10,.0f} filas/min")
+    return _md5(backfill.ARCHIVO_RESULTADOS)
+
+
+def reanudacion(md5_completo):
+    _limpiar()
+    comando = [sys.executable, os.path.join(comun.RAIZ_REPO, "04_backfill_scorer.py"), "--procesos", "1"]
+    proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+                               env={**os.environ, "PYTHONPATH": comun.RAIZ_REPO}, start_new_session=True)
+    for linea in proceso.stdout:
+        if linea.strip().startswith("..."):  # Primer bloque escrito: interrupción a mitad de camino
+            # Se mata también el trabajador del pool (como al cerrar la consola)
+            if hasattr(os, "killpg"): os.killpg(proceso.pid, signal.SIGKILL)
+            else: proceso.kill()
+            break
+    proceso.wait()
+    filas = backfill.cargar_punto_control()["filas"]
+    _, salida = _silencio(backfill.ejecutar_backfill, n_procesos=1)
+    retomado = "⏯️" in salida
+    print(f"\n2) Reanudación: interrumpido tras {filas} filas, retomado={retomado}, "
+          f"resultado idéntico a una pasada completa: {_md5(backfill.ARCHIVO_RESULTADOS) == md5_completo}")
+
+
+def aplicar(n_mensajes=2000):
+    aplicacion, _ = generar_outlook(n_mensajes)
+    mailbox_access.configurar("objeto", aplicacion=aplicacion)
+    _silencio(extractor.generar_dataset_masivo, 365)
+    _silencio(trainer.entrenar_modelo_definitivo)
+    _limpiar()
+    _silencio(backfill.ejecutar_backfill, n_procesos=0)
+    backfill.APLICAR_POR_SEGUNDO = 200.0
+    inicio = time.perf_counter()
+    _, salida = _silencio(backfill.aplicar_categorias)
+    duracion = time.perf_counter() - inicio
+    namespace = aplicacion.Session
+    etiquetados = sum(1 for c in namespace._carpetas() for i in c._items if i.Categories)
+    print(f"\n3) Aplicar: {salida.strip().splitlines()[-1]}")
+    print(f"   {etiquetados} items con categoría en el buzón | ritmo {etiquetados / duracion:.0f}/s "
+          f"(límite {backfill.APLICAR_POR_SEGUNDO:g}/s)")
+    # Segunda pasada: todo ya etiquetado, ningún Save; las consultas deben seguir el mismo ritmo
+    control = backfill.cargar_punto_control()
+    control["aplicadas"] = 0
+    backfill.guardar_punto_control(control)
+    inicio = time.perf_counter()
+    _, salida = _silencio(backfill.aplicar_categorias)
+    duracion = time.perf_counter() - inicio
+    print(f"   Repetida: {salida.strip().splitlines()[-1]}")
+    print(f"   ritmo de consultas {etiquetados / duracion:.0f}/s (límite {backfill.APLICAR_POR_SEGUNDO:g}/s)")
+
+
+def features_por_bloques(n_mensajes=6000, tamano_chunk=1000):
+    aplicacion, _ = generar_outlook(n_mensajes)
+    mailbox_access.configurar("objeto", aplicacion=aplicacion)
+    _silencio(extractor.generar_dataset_masivo, 365)
+    almacen = feature_store.cargar_almacen()
+    completo = pd.read_csv(backfill.ARCHIVO_DATASET, sep=backfill.SEPARADOR_CSV, encoding='utf-8-sig',
+                           dtype={"Entry_ID": str})
+    referencia = backfill.preparar_chunk(completo, None, almacen)
+    recencia = backfill._recencia_global()
+    bloques = [completo.iloc[i:i + tamano_chunk] for i in range(0, len(completo), tamano_chunk)]
+    columnas = ['Remitente_Volumen', 'Remitente_Dias_Previo']
+    print(f"\n4) Features por bloques: {len(completo)} filas, {completo['Remitente_ID'].nunique()} remitentes, "
+          f"{len(bloques)} bloques de {tamano_chunk}")
+    for nombre, recencia_bloque in (("recencia del bloque", lambda i: None),
+                                    ("recencia global", lambda i: recencia[i:i + tamano_chunk])):
+        por_bloques = pd.concat([backfill.preparar_chunk(b, recencia_bloque(i), almacen)
+                                 for i, b in zip(range(0, len(completo), tamano_chunk), bloques)],
+                                ignore_index=True)
+        distintas = (~np.isclose(por_bloques[columnas], referencia[columnas])).any(axis=1).mean()
+        sin_historia = (por_bloques['Remitente_Dias_Previo'] == feature_store.DIAS_SIN_HISTORIA).mean()
+        print(f"   {nombre:<20} filas distintas del cálculo completo: {distintas:.1%} | "
+              f"recencia por defecto {sin_historia:.1%} (completo "
+              f"{(referencia['Remitente_Dias_Previo'] == feature_store.DIAS_SIN_HISTORIA).mean():.1%})")
+
+
+def main(n_filas=300000, max_procesos=None):
+    max_procesos = max_procesos or os.cpu_count()
+    carpeta = tempfile.mkdtemp()
+    os.chdir(carpeta)
+    try:
+        md5_completo = throughput(n_filas, max_procesos)
+        reanudacion(md5_completo)
+        aplicar()
+        features_por_bloques()
+    finally:
+        os.chdir(comun.RAIZ_REPO)
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 300000, int(args[1]) if len(args) > 1 else None)
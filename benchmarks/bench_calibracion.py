@@ -0,0 +1,116 @@
+"""
+Calibración de umbrales (threshold_calibration.py): barrido vectorizado vs. bucle por umbral.
+
+1. Barrido: N probabilidades out-of-fold sintéticas; métricas en la rejilla de 0.01 y a
+   resolución completa (cada probabilidad distinta), contra un bucle que recorre el
+   dataset una vez por umbral. Se verifica contra sklearn.precision_recall_curve.
+2. Extremo a extremo: entrenamiento (OOF guardadas) -> calibración -> umbrales leídos por
+   la vigilancia; un reentrenamiento reaplica el criterio a la nueva versión del modelo.
+
+Uso: python benchmarks/bench_calibracion.py [n_filas]
+"""
+import importlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+from sklearn.metrics import precision_recall_curve
+
+import comun
+import threshold_calibration
+
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+
+def _tiempo(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def bucle(y, prob, umbrales):
+    """Una pasada completa por umbral: como se haría con precision_score/recall_score"""
+    precision, recall = [], []
+    for u in umbrales:
+        alerta = prob >= u
+        tp = int((alerta & (y == 1)).sum())
+        precision.append(tp / alerta.sum() if alerta.any() else 1.0)
+        recall.append(tp / max(int(y.sum()), 1))
+    return np.array(precision), np.array(recall)
+
+
+def barrido(n_filas):
+    rnd = np.random.RandomState(0)
+    y = (rnd.rand(n_filas) < 0.25).astype(np.int8)
+    prob = np.clip(rnd.normal(0.35 + 0.3 * y, 0.18), 0, 1).astype(np.float32)
+    print(f"1) Barrido sobre {n_filas:,} probabilidades out-of-fold")
+    rejilla = np.round(np.arange(0, 1.005, 0.01), 6)
+    t_vec, c = _tiempo(lambda: threshold_calibration.barrer(y, prob, rejilla))
+    t_bucle, (p, r) = _tiempo(lambda: bucle(y, prob, rejilla))
+    iguales = np.allclose(p, c["precision"]) and np.allclose(r, c["recall"])
+    print(f"   rejilla {len(rejilla)} umbrales | vectorizado {t_vec * 1e3:.0f} ms | bucle {t_bucle * 1e3:.0f} ms "
+          f"({t_bucle / t_vec:.0f}x) | mismas métricas: {iguales}")
+
+    unicos = np.unique(prob)
+    t_vec, c = _tiempo(lambda: threshold_calibration.barrer(y, prob, unicos[::-1]))
+    muestra = unicos[:: max(len(unicos) // 200, 1)]
+    t_muestra, _ = _tiempo(lambda: bucle(y, prob, muestra))
+    p_ref, r_ref, u_ref = precision_recall_curve(y, prob)
+    iguales = (np.allclose(c["precision"][::-1][:len(u_ref)], p_ref[:-1])
+               and np.allclose(c["recall"][::-1][:len(u_ref)], r_ref[:-1]))
+    print(f"   resolución completa {len(unicos):,} umbrales | vectorizado {t_vec * 1e3:.0f} ms | "
+          f"bucle ~{t_muestra / len(muestra) * len(unicos):.0f} s (estimado) | "
+          f"igual a precision_recall_curve: {iguales}")
+    t_elegir, (rojo, amarillo) = _tiempo(lambda: threshold_calibration.elegir(y, prob))
+    print(f"   elegir (precisión ≥ {threshold_calibration.PRECISION_OBJETIVO_ROJO:.0%}, recall ≥ "
+          f"{threshold_calibration.RECALL_OBJETIVO_AMARILLO:.0%}): rojo {rojo:.3f} | amarillo {amarillo:.3f} "
+          f"en {t_elegir * 1e3:.0f} ms")
+
+
+def extremo_a_extremo(n_filas=20000):
+    comun.generar_dataset_sintetico("dataset_masivo.csv", n_filas)
+    with redirect_stdout(io.StringIO()):
+        t_entreno, _ = _tiempo(trainer.entrenar_modelo_definitivo)
+    y, prob, _ = threshold_calibration.cargar_oof(trainer.ARCHIVO_MODELO)
+    print(f"\n2) Entrenamiento con validación cruzada out-of-fold: {t_entreno:.1f}s | {len(y)} probabilidades "
+          f"guardadas ({os.path.getsize(threshold_calibration.ruta_oof(trainer.ARCHIVO_MODELO)) / 1024:.0f} KB)")
+    sys.argv = ["threshold_calibration.py", "--precision-rojo", "0.3", "--recall-amarillo", "0.8"]
+    with redirect_stdout(io.StringIO()) as salida:
+        t_calibrar, _ = _tiempo(threshold_calibration.main)
+    print(f"   calibración (CLI) en {t_calibrar * 1e3:.0f} ms:")
+    for linea in salida.getvalue().splitlines():
+        if linea.startswith(("🔴", "🟠")): print(f"   {linea}")
+    version = inference.version_modelo(trainer.ARCHIVO_MODELO)
+    leidos = threshold_calibration.cargar_umbrales(trainer.ARCHIVO_MODELO, version,
+                                                   (inference.UMBRAL_ROJO, inference.UMBRAL_AMARILLO))
+    print(f"   vigilancia lee: rojo {leidos[0]:.3f} | amarillo {leidos[1]:.3f} ({leidos[2]})")
+
+    comun.generar_dataset_sintetico("dataset_masivo.csv", n_filas, semilla=7)
+    with redirect_stdout(io.StringIO()):
+        trainer.entrenar_modelo_definitivo()
+    nueva = inference.version_modelo(trainer.ARCHIVO_MODELO)
+    leidos = threshold_calibration.cargar_umbrales(trainer.ARCHIVO_MODELO, nueva, (0.75, 0.60))
+    print(f"   reentrenado (versión {nueva} != {version}): rojo {leidos[0]:.3f} | amarillo {leidos[1]:.3f} "
+          f"({leidos[2]})")
+
+
+def main(n_filas=1000000):
+    barrido(n_filas)
+    carpeta = tempfile.mkdtemp()
+    os.chdir(carpeta)
+    try:
+        extremo_a_extremo()
+    finally:
+        os.chdir(comun.RAIZ_REPO)
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 1000000)
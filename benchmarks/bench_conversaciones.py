@@ -0,0 +1,110 @@
+"""
+Caché de scores por conversación en la vigilancia.
+
+Buzón falso con hilos "responder a todos" recientes y sin leer. Se vigila con y sin
+caché (desde cero) y se compara: evaluaciones del modelo, tiempo, tasa de aciertos y
+diferencia de probabilidad frente al score exacto de cada correo. Luego llegan más
+respuestas a los mismos hilos y se vigila de nuevo con la caché persistida.
+
+Uso: python benchmarks/bench_conversaciones.py [n_mensajes] [n_hilos] [mensajes_por_hilo]
+"""
+import datetime
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import mailbox_access
+from buzon_falso import ItemFalso, generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+
+def _silencio(funcion, *args):
+    with redirect_stdout(io.StringIO()) as salida:
+        funcion(*args)
+    return salida.getvalue()
+
+
+def _vigilar(usar_cache, limpiar=True):
+    if limpiar:
+        for ruta in (inference.ARCHIVO_SNAPSHOT, inference.ARCHIVO_INDICE_DUPLICADOS,
+                     inference.ARCHIVO_CACHE_CONVERSACIONES):
+            if os.path.exists(ruta): os.remove(ruta)
+    inference.USAR_CACHE_CONVERSACIONES = usar_cache
+    evaluaciones = [0]
+    original = trainer.CatBoostWrapper.predict_proba
+
+    def contar(modelo, X):
+        evaluaciones[0] += X.shape[0]
+        return original(modelo, X)
+
+    trainer.CatBoostWrapper.predict_proba = contar
+    try:
+        inicio = time.perf_counter()
+        salida = _silencio(inference.ejecutar_vigilancia)
+        duracion = time.perf_counter() - inicio
+    finally:
+        trainer.CatBoostWrapper.predict_proba = original
+    with open(inference.ARCHIVO_INDICE_DUPLICADOS, encoding="utf-8") as f:
+        scores = json.load(f)["scores"]
+    resumen = next((l for l in salida.splitlines() if l.startswith("🧵")), "")
+    return duracion, evaluaciones[0], scores, resumen
+
+
+def _categoria(p):
+    return 2 if p >= inference.UMBRAL_ROJO else (1 if p >= inference.UMBRAL_AMARILLO else 0)
+
+
+def _comparar(exactos, cacheados):
+    comunes = [h for h in cacheados if h in exactos]
+    delta = sum(abs(exactos[h] - cacheados[h]) for h in comunes) / max(len(comunes), 1)
+    distintas = sum(_categoria(exactos[h]) != _categoria(cacheados[h]) for h in comunes)
+    return f"Δp medio {delta:.4f} | {distintas}/{len(comunes)} correos cambian de categoría"
+
+
+def main(n_mensajes=3000, n_hilos=40, mensajes_por_hilo=20):
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        aplicacion, gen = generar_outlook(n_mensajes, n_hilos=n_hilos, mensajes_por_hilo=mensajes_por_hilo)
+        mailbox_access.configurar("objeto", aplicacion=aplicacion)
+        _silencio(extractor.generar_dataset_masivo, 365)
+        _silencio(trainer.entrenar_modelo_definitivo)
+
+        print(f"{n_mensajes} mensajes + {n_hilos} hilos de {mensajes_por_hilo} respuestas sin leer\n")
+        t_sin, ev_sin, exactos, _ = _vigilar(False)
+        print(f"sin caché | {t_sin:.2f}s | {ev_sin} evaluaciones del modelo")
+        t_con, ev_con, cacheados, resumen = _vigilar(True)
+        print(f"con caché | {t_con:.2f}s | {ev_con} evaluaciones del modelo ({ev_sin - ev_con} menos)")
+        print(f"   {resumen}")
+        print(f"   {_comparar(exactos, cacheados)}")
+
+        # Llegan 5 respuestas más a cada hilo: la caché persistida ya conoce las conversaciones
+        inbox = aplicacion.Session.GetDefaultFolder(6)
+        hilos = {}
+        for item in inbox._items:
+            if item.ConversationID.startswith("HILO"): hilos[item.ConversationID] = item
+        for ultimo in hilos.values():
+            for i in range(5):
+                gen.n += 1
+                inbox.agregar(ItemFalso(ultimo._contador, "RE: " + ultimo._asunto, ultimo._cuerpo,
+                                        gen.rnd.choice([ultimo.SenderEmailAddress, "rem1@unibanca.pe"]),
+                                        datetime.datetime.now(), True, list(ultimo.Recipients), entry_id=f"ITEM{gen.n:08d}",
+                                        message_id=f"<{gen.n}@unibanca.pe>", conversacion=ultimo.ConversationID))
+        _, ev_ciclo, _, resumen = _vigilar(True, limpiar=False)
+        print(f"\nsiguiente ciclo (+{5 * len(hilos)} respuestas) | {ev_ciclo} evaluaciones del modelo")
+        print(f"   {resumen}")
+        os.chdir(comun.RAIZ_REPO)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 3000, int(args[1]) if len(args) > 1 else 40,
+         int(args[2]) if len(args) > 2 else 20)
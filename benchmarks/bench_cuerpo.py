@@ -0,0 +1,51 @@
+"""
+Bytes transferidos por COM y tiempo por mensaje al extraer Cuerpo_Snippet:
+cuerpo completo (comportamiento anterior) vs prefijo acotado vs sin cuerpo.
+
+Uso: python benchmarks/bench_cuerpo.py [n_mensajes] [kb_cuerpo]
+"""
+import datetime
+import importlib
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+from buzon_falso import generar_buzon
+
+extractor = importlib.import_module("01_data_extractor")
+
+
+def medir(modo, n_mensajes, kb_cuerpo):
+    carpeta, contador = generar_buzon(n_mensajes, kb_cuerpo)
+    original = extractor.leer_prefijo_cuerpo
+    if modo == "completo":
+        extractor.leer_prefijo_cuerpo = lambda item, max_chars=None: item.Body
+    datos = []
+    limite = datetime.datetime.now() - datetime.timedelta(days=365)
+    inicio = time.perf_counter()
+    try:
+        with redirect_stdout(io.StringIO()):
+            extractor.procesar_carpeta_recursiva(carpeta, datos, "", limite, extraer_cuerpo=(modo != "sin_cuerpo"))
+    finally:
+        extractor.leer_prefijo_cuerpo = original
+    duracion = time.perf_counter() - inicio
+    return contador.bytes_com / n_mensajes, duracion / n_mensajes * 1000, datos
+
+
+def main(n_mensajes=500, kb_cuerpo=200):
+    print(f"{n_mensajes} mensajes, cuerpo de {kb_cuerpo} KB")
+    print(f"{'modo':>11} | {'bytes COM/msg':>13} | {'ms/msg':>8}")
+    referencia = None
+    for modo in ("completo", "prefijo", "sin_cuerpo"):
+        bytes_msg, ms_msg, datos = medir(modo, n_mensajes, kb_cuerpo)
+        print(f"{modo:>11} | {bytes_msg:>13,.0f} | {ms_msg:>8.3f}")
+        if modo == "completo":
+            referencia = [d["Cuerpo_Snippet"] for d in datos]
+        elif modo == "prefijo" and referencia != [d["Cuerpo_Snippet"] for d in datos]:
+            print("   ⚠️ El snippet del prefijo difiere del snippet del cuerpo completo")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,52 @@
+"""
+Compara pico de RSS y tiempo total: entrenamiento clásico (TF-IDF en memoria)
+vs modo streaming (hashing + CatBoost por bloques).
+
+Uso: python benchmarks/bench_entrenamiento.py [n_filas ...]
+Cada modo corre en un subproceso limpio para que el pico de memoria sea independiente.
+"""
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from comun import RAIZ_REPO, generar_dataset_sintetico, pico_rss_mb
+
+
+def _ejecutar_modo(modo, carpeta):
+    """Punto de entrada del subproceso: entrena en `carpeta` e imprime tiempo y pico RSS."""
+    os.chdir(carpeta)
+    trainer = importlib.import_module("02_model_trainer")
+    sys.stdout, salida = open(os.devnull, "w", encoding="utf-8"), sys.stdout
+    inicio = time.perf_counter()
+    if modo == "streaming":
+        trainer.entrenar_modelo_streaming()
+    else:
+        trainer.entrenar_modelo_definitivo()
+    duracion = time.perf_counter() - inicio
+    sys.stdout = salida
+    print(f"{duracion:.2f} {pico_rss_mb():.1f}")
+
+
+def main(tamanos):
+    print(f"{'filas':>9} | {'modo':>9} | {'tiempo (s)':>10} | {'pico RSS (MB)':>13}")
+    for n in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            generar_dataset_sintetico(os.path.join(carpeta, "dataset_masivo.csv"), n)
+            for modo in ("clasico", "streaming"):
+                r = subprocess.run([sys.executable, __file__, "--interno", modo, carpeta],
+                                   capture_output=True, text=True, cwd=RAIZ_REPO)
+                if r.returncode != 0:
+                    print(f"{n:>9} | {modo:>9} | ERROR: {r.stderr.strip().splitlines()[-1]}")
+                    continue
+                duracion, pico = r.stdout.split()[-2:]
+                print(f"{n:>9} | {modo:>9} | {float(duracion):>10.1f} | {float(pico):>13.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--interno":
+        _ejecutar_modo(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or [50000, 200000, 800000])
@@ -0,0 +1,63 @@
+"""
+Pipeline por etapas vs. ejecución secuencial, sobre fixtures reproducidos con latencia COM.
+
+Graba extracción y vigilancia sobre el buzón falso y luego las reproduce con
+pipeline.N_TRABAJADORES = 0 (todo en el hilo STA) y con trabajadores, mostrando
+tiempo total y utilización por etapa.
+
+Uso: python benchmarks/bench_pipeline.py [n_mensajes] [latencia_ms]
+"""
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import mailbox_access
+import pipeline
+from buzon_falso import generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+
+def _ejecutar(funcion, *args):
+    with redirect_stdout(io.StringIO()) as salida:
+        inicio = time.perf_counter()
+        funcion(*args)
+        duracion = time.perf_counter() - inicio
+    etapas = [l for l in salida.getvalue().splitlines() if l.startswith("📈") or "cuello de botella" in l]
+    return duracion, etapas
+
+
+def main(n_mensajes=3000, latencia_ms=0.05):
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        aplicacion, _ = generar_outlook(n_mensajes)
+        mailbox_access.configurar("grabar", "extraccion.json.gz", aplicacion=aplicacion)
+        _ejecutar(extractor.generar_dataset_masivo, 365)
+        _ejecutar(trainer.entrenar_modelo_definitivo)
+        mailbox_access.configurar("grabar", "vigilancia.json.gz", aplicacion=aplicacion)
+        _ejecutar(inference.ejecutar_vigilancia)
+
+        print(f"{n_mensajes} mensajes | latencia COM simulada {latencia_ms} ms/acceso\n")
+        for operacion, funcion, args in (("extraccion", extractor.generar_dataset_masivo, (365,)),
+                                         ("vigilancia", inference.ejecutar_vigilancia, ())):
+            for trabajadores in (0, 1, 2):
+                for ruta in (inference.ARCHIVO_SNAPSHOT, inference.ARCHIVO_INDICE_DUPLICADOS):
+                    if os.path.exists(ruta): os.remove(ruta)
+                pipeline.N_TRABAJADORES = trabajadores
+                mailbox_access.configurar("reproducir", f"{operacion}.json.gz", latencia_ms)
+                duracion, etapas = _ejecutar(funcion, *args)
+                print(f"{operacion} | trabajadores={trabajadores} | {duracion:.2f}s")
+                for linea in etapas: print("   " + linea.strip())
+        os.chdir(comun.RAIZ_REPO)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 3000, float(args[1]) if len(args) > 1 else 0.05)
@@ -0,0 +1,96 @@
+"""
+Latencia de etiquetado: recorrido en árbol vs. cola global más-nuevo-primero con presupuesto.
+
+Buzón falso con miles de no leídos antiguos repartidos en subcarpetas. Antes de los
+ciclos 1 y 2 llegan unos pocos correos nuevos (asunto "FRESCO<ciclo> n") a carpetas al azar.
+Cada acceso COM cuesta `latencia_ms`. Se mide, por ciclo de vigilancia: primera
+etiqueta, momento en que quedan etiquetados todos los frescos, duración y backlog.
+
+Uso: python benchmarks/bench_programacion.py [n_mensajes] [latencia_ms] [presupuesto_s]
+"""
+import datetime
+import importlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import mailbox_access
+from buzon_falso import con_latencia, generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+N_FRESCOS = 10
+
+
+class SalidaCronometrada(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.inicio = time.perf_counter()
+        self.lineas = []
+
+    def write(self, texto):
+        if texto.strip(): self.lineas.append((time.perf_counter() - self.inicio, texto))
+        return len(texto)
+
+
+def _llegan_frescos(aplicacion, gen, lote):
+    activas = [c for c in aplicacion.Session._carpetas() if c._items]
+    ahora = datetime.datetime.now()
+    for i in range(N_FRESCOS):
+        item = gen.correo(ahora - datetime.timedelta(seconds=i))
+        item._asunto, item.UnRead = f"FRESCO{lote} {i}", True
+        gen.rnd.choice(activas).agregar(item)
+
+
+def _ciclo(lote, modo, presupuesto):
+    salida = SalidaCronometrada()
+    with redirect_stdout(salida):
+        inference.ejecutar_vigilancia(modo=modo, presupuesto=presupuesto)
+    frescos = [t for t, linea in salida.lineas if f"FRESCO{lote} " in linea]
+    texto = "".join(linea for _, linea in salida.lineas)
+    backlog = re.search(r"Backlog: (\d+)", texto)
+    primera = re.search(r"Primera etiqueta a los ([\d.]+)s", texto)
+    return {"duracion": salida.lineas[-1][0], "primera": float(primera.group(1)) if primera else None,
+            "frescos": max(frescos) if len(frescos) == N_FRESCOS else None,
+            "backlog": int(backlog.group(1)) if backlog else 0,
+            "etiquetados": len([1 for _, l in salida.lineas if re.match(r"\S+ \[(URGENTE|REVISAR|IGNORADO)", l)])}
+
+
+def main(n_mensajes=6000, latencia_ms=0.1, presupuesto=3.0):
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        mailbox_access.configurar("objeto", aplicacion=generar_outlook(n_mensajes)[0])
+        with redirect_stdout(io.StringIO()):
+            extractor.generar_dataset_masivo(365)
+            trainer.entrenar_modelo_definitivo()
+
+        print(f"{n_mensajes} mensajes | {N_FRESCOS} frescos | latencia COM {latencia_ms} ms | "
+              f"presupuesto {presupuesto}s en modo recientes\n")
+        print(f"{'modo':>9} | ciclo | {'etiquetados':>11} | {'1ª etiqueta':>11} | {'frescos listos':>14} | "
+              f"{'duración':>8} | backlog")
+        for modo in ("arbol", "recientes"):
+            for ruta in (inference.ARCHIVO_SNAPSHOT, inference.ARCHIVO_INDICE_DUPLICADOS):
+                if os.path.exists(ruta): os.remove(ruta)
+            aplicacion, gen = generar_outlook(n_mensajes, fraccion_no_leidos=0.6)
+            mailbox_access.configurar("objeto", aplicacion=con_latencia(aplicacion, latencia_ms))
+            for ciclo in range(1, 30):
+                if ciclo <= 2: _llegan_frescos(aplicacion, gen, ciclo)
+                r = _ciclo(ciclo, modo, presupuesto)
+                frescos = f"{r['frescos']:.2f}s" if r["frescos"] is not None else "-"
+                print(f"{modo:>9} | {ciclo:>5} | {r['etiquetados']:>11} | {r['primera'] or 0:>10.2f}s | "
+                      f"{frescos:>14} | {r['duracion']:>7.2f}s | {r['backlog']}")
+                if not r["backlog"] and ciclo >= 2: break
+        os.chdir(comun.RAIZ_REPO)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 6000, float(args[1]) if len(args) > 1 else 0.1,
+         float(args[2]) if len(args) > 2 else 3.0)
@@ -0,0 +1,89 @@
+"""
+Extracción y vigilancia deterministas en Linux con la capa mailbox_access:
+  1. Se graba una ejecución real de cada operación sobre un buzón falso (backend "grabar").
+  2. Se reproduce el fixture (backend "reproducir") con distintas latencias COM simuladas.
+  3. Dos reproducciones deben producir exactamente el mismo dataset / las mismas escrituras,
+     y el dataset reproducido debe ser idéntico al de la ejecución en vivo que se grabó.
+
+Uso: python benchmarks/bench_reproduccion.py [n_mensajes] [latencia_ms ...]
+"""
+import hashlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import mailbox_access
+from buzon_falso import generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+ESTADO_VIGILANCIA = [inference.ARCHIVO_SNAPSHOT, inference.ARCHIVO_INDICE_DUPLICADOS,
+                     inference.ARCHIVO_CACHE_CONVERSACIONES]
+
+
+def _silencioso(funcion, *args):
+    with redirect_stdout(io.StringIO()):
+        return funcion(*args)
+
+
+def _huella(ruta):
+    with open(ruta, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def _reproducir(operacion, fixture, latencia_ms):
+    for ruta in ESTADO_VIGILANCIA:
+        if os.path.exists(ruta): os.remove(ruta)
+    mailbox_access.configurar("reproducir", fixture, latencia_ms)
+    inicio = time.perf_counter()
+    if operacion == "extraccion":
+        _silencioso(extractor.generar_dataset_masivo, 365)
+        resultado = _huella("dataset_masivo.csv")
+    else:
+        _silencioso(inference.ejecutar_vigilancia)
+        # Los trabajadores CPU terminan en orden variable: se compara el conjunto de escrituras
+        escrituras = sorted(map(repr, mailbox_access._reproduccion.escrituras))
+        resultado = hashlib.sha1(repr(escrituras).encode()).hexdigest()[:12]
+    return time.perf_counter() - inicio, mailbox_access.estadisticas(), resultado
+
+
+def main(n_mensajes=3000, latencias=(0.0, 0.05)):
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        aplicacion, _ = generar_outlook(n_mensajes)
+
+        mailbox_access.configurar("grabar", "fixture_extraccion.json.gz", aplicacion=aplicacion)
+        _silencioso(extractor.generar_dataset_masivo, 365)
+        en_vivo = _huella("dataset_masivo.csv")
+        _silencioso(trainer.entrenar_modelo_definitivo)
+        mailbox_access.configurar("grabar", "fixture_vigilancia.json.gz", aplicacion=aplicacion)
+        _silencioso(inference.ejecutar_vigilancia)
+
+        for fixture in ("fixture_extraccion.json.gz", "fixture_vigilancia.json.gz"):
+            print(f"{fixture}: {os.path.getsize(fixture) / 1024:.0f} KB")
+        print(f"\n{'operación':>11} | {'latencia':>8} | {'accesos COM':>11} | {'tiempo (s)':>10} | determinista | "
+              f"igual al vivo")
+        fieles = True
+        for operacion in ("extraccion", "vigilancia"):
+            fixture = f"fixture_{operacion}.json.gz"
+            for latencia in latencias:
+                t1, stats, r1 = _reproducir(operacion, fixture, latencia)
+                _, _, r2 = _reproducir(operacion, fixture, latencia)
+                fiel = "-" if operacion != "extraccion" else ("sí" if r1 == en_vivo else f"NO ({en_vivo})")
+                fieles = fieles and r1 == r2 and not fiel.startswith("NO")
+                print(f"{operacion:>11} | {latencia:>6.2f}ms | {stats['accesos']:>11,} | {t1:>10.2f} | "
+                      f"{'sí' if r1 == r2 else 'NO':>12} | {fiel} ({r1})")
+        os.chdir(comun.RAIZ_REPO)
+        assert fieles, "La reproducción no coincide con la ejecución grabada"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 3000, [float(a) for a in args[1:]] or (0.0, 0.05))
@@ -0,0 +1,114 @@
+"""
+Soak de la vigilancia continua: 24 horas simuladas de tráfico en el mismo proceso.
+
+Buzón falso de tamaño estable (el usuario simulado lee lo que llega y se archiva lo más
+viejo), con llegadas más densas en horario de oficina. Un ciclo de vigilancia cada
+`minutos_ciclo` minutos simulados, sin esperas reales entre ciclos. Cada acceso al buzón
+pasa por un proxy que cuenta las referencias vivas (el equivalente a los Release de COM).
+Por ciclo se registra RSS, handles, hilos y proxies vivos. Tras el calentamiento (caches
+y memos llenándose) la memoria debe quedar plana.
+
+Uso: python benchmarks/bench_soak.py [horas] [minutos_ciclo] [n_mensajes]
+"""
+import datetime
+import importlib
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import mailbox_access
+from buzon_falso import con_latencia, generar_outlook, proxies_vivos
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+LLEGADAS_POR_HORA = {"oficina": 60, "resto": 6}  # 8:00-19:00 / noche y madrugada
+HORAS_CALENTAMIENTO = 2
+TOLERANCIA_MB = 8.0  # Crecimiento de RSS admitido después del calentamiento
+
+
+def _trafico(aplicacion, gen, desde, hasta, tamano):
+    """Llegadas Poisson en [desde, hasta), lectura de lo ya visto y archivo de lo más viejo"""
+    carpetas = [c for c in aplicacion.Session._carpetas() if c._items]
+    tasa = LLEGADAS_POR_HORA["oficina" if 8 <= desde.hour < 19 else "resto"]
+    minutos = (hasta - desde).total_seconds() / 60
+    llegadas = gen.rnd.choices(range(int(minutos * 60)), k=np.random.poisson(tasa * minutos / 60))
+    for segundo in sorted(llegadas):
+        item = gen.correo(desde + datetime.timedelta(seconds=segundo))
+        item.UnRead = True
+        gen.rnd.choice(carpetas).agregar(item)
+    for carpeta in carpetas:
+        for item in carpeta._items:
+            if item.UnRead and item.Categories and gen.rnd.random() < 0.3: item.UnRead = False
+    total = sum(len(c._items) for c in carpetas)
+    while total > tamano:  # Archivo: sale lo más viejo del buzón
+        carpeta = max(carpetas, key=lambda c: len(c._items))
+        carpeta._items.remove(min(carpeta._items, key=lambda i: i.ReceivedTime))
+        total -= 1
+    return len(llegadas)
+
+
+def main(horas=24, minutos_ciclo=5, n_mensajes=3000):
+    carpeta = tempfile.mkdtemp()
+    os.chdir(carpeta)
+    np.random.seed(11)
+    aplicacion, gen = generar_outlook(n_mensajes, fraccion_no_leidos=0.05)
+    tamano = sum(len(c._items) for c in aplicacion.Session._carpetas())
+    mailbox_access.configurar("objeto", aplicacion=con_latencia(aplicacion, 0))
+    with redirect_stdout(io.StringIO()):
+        extractor.generar_dataset_masivo(365)
+        trainer.entrenar_modelo_definitivo()
+
+    n_ciclos = int(horas * 60 / minutos_ciclo)
+    reloj = datetime.datetime.now() - datetime.timedelta(hours=horas)
+    print(f"Soak: {horas} h simuladas | un ciclo cada {minutos_ciclo} min ({n_ciclos} ciclos) | "
+          f"buzón estable de {tamano} mensajes\n")
+    print(f"{'hora':>5} | ciclo | {'llegadas':>8} | {'RSS MB':>7} | {'Δ MB':>6} | handles | hilos | "
+          f"proxies vivos | {'ciclo s':>7} | líneas de log")
+    registros, llegadas, lineas = [], 0, 0
+    for numero in range(1, n_ciclos + 1):
+        siguiente = reloj + datetime.timedelta(minutes=minutos_ciclo)
+        llegadas += _trafico(aplicacion, gen, reloj, siguiente, tamano)
+        reloj = siguiente
+        with redirect_stdout(io.StringIO()) as salida:
+            salud = inference.ciclo_vigilancia(numero)
+        lineas += salida.getvalue().count("\n")
+        salud["proxies"] = proxies_vivos()
+        registros.append(salud)
+        if numero % int(120 / minutos_ciclo) == 0 or numero == 1:
+            print(f"{numero * minutos_ciclo / 60:>5.1f} | {numero:>5} | {llegadas:>8} | {salud['rss_mb']:>7.1f} | "
+                  f"{salud['rss_mb'] - registros[0]['rss_mb']:>+6.1f} | {salud['handles']:>7} | {salud['hilos']:>5} | "
+                  f"{salud['proxies']:>13} | {salud['segundos']:>7.2f} | {lineas}")
+            llegadas = lineas = 0
+
+    calentamiento = int(HORAS_CALENTAMIENTO * 60 / minutos_ciclo)
+    estables = registros[calentamiento:]
+    rss = np.array([r["rss_mb"] for r in estables])
+    pendiente = np.polyfit(np.arange(len(rss)) * minutos_ciclo / 60, rss, 1)[0]
+    crecimiento = rss[-1] - rss[0]
+    print(f"\nTras {HORAS_CALENTAMIENTO} h de calentamiento: RSS {rss[0]:.1f} -> {rss[-1]:.1f} MB "
+          f"({crecimiento:+.1f} MB, pendiente {pendiente:+.2f} MB/h, máx. {rss.max():.1f} MB) | "
+          f"handles {estables[0]['handles']} -> {estables[-1]['handles']} | "
+          f"hilos {estables[0]['hilos']} -> {estables[-1]['hilos']} | "
+          f"proxies vivos entre ciclos: máx. {max(r['proxies'] for r in registros)}")
+    print(f"Historial de salud en memoria: {len(inference.historial_salud)} ciclos "
+          f"(máx. {inference.MAX_HISTORIAL_SALUD})")
+    assert crecimiento <= TOLERANCIA_MB, f"RSS creció {crecimiento:.1f} MB tras el calentamiento"
+    assert estables[-1]["handles"] <= estables[0]["handles"], "Handles/descriptores en aumento"
+    assert estables[-1]["hilos"] <= estables[0]["hilos"], "Hilos sin terminar entre ciclos"
+    assert max(r["proxies"] for r in estables) <= max(r["proxies"] for r in registros[:calentamiento] or estables), \
+        "Referencias COM retenidas entre ciclos"
+    print("✅ Memoria, handles, hilos y referencias COM estables.")
+    os.chdir(comun.RAIZ_REPO)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(float(args[0]) if args else 24, float(args[1]) if len(args) > 1 else 5,
+         int(args[2]) if len(args) > 2 else 3000)
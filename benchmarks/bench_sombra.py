@@ -0,0 +1,104 @@
+"""
+Costo del scoring en sombra campeón/retadores.
+
+Compara, por correo y en lotes como los del pipeline de vigilancia:
+  * solo el campeón,
+  * campeón + retador con el mismo preprocesador (matriz transformada compartida),
+  * campeón + retador con preprocesador propio (modo streaming),
+  * campeón + retador evaluados por separado, cada uno con su Pipeline completo.
+Luego corre una vigilancia completa con el retador en sombra y muestra el resumen.
+
+Uso: python benchmarks/bench_sombra.py [n_mensajes] [tamano_lote]
+"""
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import joblib
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+import comun  # noqa: F401 (añade la raíz del repo al path)
+import feature_store
+import mailbox_access
+import shadow_scoring
+from buzon_falso import generar_outlook
+
+extractor = importlib.import_module("01_data_extractor")
+trainer = importlib.import_module("02_model_trainer")
+inference = importlib.import_module("03_inference_engine")
+
+
+def _silencio(funcion, *args):
+    with redirect_stdout(io.StringIO()) as salida:
+        funcion(*args)
+    return salida.getvalue()
+
+
+def _medir(puntuar, lotes, repeticiones=3):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for lote in lotes: puntuar(lote)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor / sum(len(l) for l in lotes) * 1e6
+
+
+def main(n_mensajes=3000, tamano_lote=32):
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        aplicacion, _ = generar_outlook(n_mensajes)
+        mailbox_access.configurar("objeto", aplicacion=aplicacion)
+        _silencio(extractor.generar_dataset_masivo, 365)
+
+        # Campeón (clásico) y retadores: mismo preprocesador / preprocesador streaming
+        _silencio(trainer.entrenar_modelo_definitivo)
+        campeon = joblib.load(trainer.ARCHIVO_MODELO)
+        df = pd.read_csv(trainer.ARCHIVO_DATASET, sep="|")
+        df['Asunto'] = df['Asunto'].fillna("").astype(str)
+        df['Dominio'] = df['Dominio'].fillna("desconocido")
+        df = feature_store.unir_almacen(df.fillna(0))
+        X, y = df[trainer.COLUMNAS_X], (df['TARGET_IA'] == 2).astype(int).values
+        clasificador = trainer.CatBoostWrapper(iterations=150, depth=4, verbose=0)
+        clasificador.fit(campeon.steps[0][1].transform(X), y)
+        joblib.dump(Pipeline([('preprocessor', campeon.steps[0][1]), ('classifier', clasificador)]),
+                    "retador_compartido.joblib")
+        ruta_campeon = trainer.ARCHIVO_MODELO
+        trainer.ARCHIVO_MODELO = "retador_streaming.joblib"
+        _silencio(trainer.entrenar_modelo_streaming)
+        trainer.ARCHIVO_MODELO = ruta_campeon
+
+        retadores = {r: joblib.load(r) for r in ("retador_compartido.joblib", "retador_streaming.joblib")}
+        lotes = [X.iloc[i:i + tamano_lote] for i in range(0, len(X), tamano_lote)]
+
+        base = _medir(lambda l: campeon.predict_proba(l), lotes)
+        print(f"{len(X)} correos en lotes de {tamano_lote}\n")
+        print(f"solo campeón                       {base:8.0f} µs/correo")
+        for ruta in retadores:
+            c = shadow_scoring.Comite(campeon, "campeon", [(ruta, ruta, retadores[ruta])], 0.75, 0.60,
+                                      ruta="bench_sombra.sqlite")
+            costo = _medir(lambda l: c.puntuar(l, [str(i) for i in l.index]), lotes)
+            _silencio(c.cerrar)
+            print(f"+ {ruta:<32} {costo:8.0f} µs/correo (+{costo - base:.0f})")
+        separado = _medir(lambda l: (campeon.predict_proba(l), retadores["retador_compartido.joblib"].predict_proba(l)),
+                          lotes)
+        print(f"+ retador_compartido sin compartir {separado:8.0f} µs/correo (+{separado - base:.0f})")
+
+        # Vigilancia completa con el retador en sombra
+        inference.MODELOS_RETADORES = ["retador_compartido.joblib", "retador_streaming.joblib"]
+        salida = _silencio(inference.ejecutar_vigilancia)
+        inference.MODELOS_RETADORES = []
+        print("\nVigilancia con retadores en sombra:")
+        for linea in salida.splitlines():
+            if linea.startswith(("🥊 Sombra", "   retador")): print(linea)
+        print(f"sqlite: {os.path.getsize(shadow_scoring.ARCHIVO_SOMBRA) / 1024:.0f} KB")
+        os.chdir(comun.RAIZ_REPO)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 3000, int(args[1]) if len(args) > 1 else 32)
@@ -0,0 +1,342 @@
+"""
+Buzón falso con la forma del modelo de objetos de Outlook
+(Application / Namespace / Folder / Items / MailItem / Recipients / PropertyAccessor).
+
+Sirve como "Outlook en vivo" para el backend "objeto" de mailbox_access, o para grabar
+fixtures deterministas con el backend "grabar". Cuenta los bytes que cruzarían la
+frontera COM (cadenas UTF-16) para comparar estrategias de lectura.
+"""
+import datetime
+import random
+import time
+import types
+import weakref
+
+TAG_LAST_VERB = "http://schemas.microsoft.com/mapi/proptag/0x10810003"
+TAG_MESSAGE_ID = "http://schemas.microsoft.com/mapi/proptag/0x1035001F"
+TAG_COMMIT_TIME = "http://schemas.microsoft.com/mapi/proptag/0x670A0040"
+
+ASUNTOS = ["Reporte diario de operaciones", "Reunión de seguimiento", "Alerta de sistema",
+           "Factura pendiente", "Consulta de cliente", "Boletín semanal", "Aprobación requerida",
+           "Incidente en producción", "Cierre contable", "Actualización de proyecto"]
+PARRAFO = ("Estimados, adjunto el reporte https://intranet.unibanca.pe/reportes?id=123 "
+           "con el detalle de operaciones ✅ del día. Saludos cordiales | Equipo ")
+
+
+class Contador:
+    def __init__(self):
+        self.bytes_com = 0
+
+    def cadena(self, texto):
+        self.bytes_com += 2 * len(texto)
+        return texto
+
+
+class ErrorCOM(Exception):
+    """Equivalente a pywintypes.com_error"""
+
+
+class _Stream:
+    def __init__(self, datos, contador):
+        self._datos, self._pos, self._contador = datos, 0, contador
+
+    def Read(self, n):
+        trozo = self._datos[self._pos:self._pos + n]
+        self._pos += len(trozo)
+        self._contador.bytes_com += len(trozo)
+        return trozo
+
+
+class _MensajeMAPI:
+    def __init__(self, item):
+        self._item = item
+
+    def QueryInterface(self, iid):
+        return self
+
+    def OpenProperty(self, tag, iid, opciones, flags):
+        return _Stream(self._item._cuerpo.encode("utf-16-le"), self._item._contador)
+
+
+class _Coleccion(list):
+    @property
+    def Count(self):
+        return len(self)
+
+
+class _Destinatario:
+    def __init__(self, direccion, nombre, tipo):
+        self.Address, self.Name, self.Type = direccion, nombre, tipo
+
+
+class _Remitente:
+    def GetExchangeUser(self):
+        return None
+
+
+class _AccesorItem:
+    def __init__(self, item):
+        self._item = item
+
+    def GetProperty(self, tag):
+        if tag == TAG_MESSAGE_ID: return self._item._message_id
+        if tag == TAG_LAST_VERB and self._item._verbo: return self._item._verbo
+        raise ErrorCOM("La propiedad no existe")
+
+
+class ItemFalso:
+    Class = 43
+
+    def __init__(self, contador, asunto, cuerpo, remitente, recibido, no_leido, destinatarios,
+                 entry_id="", message_id="", conversacion="", verbo=0):
+        self._contador, self._cuerpo, self._asunto = contador, cuerpo, asunto
+        self._message_id, self._verbo = message_id, verbo
+        self._carpeta = None
+        self.SenderName = remitente.split("@")[0]
+        self.SenderEmailAddress = remitente
+        self.Sender = _Remitente()
+        self.ReceivedTime = recibido
+        self.UnRead = no_leido
+        self.Recipients = _Coleccion(destinatarios)
+        self.PropertyAccessor = _AccesorItem(self)
+        self.Categories = ""
+        self.EntryID = entry_id
+        self.ConversationID = conversacion
+
+    @property
+    def Subject(self):
+        return self._contador.cadena(self._asunto)
+
+    @property
+    def Body(self):
+        return self._contador.cadena(self._cuerpo)
+
+    @property
+    def MAPIOBJECT(self):
+        return _MensajeMAPI(self)
+
+    def Save(self):
+        if self._carpeta is not None: self._carpeta._tocar()
+
+
+class _Items(_Coleccion):
+    def Item(self, indice):
+        return self[indice - 1]
+
+    def Sort(self, campo, descendente=False):
+        self.sort(key=lambda i: i.ReceivedTime, reverse=descendente)
+
+    def Restrict(self, filtro):
+        if filtro.replace(" ", "").lower() == "[unread]=true":
+            return _Items(i for i in self if i.UnRead)
+        raise ErrorCOM(f"Filtro no soportado: {filtro}")
+
+
+class _AccesorCarpeta:
+    def __init__(self, carpeta):
+        self._carpeta = carpeta
+
+    def GetProperty(self, tag):
+        if tag == TAG_COMMIT_TIME: return self._carpeta._modificada
+        raise ErrorCOM("La propiedad no existe")
+
+
+class CarpetaFalsa:
+    _siguiente_id = 0
+
+    def __init__(self, nombre, items=(), subcarpetas=()):
+        CarpetaFalsa._siguiente_id += 1
+        self.Name = nombre
+        self.EntryID = f"CARPETA{CarpetaFalsa._siguiente_id:06d}"
+        self._items = []
+        self._modificada = datetime.datetime(2024, 1, 1)
+        self.Folders = _Coleccion(subcarpetas)
+        self.PropertyAccessor = _AccesorCarpeta(self)
+        for item in items: self.agregar(item)
+
+    def agregar(self, item):
+        item._carpeta = self
+        self._items.append(item)
+        self._tocar()
+
+    def _tocar(self):
+        self._modificada = max(self._modificada + datetime.timedelta(seconds=1), datetime.datetime.now())
+
+    @property
+    def Items(self):
+        return _Items(self._items)
+
+    @property
+    def UnReadItemCount(self):
+        return sum(1 for i in self._items if i.UnRead)
+
+
+class _Categorias(_Coleccion):
+    def Item(self, nombre):
+        for c in self:
+            if c == nombre: return c
+        raise ErrorCOM(f"Categoría no encontrada: {nombre}")
+
+    def Add(self, nombre, color=0):
+        self.append(nombre)
+        return nombre
+
+
+class NamespaceFalso:
+    def __init__(self, inbox):
+        self._inbox = inbox
+        self.Categories = _Categorias()
+
+    def GetDefaultFolder(self, numero):
+        return self._inbox
+
+    def _carpetas(self, carpeta=None):
+        carpeta = carpeta or self._inbox
+        yield carpeta
+        for sub in carpeta.Folders: yield from self._carpetas(sub)
+
+    def GetItemFromID(self, entry_id, store_id=None):
+        for carpeta in self._carpetas():
+            for item in carpeta._items:
+                if item.EntryID == entry_id: return item
+        raise ErrorCOM(f"Item no encontrado: {entry_id}")
+
+    def GetFolderFromID(self, entry_id, store_id=None):
+        for carpeta in self._carpetas():
+            if carpeta.EntryID == entry_id: return carpeta
+        raise ErrorCOM(f"Carpeta no encontrada: {entry_id}")
+
+
+class AplicacionFalsa:
+    def __init__(self, inbox):
+        self.Session = NamespaceFalso(inbox)
+
+    def GetNamespace(self, nombre):
+        return self.Session
+
+
+class GeneradorCorreos:
+    """Genera correos sintéticos reproducibles (también usado para simular tráfico)"""
+
+    def __init__(self, contador=None, semilla=7, mi_email="wllana@unibanca.pe", kb_cuerpo=2,
+                 n_remitentes=200, fraccion_no_leidos=0.3):
+        self.rnd = random.Random(semilla)
+        self.contador = contador or Contador()
+        self.mi_email, self.kb_cuerpo = mi_email, kb_cuerpo
+        self.n_remitentes, self.fraccion_no_leidos = n_remitentes, fraccion_no_leidos
+        self.n = 0
+
+    def correo(self, recibido):
+        rnd, self.n = self.rnd, self.n + 1
+        dominio = rnd.choice(["unibanca.pe", "proveedor.com", "cliente.com", "boletines.com"])
+        remitente = f"rem{rnd.randint(0, self.n_remitentes)}@{dominio}"
+        hilo = rnd.randint(0, 300)
+        asunto = rnd.choice(["", "RE: ", "RE: RE: ", "FW: "]) + f"{ASUNTOS[hilo % len(ASUNTOS)]} {hilo}"
+        cuerpo = (PARRAFO * (self.kb_cuerpo * 1024 // len(PARRAFO) + 1))[:self.kb_cuerpo * 1024]
+        dest = [_Destinatario(self.mi_email, "Walter Llana", rnd.choice([1, 1, 2]))]
+        dest += [_Destinatario(f"otro{j}@unibanca.pe", f"Otro {j}", rnd.choice([1, 2]))
+                 for j in range(rnd.randint(0, 12))]
+        return ItemFalso(self.contador, asunto, cuerpo, remitente, recibido,
+                         rnd.random() < self.fraccion_no_leidos, dest,
+                         entry_id=f"ITEM{self.n:08d}", message_id=f"<{self.n}@{dominio}>",
+                         conversacion=f"CONV{hilo:04d}", verbo=rnd.choice([0, 0, 0, 102, 104]))
+
+    def hilo_responder_a_todos(self, recibido, n_mensajes, n_participantes=3):
+        """Hilo "responder a todos": audiencia fija, pocos participantes que se alternan, RE: crecientes"""
+        rnd = self.rnd
+        conversacion = f"HILO{rnd.randrange(10 ** 8):08d}"
+        asunto = f"{rnd.choice(ASUNTOS)} {rnd.randint(0, 999)}"
+        participantes = [f"rem{rnd.randint(0, self.n_remitentes)}@unibanca.pe" for _ in range(n_participantes)]
+        audiencia = [_Destinatario(f"otro{j}@unibanca.pe", f"Otro {j}", 1) for j in range(rnd.randint(5, 30))]
+        tipo = rnd.choice([1, 2])
+        correos = []
+        for i in range(n_mensajes):
+            self.n += 1
+            dest = [_Destinatario(self.mi_email, "Walter Llana", tipo)] + audiencia
+            cuerpo = (PARRAFO * (self.kb_cuerpo * 1024 // len(PARRAFO) + 1))[:self.kb_cuerpo * 1024]
+            correos.append(ItemFalso(self.contador, "RE: " * min(i, 3) + asunto, cuerpo, rnd.choice(participantes),
+                                     recibido + datetime.timedelta(minutes=i), True, dest,
+                                     entry_id=f"ITEM{self.n:08d}", message_id=f"<{self.n}@unibanca.pe>",
+                                     conversacion=conversacion))
+        return correos
+
+
+def generar_outlook(n_mensajes, n_subcarpetas=20, kb_cuerpo=2, semilla=7, fraccion_no_leidos=0.3,
+                    dias=365, fraccion_copias=0.05, n_hilos=0, mensajes_por_hilo=20):
+    """Aplicación falsa: Inbox + subcarpetas (algunas vacías, tipo archivo) con copias duplicadas
+    y, opcionalmente, `n_hilos` hilos "responder a todos" recientes y sin leer en el Inbox"""
+    gen = GeneradorCorreos(semilla=semilla, kb_cuerpo=kb_cuerpo, fraccion_no_leidos=fraccion_no_leidos)
+    ahora = datetime.datetime.now()
+    subcarpetas = [CarpetaFalsa(f"Proyecto {i:02d}") for i in range(n_subcarpetas)]
+    inbox = CarpetaFalsa("Bandeja de entrada", subcarpetas=subcarpetas)
+    activas = [inbox] + subcarpetas[:max(1, n_subcarpetas // 2)]
+    for _ in range(n_mensajes):
+        item = gen.correo(ahora - datetime.timedelta(minutes=gen.rnd.randint(0, dias * 1440)))
+        gen.rnd.choice(activas).agregar(item)
+        if gen.rnd.random() < fraccion_copias:
+            gen.rnd.choice(activas).agregar(_copia(item))
+    for _ in range(n_hilos):
+        inicio = ahora - datetime.timedelta(minutes=gen.rnd.randint(mensajes_por_hilo, 7 * 1440))
+        for item in gen.hilo_responder_a_todos(inicio, mensajes_por_hilo): inbox.agregar(item)
+    return AplicacionFalsa(inbox), gen
+
+
+def _copia(item):
+    copia = ItemFalso(item._contador, item._asunto, item._cuerpo, item.SenderEmailAddress, item.ReceivedTime,
+                      item.UnRead, list(item.Recipients), entry_id=item.EntryID + "C",
+                      message_id=item._message_id, conversacion=item.ConversationID, verbo=item._verbo)
+    return copia
+
+
+def generar_buzon(n_mensajes, kb_cuerpo=200, semilla=7, mi_email="yo@unibanca.pe"):
+    """Inbox plano con n_mensajes de cuerpos grandes tipo hilo HTML convertido / newsletter."""
+    gen = GeneradorCorreos(semilla=semilla, mi_email=mi_email, kb_cuerpo=kb_cuerpo)
+    ahora = datetime.datetime.now()
+    items = [gen.correo(ahora - datetime.timedelta(minutes=i)) for i in range(n_mensajes)]
+    return CarpetaFalsa("Bandeja de entrada", items), gen.contador
+
+
+_PRIMITIVOS = (str, int, float, bool, bytes, type(None), datetime.datetime)
+
+
+_proxies_vivos = weakref.WeakSet()
+
+
+def proxies_vivos():
+    """Proxies aún referenciados: el equivalente a las referencias COM sin Release"""
+    return len(_proxies_vivos)
+
+
+class ProxyLatencia:
+    """Envuelve el buzón falso y espera `latencia_ms` en cada acceso, llamada o paso de
+    iteración, como una llamada COM fuera de proceso (time.sleep libera el GIL igual que COM)."""
+    __slots__ = ("_objeto", "_espera", "__weakref__")
+
+    def __init__(self, objeto, latencia_ms):
+        object.__setattr__(self, "_objeto", objeto)
+        object.__setattr__(self, "_espera", latencia_ms / 1000)
+        _proxies_vivos.add(self)
+
+    def _envolver(self, valor):
+        if isinstance(valor, _PRIMITIVOS): return valor
+        return ProxyLatencia(valor, self._espera * 1000)
+
+    def __getattr__(self, nombre):
+        time.sleep(self._espera)
+        valor = getattr(self._objeto, nombre)
+        if isinstance(valor, (types.MethodType, types.BuiltinMethodType)):
+            return lambda *args: self._envolver(valor(*args))
+        return self._envolver(valor)
+
+    def __setattr__(self, nombre, valor):
+        time.sleep(self._espera)
+        setattr(self._objeto, nombre, valor)
+
+    def __iter__(self):
+        for valor in self._objeto:
+            time.sleep(self._espera)
+            yield self._envolver(valor)
+
+
+def con_latencia(aplicacion, latencia_ms):
+    return ProxyLatencia(aplicacion, latencia_ms)
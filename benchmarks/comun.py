@@ -0,0 +1,39 @@
+"""Utilidades compartidas por los benchmarks (datos sintéticos y medición de memoria)."""
+import os
+import random
+import sys
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_REPO not in sys.path:
+    sys.path.insert(0, RAIZ_REPO)
+
+DOMINIOS = ["unibanca.pe", "gmail.com", "proveedor.com", "banco.pe", "boletines.com",
+            "auditoria.pe", "sistemas.unibanca.pe", "cliente.com"]
+
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (Windows vía psutil, POSIX vía resource)."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def generar_dataset_sintetico(ruta, n_filas, n_vocabulario=20000, semilla=42):
+    """Dataset con el esquema de dataset_masivo.csv y asuntos con bigramas muy variados."""
+    rnd = random.Random(semilla)
+    vocab = [f"pal{i}" for i in range(n_vocabulario)]
+    with open(ruta, "w", encoding="utf-8-sig") as f:
+        f.write("Remitente_ID|Dominio|Nombre_Mostrar|Asunto|Cuerpo_Snippet|Estoy_En_To|Estoy_En_CC|"
+                "Total_Destinatarios|Carpeta_Origen|Estado_Lectura|Accion_Detectada|TARGET_IA\n")
+        for _ in range(n_filas):
+            dominio = rnd.choice(DOMINIOS)
+            asunto = " ".join(rnd.choice(vocab) for _ in range(rnd.randint(4, 10)))
+            en_to = rnd.randint(0, 1)
+            en_cc = 0 if en_to else rnd.randint(0, 1)
+            target = rnd.choice([0, 1, 1, 2]) if en_to else rnd.choice([0, 1, 1, 1, 2])
+            f.write(f"u{rnd.randint(0, 5000)}@{dominio}|{dominio}|Nombre|{asunto}||{en_to}|{en_cc}|"
+                    f"{rnd.randint(1, 40)}|Bandeja|Leído|Ninguna|{target}\n")
@@ -0,0 +1,166 @@
+"""
+Almacén de features por remitente y dominio.
+
+Guarda agregados históricos (volumen, acciones, último correo) en arrays compactos
+indexados por clave. El extractor lo reconstruye tras cada minería, el entrenador
+lo une al dataset y la vigilancia consulta un remitente en O(1) sin recorrer historia.
+"""
+import datetime
+from array import array
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ARCHIVO_ALMACEN = "almacen_remitentes.joblib"
+N_FOLDS = 5               # Folds para las tasas out-of-fold del entrenamiento clásico
+PESO_PRIOR = 5.0          # Suavizado bayesiano: equivale a 5 correos con la tasa del nivel superior
+DIAS_SIN_HISTORIA = 365.0  # Recencia para remitentes nunca vistos
+COLUMNAS_ALMACEN = ['Remitente_Volumen', 'Remitente_Tasa_Accion', 'Dominio_Tasa_Accion', 'Remitente_Dias_Previo']
+_EPOCA = datetime.datetime(1970, 1, 1)
+
+
+def segundos_epoch(fechas):
+    """Fecha (o Serie de fechas) en hora local de Outlook -> segundos desde 1970, contando esa
+    hora como UTC. Historial y vigilancia usan esta misma conversión: datetime.timestamp()
+    aplicaría el huso del sistema y la recencia en vivo saldría desplazada esas horas."""
+    if isinstance(fechas, pd.Series): return (fechas - pd.Timestamp(_EPOCA)) / pd.Timedelta(seconds=1)
+    return (fechas.replace(tzinfo=None) - _EPOCA).total_seconds()
+
+
+class TablaAgregados:
+    """clave -> (volumen, acciones, timestamp del último correo) en arrays paralelos"""
+
+    def __init__(self):
+        self.indice = {}
+        self.volumen = array("l")
+        self.acciones = array("l")
+        self.ultimo = array("d")
+
+    def __len__(self):
+        return len(self.indice)
+
+    def agregar(self, clave, volumen, acciones, ultimo):
+        fila = self.indice.get(clave)
+        if fila is None:
+            self.indice[clave] = len(self.volumen)
+            self.volumen.append(int(volumen))
+            self.acciones.append(int(acciones))
+            self.ultimo.append(float(ultimo))
+        else:
+            self.volumen[fila] += int(volumen)
+            self.acciones[fila] += int(acciones)
+            self.ultimo[fila] = max(self.ultimo[fila], float(ultimo))
+
+    def buscar(self, clave):
+        fila = self.indice.get(clave)
+        if fila is None: return 0, 0, None
+        return self.volumen[fila], self.acciones[fila], self.ultimo[fila]
+
+
+class AlmacenFeatures:
+    def __init__(self):
+        self.remitentes = TablaAgregados()
+        self.dominios = TablaAgregados()
+        self.volumen_total = 0
+        self.acciones_total = 0
+
+    @property
+    def tasa_global(self):
+        return (self.acciones_total + 1) / (self.volumen_total + 2)
+
+    def features(self, remitente, dominio, ahora=None):
+        """Lookup O(1) para inferencia: mismas columnas que unir_almacen() en entrenamiento"""
+        vol_d, acc_d, _ = self.dominios.buscar(dominio)
+        tasa_d = (acc_d + PESO_PRIOR * self.tasa_global) / (vol_d + PESO_PRIOR)
+        vol_r, acc_r, ultimo = self.remitentes.buscar(remitente)
+        dias = DIAS_SIN_HISTORIA
+        if ultimo is not None:
+            ahora = ahora or segundos_epoch(datetime.datetime.now())
+            dias = max(0.0, (ahora - ultimo) / 86400.0)
+        return {
+            'Remitente_Volumen': vol_r,
+            'Remitente_Tasa_Accion': (acc_r + PESO_PRIOR * tasa_d) / (vol_r + PESO_PRIOR),
+            'Dominio_Tasa_Accion': tasa_d,
+            'Remitente_Dias_Previo': dias,
+        }
+
+    def guardar(self, ruta=ARCHIVO_ALMACEN):
+        joblib.dump(self, ruta)
+
+
+def cargar_almacen(ruta=ARCHIVO_ALMACEN):
+    try: return joblib.load(ruta)
+    except Exception: return None
+
+
+def _timestamps(df):
+    if 'Fecha_Recepcion' not in df:
+        return pd.Series(np.nan, index=df.index)
+    return segundos_epoch(pd.to_datetime(df['Fecha_Recepcion'], errors='coerce'))
+
+
+def construir_desde_dataset(df, almacen=None):
+    """Agregados vectorizados (groupby) a partir de dataset_masivo.
+    Si se pasa `almacen`, acumula sobre él (entrenamiento por bloques)."""
+    if almacen is None: almacen = AlmacenFeatures()
+    tmp = pd.DataFrame({
+        'rem': df['Remitente_ID'].astype(str),
+        'dom': df['Dominio'].astype(str),
+        'acc': (df['TARGET_IA'] == 2).astype(int),
+        'ts': _timestamps(df).fillna(0.0),
+    })
+    for col, tabla in (('rem', almacen.remitentes), ('dom', almacen.dominios)):
+        agg = tmp.groupby(col, sort=False).agg(vol=('acc', 'size'), acc=('acc', 'sum'), ts=('ts', 'max'))
+        for clave, vol, acc, ts in zip(agg.index, agg['vol'], agg['acc'], agg['ts']):
+            tabla.agregar(clave, vol, acc, ts)
+    almacen.volumen_total += len(tmp)
+    almacen.acciones_total += int(tmp['acc'].sum())
+    return almacen
+
+
+def dias_previos(df):
+    """Recencia: días desde el correo anterior del mismo remitente (semántica del lookup en vivo).
+    Depende del orden global del historial: calculada sobre un bloque suelto sale distinta."""
+    ts = _timestamps(df)
+    orden = ts.sort_values(kind="stable").index
+    previo = ts.loc[orden].groupby(df.loc[orden, 'Remitente_ID']).diff() / 86400.0
+    return previo.reindex(df.index).fillna(DIAS_SIN_HISTORIA)
+
+
+def unir_almacen(df, almacen=None, folds=None, dias_previo=None):
+    """Añade COLUMNAS_ALMACEN al dataset de entrenamiento.
+    Las tasas de acción son out-of-fold: a los totales del almacén se les restan los
+    del propio fold de la fila (leave-one-out filtraría la etiqueta: dentro de un mismo
+    remitente la tasa variaría exactamente con el target). Sin `folds`, el bloque
+    completo actúa como fold (entrenamiento por bloques). `dias_previo`: la recencia de
+    cada fila ya calculada sobre el historial completo (puntuación por bloques)."""
+    if almacen is None: almacen = construir_desde_dataset(df)
+    accion = pd.Series((df['TARGET_IA'] == 2).astype(int).values, index=df.index)
+    fold = pd.Series(0 if folds is None else folds, index=df.index)
+    prior = almacen.tasa_global
+
+    def _fuera_de_fold(tabla, claves):
+        claves = claves.astype(str)
+        filas = claves.map(tabla.indice)
+        presente = filas.notna().values
+        pos = filas.fillna(0).astype(int).values
+        vol = np.where(presente, np.asarray(tabla.volumen)[pos], 0) if len(tabla) else np.zeros(len(pos), int)
+        acc = np.where(presente, np.asarray(tabla.acciones)[pos], 0) if len(tabla) else np.zeros(len(pos), int)
+        grupos = [fold, claves]
+        vol_fold = accion.groupby(grupos).transform('size').values * presente
+        acc_fold = accion.groupby(grupos).transform('sum').values * presente
+        return vol, np.maximum(vol - vol_fold, 0), np.maximum(acc - acc_fold, 0)
+
+    _, vol_d, acc_d = _fuera_de_fold(almacen.dominios, df['Dominio'])
+    tasa_d = (acc_d + PESO_PRIOR * prior) / (vol_d + PESO_PRIOR)
+    vol_total_r, vol_r, acc_r = _fuera_de_fold(almacen.remitentes, df['Remitente_ID'])
+
+    df = df.copy()
+    # El volumen no deriva del target: basta con excluir el propio correo
+    df['Remitente_Volumen'] = np.maximum(vol_total_r - 1, 0)
+    df['Remitente_Tasa_Accion'] = (acc_r + PESO_PRIOR * tasa_d) / (vol_r + PESO_PRIOR)
+    df['Dominio_Tasa_Accion'] = tasa_d
+
+    df['Remitente_Dias_Previo'] = np.asarray(dias_previos(df) if dias_previo is None else dias_previo)
+    return df
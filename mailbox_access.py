@@ -0,0 +1,303 @@
+"""
+Capa de acceso al buzón con backends intercambiables.
+
+  * "outlook"    : Outlook en vivo vía win32com (por defecto).
+  * "grabar"     : Outlook en vivo + grabación de cada propiedad, llamada y colección
+                   leída durante la ejecución en un fixture compacto (JSON gzip).
+  * "reproducir" : sirve un fixture sin Outlook (Linux/CI), con latencia COM simulada.
+  * "objeto"     : una aplicación ya construida (p.ej. buzón falso de benchmarks/).
+                   Con "grabar" + aplicacion=..., se graba sobre ese objeto en vez de Outlook.
+
+Configuración: configurar(...), variables de entorno MAIL_BACKEND / MAIL_FIXTURE /
+MAIL_LATENCIA_MS, o en CLI `--grabar RUTA`, `--reproducir RUTA`, `--latencia-ms N`.
+"""
+import base64
+import datetime
+import gc
+import gzip
+import json
+import os
+import time
+import types
+
+BACKEND = os.environ.get("MAIL_BACKEND", "outlook")
+ARCHIVO_FIXTURE = os.environ.get("MAIL_FIXTURE", "fixture_buzon.json.gz")
+LATENCIA_MS = float(os.environ.get("MAIL_LATENCIA_MS", "0"))  # Por acceso COM reproducido
+LATENCIA_MS_POR_KB = 0.0  # Costo adicional por KB de texto/bytes transferido
+
+# Métodos que modifican el buzón: al reproducir, si no fueron grabados, son no-op
+METODOS_ESCRITURA = {"Save", "Add", "Delete", "Move", "Display"}
+
+_aplicacion_inyectada = None
+_grabacion = None
+_reproduccion = None
+
+
+def configurar(backend=None, fixture=None, latencia_ms=None, aplicacion=None):
+    global BACKEND, ARCHIVO_FIXTURE, LATENCIA_MS, _aplicacion_inyectada
+    if backend is not None: BACKEND = backend
+    if fixture is not None: ARCHIVO_FIXTURE = fixture
+    if latencia_ms is not None: LATENCIA_MS = float(latencia_ms)
+    if aplicacion is not None:
+        _aplicacion_inyectada = aplicacion
+        if backend is None: BACKEND = "objeto"
+
+
+def configurar_desde_argv(argv):
+    """--grabar RUTA | --reproducir RUTA [--latencia-ms N]"""
+    for i, arg in enumerate(argv[:-1]):
+        if arg == "--grabar": configurar("grabar", argv[i + 1])
+        elif arg == "--reproducir": configurar("reproducir", argv[i + 1])
+        elif arg == "--latencia-ms": configurar(latencia_ms=argv[i + 1])
+
+
+def abrir_outlook():
+    """Equivalente a win32com.client.Dispatch("Outlook.Application") según el backend"""
+    global _grabacion, _reproduccion
+    if BACKEND == "reproducir":
+        _reproduccion = Reproduccion(ARCHIVO_FIXTURE)
+        return _reproduccion.raiz()
+    if BACKEND in ("objeto", "grabar") and _aplicacion_inyectada is not None:
+        aplicacion = _aplicacion_inyectada
+    else:
+        import win32com.client
+        aplicacion = win32com.client.Dispatch("Outlook.Application")
+    if BACKEND == "grabar":
+        _grabacion = Grabacion()
+        return _grabacion.envolver(aplicacion)
+    return aplicacion
+
+
+def finalizar():
+    """Cierra la sesión del backend: guarda el fixture si se estaba grabando"""
+    global _grabacion
+    if _grabacion is not None:
+        _grabacion.guardar(ARCHIVO_FIXTURE)
+        print(f"📼 Fixture grabado: {ARCHIVO_FIXTURE} ({len(_grabacion.objetos)} objetos)")
+        _grabacion = None
+
+
+def liberar_com():
+    """Entre ciclos de la vigilancia continua: los proxies COM atrapados en ciclos de referencias
+    se liberan (Release) al recolectarlos, y COM descarga las DLL de servidores ya sin uso"""
+    recolectados = gc.collect()
+    if BACKEND in ("outlook", "grabar"):
+        try:
+            import pythoncom
+            pythoncom.CoFreeUnusedLibraries()
+        except Exception:
+            pass
+    return recolectados
+
+
+def ahora():
+    """Reloj del backend: al reproducir es el instante de la grabación (resultados deterministas)"""
+    if BACKEND == "reproducir" and _reproduccion is not None:
+        return _reproduccion.grabado
+    if BACKEND == "grabar" and _grabacion is not None:
+        return _grabacion.inicio  # El mismo instante que verá la reproducción
+    return datetime.datetime.now()
+
+
+def estadisticas():
+    """Accesos y bytes servidos por la reproducción en curso"""
+    if _reproduccion is None: return {"accesos": 0, "bytes": 0, "escrituras": 0}
+    return {"accesos": _reproduccion.accesos, "bytes": _reproduccion.bytes,
+            "escrituras": len(_reproduccion.escrituras)}
+
+
+# --- Codificación de valores -------------------------------------------------
+_PRIMITIVOS = (str, int, float, bool, type(None))
+
+
+def es_metodo(valor):
+    """Los objetos COM (CDispatch) son invocables: solo los métodos ligados cuentan como método"""
+    return isinstance(valor, (types.MethodType, types.BuiltinMethodType, types.FunctionType))
+
+
+def _clave_llamada(nombre, args):
+    return nombre + "|" + json.dumps([a if isinstance(a, _PRIMITIVOS) else str(a) for a in args])
+
+
+# --- Grabación ---------------------------------------------------------------
+class Grabacion:
+    """Los ids son posiciones en `objetos`: no se reciclan aunque el objeto COM se libere,
+    así que la grabación no retiene referencias (límite de objetos abiertos de Exchange)"""
+
+    def __init__(self):
+        self.objetos = []   # id -> {"a": atributos, "c": llamadas, "i": iteración}
+        self.inicio = datetime.datetime.now()
+
+    def envolver(self, vivo, id_objeto=None):
+        if id_objeto is None:
+            self.objetos.append({})
+            id_objeto = len(self.objetos) - 1
+        return ObjetoGrabado(self, id_objeto, vivo)
+
+    def codificar(self, valor, previo=None):
+        """-> (valor JSON, valor para el llamador). `previo`: lo ya grabado en la misma posición
+        (atributo, llamada o elemento). Una segunda lectura de item.PropertyAccessor devuelve otro
+        proxy COM, pero debe seguir grabando en el mismo id que verá la reproducción."""
+        if isinstance(valor, datetime.datetime):
+            return {"t": valor.isoformat()}, valor
+        if isinstance(valor, _PRIMITIVOS):
+            return valor, valor
+        if isinstance(valor, (bytes, bytearray, memoryview)):
+            return {"b": base64.b64encode(bytes(valor)).decode("ascii")}, valor
+        if type(valor) in (tuple, list):
+            previos = previo["l"] if isinstance(previo, dict) and "l" in previo else []
+            return {"l": [self.codificar(v, previos[i] if i < len(previos) else None)[0]
+                          for i, v in enumerate(valor)]}, valor
+        if isinstance(previo, dict) and "r" in previo:
+            return previo, self.envolver(valor, previo["r"])
+        proxy = self.envolver(valor)
+        return {"r": proxy._id}, proxy
+
+    def guardar(self, ruta):
+        datos = {"version": 1, "grabado": self.inicio.isoformat(), "objetos": self.objetos}
+        with gzip.open(ruta, "wt", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+
+
+class ObjetoGrabado:
+    __slots__ = ("_grab", "_id", "_vivo")
+
+    def __init__(self, grabacion, id_objeto, vivo):
+        object.__setattr__(self, "_grab", grabacion)
+        object.__setattr__(self, "_id", id_objeto)
+        object.__setattr__(self, "_vivo", vivo)
+
+    def __getattr__(self, nombre):
+        registro = self._grab.objetos[self._id]
+        try:
+            valor = getattr(self._vivo, nombre)
+        except Exception as e:
+            registro.setdefault("a", {}).setdefault(nombre, {"e": str(e)})
+            raise
+        if es_metodo(valor):
+            return _MetodoGrabado(self, nombre, valor)
+        atributos = registro.setdefault("a", {})
+        codificado, salida = self._grab.codificar(valor, atributos.get(nombre))
+        atributos.setdefault(nombre, codificado)
+        return salida
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._vivo, nombre, valor)
+
+    def __iter__(self):
+        registro = self._grab.objetos[self._id]
+        grabados = registro.setdefault("i", [])
+        for posicion, valor in enumerate(self._vivo):
+            nuevo = posicion >= len(grabados)
+            codificado, salida = self._grab.codificar(valor, None if nuevo else grabados[posicion])
+            if nuevo: grabados.append(codificado)
+            yield salida
+
+
+class _MetodoGrabado:
+    __slots__ = ("_dueno", "_nombre", "_metodo")
+
+    def __init__(self, dueno, nombre, metodo):
+        self._dueno, self._nombre, self._metodo = dueno, nombre, metodo
+
+    def __call__(self, *args):
+        llamadas = self._dueno._grab.objetos[self._dueno._id].setdefault("c", {})
+        clave = _clave_llamada(self._nombre, args)
+        try:
+            valor = self._metodo(*args)
+        except Exception as e:
+            llamadas.setdefault(clave, {"e": str(e)})
+            raise
+        codificado, salida = self._dueno._grab.codificar(valor, llamadas.get(clave))
+        llamadas.setdefault(clave, codificado)
+        return salida
+
+
+# --- Reproducción ------------------------------------------------------------
+class ErrorReproduccion(Exception):
+    """Equivalente a pywintypes.com_error al reproducir"""
+
+
+class Reproduccion:
+    def __init__(self, ruta):
+        with gzip.open(ruta, "rt", encoding="utf-8") as f:
+            datos = json.load(f)
+        self.objetos = datos["objetos"]
+        self.grabado = datetime.datetime.fromisoformat(datos["grabado"])
+        self._cache = {}
+        self.accesos = 0
+        self.bytes = 0
+        self.escrituras = []  # (id, atributo, valor)
+
+    def raiz(self):
+        return self.objeto(0)
+
+    def objeto(self, id_objeto):
+        obj = self._cache.get(id_objeto)
+        if obj is None:
+            obj = self._cache[id_objeto] = ObjetoReproducido(self, id_objeto)
+        return obj
+
+    def decodificar(self, valor):
+        """Aplica la latencia simulada y reconstruye el valor grabado"""
+        self.accesos += 1
+        espera = LATENCIA_MS
+        if isinstance(valor, str):
+            self.bytes += 2 * len(valor)
+            espera += LATENCIA_MS_POR_KB * len(valor) * 2 / 1024
+        if espera: time.sleep(espera / 1000)
+        if not isinstance(valor, dict): return valor
+        if "r" in valor: return self.objeto(valor["r"])
+        if "t" in valor: return datetime.datetime.fromisoformat(valor["t"])
+        if "e" in valor: raise ErrorReproduccion(valor["e"])
+        if "b" in valor:
+            datos = base64.b64decode(valor["b"])
+            self.bytes += len(datos)
+            if LATENCIA_MS_POR_KB: time.sleep(LATENCIA_MS_POR_KB * len(datos) / 1024 / 1000)
+            return datos
+        if "l" in valor: return tuple(self.decodificar(v) for v in valor["l"])
+        return valor
+
+
+class ObjetoReproducido:
+    __slots__ = ("_rep", "_id", "_locales")
+
+    def __init__(self, reproduccion, id_objeto):
+        object.__setattr__(self, "_rep", reproduccion)
+        object.__setattr__(self, "_id", id_objeto)
+        object.__setattr__(self, "_locales", {})
+
+    def __getattr__(self, nombre):
+        if nombre in self._locales: return self._locales[nombre]
+        registro = self._rep.objetos[self._id]
+        atributos = registro.get("a", {})
+        if nombre in atributos: return self._rep.decodificar(atributos[nombre])
+        prefijo = nombre + "|"
+        if nombre in METODOS_ESCRITURA or any(k.startswith(prefijo) for k in registro.get("c", {})):
+            return _MetodoReproducido(self, nombre)
+        raise AttributeError(f"'{nombre}' no fue grabado en el objeto {self._id}")
+
+    def __setattr__(self, nombre, valor):
+        self._locales[nombre] = valor
+        self._rep.escrituras.append((self._id, nombre, valor))
+
+    def __iter__(self):
+        for valor in self._rep.objetos[self._id].get("i", []):
+            yield self._rep.decodificar(valor)
+
+
+class _MetodoReproducido:
+    __slots__ = ("_dueno", "_nombre")
+
+    def __init__(self, dueno, nombre):
+        self._dueno, self._nombre = dueno, nombre
+
+    def __call__(self, *args):
+        rep = self._dueno._rep
+        llamadas = rep.objetos[self._dueno._id].get("c", {})
+        clave = _clave_llamada(self._nombre, args)
+        if clave in llamadas: return rep.decodificar(llamadas[clave])
+        if self._nombre in METODOS_ESCRITURA:
+            rep.escrituras.append((self._dueno._id, self._nombre + "()", args))
+            return None
+        raise ErrorReproduccion(f"Llamada no grabada: {clave}")
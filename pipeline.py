@@ -0,0 +1,180 @@
+"""
+Pipeline por etapas para extracción y vigilancia.
+
+    lectura COM (hilo STA) -> cola acotada -> N trabajadores CPU -> cola -> escritura COM (hilo STA)
+
+Los objetos COM no salen nunca del hilo que los creó (apartamento STA): el lector
+envía solo propiedades crudas (str/int/fecha) y conserva el item en `pendientes`
+hasta que el escritor, en el mismo hilo, lo recupera. Mientras COM espera a Outlook
+(pywin32 libera el GIL) los trabajadores limpian, derivan features y puntúan por lotes.
+
+Contrapresión: con MAX_EN_VUELO items sin escribir, el lector se detiene y escribe.
+Cancelación: el `cancelar` (threading.Event) de cada ejecución, p.ej. el botón "Detener"
+de su vista en la GUI, corta la lectura; lo ya calculado se escribe y los trabajadores
+terminan limpiamente. Cada vista/ejecución tiene el suyo: detener una extracción no
+detiene la vigilancia continua.
+"""
+import queue
+import threading
+import time
+
+N_TRABAJADORES = 2   # 0 = todo en el hilo STA (modo secuencial, útil para depurar)
+MAX_EN_VUELO = 256   # Items leídos y aún no escritos
+ESPERA_LOTE = 0.02   # Segundos que un trabajador espera para completar un lote (la lectura va de a uno)
+
+
+class Pipeline:
+    """Uso (en el hilo STA):
+
+        with Pipeline("vigilancia", trabajo, escribir, tamano_lote=32) as tuberia:
+            for item in ...:
+                if tuberia.cancelada: break
+                tuberia.enviar(leer_crudo(item), item)
+
+    `trabajo(lista_crudos) -> lista_resultados` corre en los trabajadores.
+    `escribir(contexto, resultado)` corre en el hilo STA (resultado None = error en trabajo).
+    `cancelar`: threading.Event de la ejecución (None = no se puede detener).
+    """
+
+    def __init__(self, nombre, trabajo, escribir, tamano_lote=1, n_trabajadores=None, max_en_vuelo=None,
+                 cancelar=None):
+        self.nombre = nombre
+        self.cancelar = cancelar or threading.Event()
+        self.trabajo = trabajo
+        self.escribir = escribir
+        self.tamano_lote = tamano_lote
+        self.n_trabajadores = N_TRABAJADORES if n_trabajadores is None else n_trabajadores
+        self.max_en_vuelo = max_en_vuelo or MAX_EN_VUELO
+        self.entrada = queue.Queue(maxsize=self.max_en_vuelo + self.n_trabajadores)
+        self.salida = queue.Queue()
+        self.pendientes = {}  # secuencia -> contexto COM (solo lo toca el hilo STA)
+        self.secuencia = 0
+        self.items = 0
+        self.errores = 0
+        self.lotes = 0
+        self.t_escritura = 0.0
+        self.t_espera = 0.0  # Hilo STA bloqueado esperando a los trabajadores
+        self.t_trabajo = [0.0] * max(self.n_trabajadores, 1)
+        self.primera_escritura = None  # perf_counter del primer resultado escrito
+        self.hilos = []
+
+    @property
+    def cancelada(self):
+        return self.cancelar.is_set()
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        for i in range(self.n_trabajadores):
+            hilo = threading.Thread(target=self._trabajador, args=(i,), daemon=True, name=f"{self.nombre}-cpu{i}")
+            hilo.start()
+            self.hilos.append(hilo)
+        return self
+
+    def enviar(self, crudo, contexto=None):
+        """Encola propiedades ya leídas; `contexto` (item COM, carpeta...) queda en el hilo STA"""
+        secuencia, self.secuencia = self.secuencia, self.secuencia + 1
+        if self.n_trabajadores == 0:
+            self._escribir(contexto, self._ejecutar(0, [crudo])[0])
+            return
+        self.pendientes[secuencia] = contexto
+        while len(self.pendientes) > self.max_en_vuelo:
+            self._escribir_siguiente(bloquear=True)
+        self.entrada.put((secuencia, crudo))
+        while self._escribir_siguiente(bloquear=False): pass
+
+    def escribir_directo(self, contexto, resultado):
+        """Resultado que no necesita CPU (p.ej. score reutilizado): va directo al escritor"""
+        self._escribir(contexto, resultado)
+
+    def __exit__(self, tipo, valor, traza):
+        if self.cancelada or tipo is not None:
+            # Lo que aún no empezó a procesarse se descarta
+            while True:
+                try: secuencia, _ = self.entrada.get_nowait()
+                except queue.Empty: break
+                self.pendientes.pop(secuencia, None)
+        for _ in self.hilos: self.entrada.put(None)
+        while self.pendientes: self._escribir_siguiente(bloquear=True)
+        for hilo in self.hilos: hilo.join()
+        self.duracion = time.perf_counter() - self.inicio
+        self.imprimir_utilizacion()
+        return False
+
+    # --- Trabajadores ---------------------------------------------------------
+    def _trabajador(self, indice):
+        fin = False
+        while not fin:
+            primero = self.entrada.get()
+            if primero is None: break
+            lote = [primero]
+            limite = time.perf_counter() + ESPERA_LOTE
+            while len(lote) < self.tamano_lote:
+                try: siguiente = self.entrada.get(timeout=max(limite - time.perf_counter(), 0))
+                except queue.Empty: break
+                if siguiente is None:
+                    fin = True
+                    break
+                lote.append(siguiente)
+            resultados = self._ejecutar(indice, [crudo for _, crudo in lote])
+            for (secuencia, _), resultado in zip(lote, resultados):
+                self.salida.put((secuencia, resultado))
+
+    def _ejecutar(self, indice, crudos):
+        inicio = time.perf_counter()
+        try:
+            resultados = self.trabajo(crudos)
+        except Exception:
+            # Un item problemático no tumba el lote: se reintenta de a uno
+            resultados = []
+            for crudo in crudos:
+                try: resultados.append(self.trabajo([crudo])[0])
+                except Exception: resultados.append(None)
+        self.t_trabajo[indice] += time.perf_counter() - inicio
+        self.lotes += 1
+        return resultados
+
+    # --- Escritor (hilo STA) ---------------------------------------------------
+    def _escribir_siguiente(self, bloquear):
+        inicio = time.perf_counter()
+        try:
+            secuencia, resultado = self.salida.get(block=bloquear)
+        except queue.Empty:
+            return False
+        if bloquear: self.t_espera += time.perf_counter() - inicio
+        self._escribir(self.pendientes.pop(secuencia), resultado)
+        return True
+
+    def _escribir(self, contexto, resultado):
+        self.items += 1
+        if resultado is None:
+            self.errores += 1
+            return
+        inicio = time.perf_counter()
+        try: self.escribir(contexto, resultado)
+        except Exception: self.errores += 1
+        fin = time.perf_counter()
+        self.t_escritura += fin - inicio
+        if self.primera_escritura is None: self.primera_escritura = fin
+
+    # --- Utilización -----------------------------------------------------------
+    def utilizacion(self):
+        """Fracción del tiempo total ocupada por cada etapa"""
+        total = max(self.duracion, 1e-9)
+        cpu = sum(self.t_trabajo)
+        lectura = total - self.t_escritura - self.t_espera
+        if self.n_trabajadores == 0: lectura -= cpu
+        return {
+            "lectura COM": lectura / total,
+            "CPU": cpu / (total * max(self.n_trabajadores, 1)),
+            "escritura COM": self.t_escritura / total,
+            "lector esperando CPU": self.t_espera / total,
+        }
+
+    def imprimir_utilizacion(self):
+        etapas = self.utilizacion()
+        cuello = max(("lectura COM", "CPU", "escritura COM"), key=etapas.get)
+        trabajadores = f"{self.n_trabajadores} trabajadores" if self.n_trabajadores else "secuencial"
+        print(f"📈 Etapas [{self.nombre}] {self.items} items en {self.duracion:.2f}s ({trabajadores}, "
+              f"{self.lotes} lotes, {self.errores} errores){' — CANCELADO' if self.cancelada else ''}")
+        print("   " + " | ".join(f"{etapa} {fraccion:.0%}" for etapa, fraccion in etapas.items())
+              + f" → cuello de botella: {cuello}")
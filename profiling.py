@@ -0,0 +1,280 @@
+"""
+Modo perfilado (opt-in) para extracción, entrenamiento y vigilancia.
+
+Con ACTIVO = True (GUI: Configuración > "Modo perfilado"; CLI: --perfilar) cada
+operación decorada con @perfilable genera un único reporte de texto con:
+  * Perfil de CPU por muestreo de la pila de cada hilo de la operación (el que la llamó y
+    los que arrancan durante ella: trabajadores CPU del pipeline, escritor del archivo
+    crudo), agrupado por nombre de hilo.
+  * Conteo y tiempo de cada acceso/llamada COM por nombre (vía envolver_com).
+  * Snapshots de tracemalloc en cada frontera de carpeta (marca_carpeta).
+Desactivado, el costo es una comprobación de bandera por llamada.
+
+salud_proceso() (RSS, handles, hilos) no depende de ACTIVO: la vigilancia continua la
+registra en cada ciclo.
+"""
+import datetime
+import functools
+import os
+import platform
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter, defaultdict
+
+ACTIVO = False
+DIRECTORIO_REPORTES = "perfiles"
+INTERVALO_MUESTREO = 0.005  # segundos
+TOP_FUNCIONES = 40
+TOP_ASIGNACIONES = 8
+
+_sesion = None  # Solo una sesión a la vez (la operación más externa)
+
+
+class _Muestreador(threading.Thread):
+    """Toma la pila de cada hilo de la operación cada INTERVALO_MUESTREO segundos. Los hilos que
+    ya existían al empezar (salvo el objetivo, p.ej. el mainloop de la GUI) no son de la operación."""
+
+    def __init__(self, hilo_objetivo):
+        super().__init__(daemon=True, name="perfilado-muestreo")
+        self.hilo_objetivo = hilo_objetivo
+        self.ajenos = {t.ident for t in threading.enumerate()} - {hilo_objetivo}
+        self.detener = threading.Event()
+        # grupo -> propias (función en la cima de la pila), inclusivas (presente en la pila), muestras
+        self.grupos = defaultdict(lambda: {"propias": Counter(), "inclusivas": Counter(), "muestras": 0})
+        self.muestras = 0  # Intervalos muestreados
+
+    def _grupo(self, ident, nombres):
+        """Nombre del hilo sin el número final: los trabajadores de un mismo pool van juntos"""
+        nombre = nombres.get(ident, f"hilo-{ident}")
+        if ident == self.hilo_objetivo: return f"{nombre} (operación)"
+        return re.sub(r"[-_]?\d+$", "", nombre)
+
+    def run(self):
+        while not self.detener.wait(INTERVALO_MUESTREO):
+            nombres = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident or ident in self.ajenos: continue
+                grupo = self.grupos[self._grupo(ident, nombres)]
+                vistas = set()
+                cima = True
+                while frame is not None:
+                    code = frame.f_code
+                    clave = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if cima:
+                        grupo["propias"][clave] += 1
+                        cima = False
+                    if clave not in vistas:
+                        grupo["inclusivas"][clave] += 1
+                        vistas.add(clave)
+                    frame = frame.f_back
+                grupo["muestras"] += 1
+            self.muestras += 1
+
+
+class SesionPerfilado:
+    def __init__(self, operacion):
+        self.operacion = operacion
+        self.com = defaultdict(lambda: [0, 0.0])  # nombre -> [llamadas, segundos]
+        self.memoria = []  # (etiqueta, actual, pico, top diferencias)
+        self._snapshot_previo = None
+        self._tracemalloc_propio = False
+
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        self.fecha = datetime.datetime.now()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc_propio = True
+        self._snapshot_previo = tracemalloc.take_snapshot()
+        self.muestreador = _Muestreador(threading.get_ident())
+        self.muestreador.start()
+
+    def registrar_com(self, nombre, segundos):
+        entrada = self.com[nombre]
+        entrada[0] += 1
+        entrada[1] += segundos
+
+    def marca(self, etiqueta):
+        snapshot = tracemalloc.take_snapshot()
+        diferencias = snapshot.compare_to(self._snapshot_previo, "lineno")[:TOP_ASIGNACIONES]
+        actual, pico = tracemalloc.get_traced_memory()
+        self.memoria.append((etiqueta, actual, pico, [str(d) for d in diferencias]))
+        self._snapshot_previo = snapshot
+
+    def finalizar(self):
+        self.duracion = time.perf_counter() - self.inicio
+        self.muestreador.detener.set()
+        self.muestreador.join()
+        self.marca("fin de la operación")
+        if self._tracemalloc_propio: tracemalloc.stop()
+        self._snapshot_previo = None
+        return self.escribir_reporte()
+
+    def escribir_reporte(self):
+        os.makedirs(DIRECTORIO_REPORTES, exist_ok=True)
+        ruta = os.path.join(DIRECTORIO_REPORTES, f"perfil_{self.operacion}_{self.fecha:%Y%m%d_%H%M%S}.txt")
+        m = self.muestreador
+        lineas = [
+            f"REPORTE DE PERFILADO — {self.operacion}",
+            f"Fecha: {self.fecha:%Y-%m-%d %H:%M:%S} | Duración: {self.duracion:.2f}s",
+            f"Python {platform.python_version()} | {platform.platform()}",
+            "",
+            f"=== CPU (muestreo cada {INTERVALO_MUESTREO * 1000:.0f} ms, {m.muestras} intervalos, por hilo) ===",
+        ]
+        # Primero el hilo de la operación, luego los demás grupos por muestras
+        orden = sorted(m.grupos.items(), key=lambda kv: (not kv[0].endswith("(operación)"), -kv[1]["muestras"]))
+        for grupo, datos in orden:
+            total = max(datos["muestras"], 1)
+            lineas += [f"--- {grupo}: {datos['muestras']} muestras ---",
+                       f"{'propio %':>9} {'total %':>8}  función"]
+            for clave, n in datos["inclusivas"].most_common(TOP_FUNCIONES):
+                archivo, linea, nombre = clave
+                lineas.append(f"{100 * datos['propias'][clave] / total:>9.1f} {100 * n / total:>8.1f}  "
+                              f"{nombre} ({os.path.basename(archivo)}:{linea})")
+
+        lineas += ["", "=== COM (accesos y llamadas por nombre) ===",
+                    f"{'llamadas':>9} {'total ms':>10} {'media µs':>9}  nombre"]
+        for nombre, (n, seg) in sorted(self.com.items(), key=lambda kv: kv[1][1], reverse=True):
+            lineas.append(f"{n:>9} {seg * 1000:>10.1f} {seg / n * 1e6:>9.1f}  {nombre}")
+        total_com = sum(seg for _, seg in self.com.values())
+        lineas.append(f"Tiempo COM total: {total_com:.2f}s ({100 * total_com / max(self.duracion, 1e-9):.0f}% "
+                      f"de la operación)")
+
+        lineas += ["", "=== MEMORIA (tracemalloc en fronteras de carpeta) ==="]
+        for etiqueta, actual, pico, diferencias in self.memoria:
+            lineas.append(f"[{etiqueta}] actual {actual / 2**20:.1f} MB | pico {pico / 2**20:.1f} MB")
+            lineas += [f"    {d}" for d in diferencias]
+
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("\n".join(lineas) + "\n")
+        return ruta
+
+
+def perfilable(operacion):
+    """Decorador: si ACTIVO, la llamada se perfila y se escribe un reporte al terminar"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            global _sesion
+            if not ACTIVO or _sesion is not None:
+                return funcion(*args, **kwargs)
+            _sesion = SesionPerfilado(operacion)
+            _sesion.iniciar()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                sesion, _sesion = _sesion, None
+                print(f"🔬 Reporte de perfilado: {sesion.finalizar()}")
+        return envoltura
+    return decorador
+
+
+def marca_carpeta(ruta):
+    """Frontera de carpeta: snapshot de memoria (no-op si no hay sesión)"""
+    if _sesion is not None: _sesion.marca(ruta)
+
+
+def salud_proceso():
+    """RSS (MB), handles abiertos (Windows; descriptores en Linux) e hilos del proceso"""
+    salud = {"rss_mb": None, "handles": None, "hilos": threading.active_count()}
+    try:
+        if os.name == "nt":
+            salud.update(_salud_windows())
+        else:
+            with open("/proc/self/statm") as f:
+                salud["rss_mb"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+            salud["handles"] = len(os.listdir("/proc/self/fd"))
+    except Exception:
+        pass
+    return salud
+
+
+def _salud_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class CONTADORES_MEMORIA(ctypes.Structure):  # PROCESS_MEMORY_COUNTERS
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (campo, ctypes.c_size_t) for campo in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    kernel32, psapi, user32 = ctypes.windll.kernel32, ctypes.windll.psapi, ctypes.windll.user32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    proceso = kernel32.GetCurrentProcess()
+    contadores = CONTADORES_MEMORIA()
+    contadores.cb = ctypes.sizeof(contadores)
+    psapi.GetProcessMemoryInfo(wintypes.HANDLE(proceso), ctypes.byref(contadores), contadores.cb)
+    handles = wintypes.DWORD()
+    kernel32.GetProcessHandleCount(wintypes.HANDLE(proceso), ctypes.byref(handles))
+    return {"rss_mb": contadores.WorkingSetSize / 2 ** 20, "handles": handles.value,
+            "gdi": user32.GetGuiResources(wintypes.HANDLE(proceso), 0)}  # La consola Tk vive de objetos GDI
+
+
+# Valores que COM devuelve por valor (pywintypes.datetime hereda de datetime); tuplas/listas
+# exactas son SAFEARRAYs. Todo lo demás se trata como objeto COM.
+_PRIMITIVOS = (str, int, float, bool, bytes, type(None), datetime.datetime, datetime.date)
+
+
+def _es_primitivo(objeto):
+    return isinstance(objeto, _PRIMITIVOS) or type(objeto) in (tuple, list)
+
+
+def _es_metodo(valor):
+    # Los CDispatch también son invocables (método por defecto): no basta con callable()
+    return isinstance(valor, (types.MethodType, types.BuiltinMethodType, types.FunctionType))
+
+
+def envolver_com(objeto, nombre="Outlook"):
+    """Devuelve un proxy que contabiliza cada acceso COM; sin sesión devuelve el objeto tal cual"""
+    if _sesion is None or _es_primitivo(objeto): return objeto
+    return ProxyCOM(objeto, nombre)
+
+
+class ProxyCOM:
+    __slots__ = ("_objeto", "_nombre")
+
+    def __init__(self, objeto, nombre):
+        object.__setattr__(self, "_objeto", objeto)
+        object.__setattr__(self, "_nombre", nombre)
+
+    def __getattr__(self, atributo):
+        inicio = time.perf_counter()
+        valor = getattr(self._objeto, atributo)
+        clave = f"{self._nombre}.{atributo}"
+        if _sesion is not None: _sesion.registrar_com(clave, time.perf_counter() - inicio)
+        if _es_metodo(valor):
+            return _MetodoCOM(valor, clave + "()", atributo)
+        return envolver_com(valor, atributo)
+
+    def __setattr__(self, atributo, valor):
+        inicio = time.perf_counter()
+        setattr(self._objeto, atributo, valor)
+        if _sesion is not None: _sesion.registrar_com(f"{self._nombre}.{atributo}=", time.perf_counter() - inicio)
+
+    def __iter__(self):
+        iterador = iter(self._objeto)
+        elemento = f"{self._nombre}[]"
+        while True:
+            inicio = time.perf_counter()
+            try: valor = next(iterador)
+            except StopIteration: return
+            if _sesion is not None: _sesion.registrar_com(elemento, time.perf_counter() - inicio)
+            yield envolver_com(valor, elemento)
+
+
+class _MetodoCOM:
+    __slots__ = ("_metodo", "_clave", "_nombre")
+
+    def __init__(self, metodo, clave, nombre):
+        self._metodo, self._clave, self._nombre = metodo, clave, nombre
+
+    def __call__(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        valor = self._metodo(*args, **kwargs)
+        if _sesion is not None: _sesion.registrar_com(self._clave, time.perf_counter() - inicio)
+        return envolver_com(valor, self._nombre)
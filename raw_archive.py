@@ -0,0 +1,138 @@
+"""
+Archivo crudo de la extracción: las propiedades tal como se leyeron de Outlook.
+
+dataset_masivo.csv guarda texto ya limpio y columnas derivadas; cambiar la limpieza, las
+reglas de audiencia o el ground truth obligaba a re-minar Outlook. El extractor escribe
+además cada crudo (remitente, destinatarios con tipo, asunto, prefijo del cuerpo, último
+verbo, estado de lectura, fecha, ruta de carpeta) en un archivo comprimido por bloques:
+
+  archivo_crudo.bin  bloques zlib de JSON por líneas, solo se agrega al final
+  archivo_crudo.idx  JSON por líneas: metadatos de la extracción + un registro por bloque
+                     (offset, bytes, n, crc32) escrito después de su bloque
+
+Cada extracción escribe un archivo nuevo (.tmp) que reemplaza al anterior solo si termina
+completa. La compresión y la escritura van en un hilo propio (zlib libera el GIL): el hilo
+STA de la extracción solo serializa. Los bloques se leen de forma independiente, así que
+la re-derivación se reparte entre procesos (01_data_extractor.py --desde-archivo).
+"""
+import datetime
+import json
+import os
+import queue
+import threading
+import zlib
+
+ARCHIVO_CRUDO = "archivo_crudo.bin"
+TAMANO_BLOQUE = 2000  # Crudos por bloque comprimido
+NIVEL_COMPRESION = 6
+VERSION_FORMATO = 1
+
+
+def ruta_indice(ruta):
+    return os.path.splitext(ruta)[0] + ".idx"
+
+
+def _a_json(valor):
+    if isinstance(valor, datetime.datetime): return {"$fecha": valor.isoformat()}
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _desde_json(objeto):
+    if "$fecha" in objeto: return datetime.datetime.fromisoformat(objeto["$fecha"])
+    return objeto
+
+
+class EscritorArchivo:
+    """Escribe una extracción: agregar(crudo) por cada lectura (hilo STA) y cerrar(completo) al final"""
+
+    def __init__(self, meta=None, ruta=ARCHIVO_CRUDO, tamano_bloque=TAMANO_BLOQUE):
+        self.ruta, self.tamano_bloque = ruta, tamano_bloque
+        self.datos = open(ruta + ".tmp", "wb")
+        self.indice = open(ruta_indice(ruta) + ".tmp", "w", encoding="utf-8")
+        self.indice.write(json.dumps({"version": VERSION_FORMATO, **(meta or {})}, default=_a_json) + "\n")
+        self.pendientes = []
+        self.mensajes = self.bloques = 0
+        self.error = None
+        self.fallidos = 0  # Crudos que no se pudieron archivar: el archivo queda incompleto
+        self.cola = queue.Queue(maxsize=2)  # Bloques sin comprimir en espera: memoria acotada
+        self.hilo = threading.Thread(target=self._escritor, daemon=True, name="archivo-crudo")
+        self.hilo.start()
+
+    def agregar(self, crudo):
+        # Se serializa ya: el crudo sigue su camino por el pipeline
+        self.pendientes.append(json.dumps(crudo, ensure_ascii=False, default=_a_json))
+        if len(self.pendientes) >= self.tamano_bloque: self._volcar()
+
+    def _volcar(self):
+        if not self.pendientes: return
+        self.cola.put(self.pendientes)
+        self.pendientes = []
+
+    def _escritor(self):
+        while True:
+            lineas = self.cola.get()
+            if lineas is None: return
+            if self.error is not None: continue
+            try:
+                crudo = "\n".join(lineas).encode("utf-8")
+                comprimido = zlib.compress(crudo, NIVEL_COMPRESION)
+                offset = self.datos.tell()
+                self.datos.write(comprimido)
+                self.datos.flush()
+                self.indice.write(json.dumps({"offset": offset, "bytes": len(comprimido), "n": len(lineas),
+                                              "crc32": zlib.crc32(comprimido), "sin_comprimir": len(crudo)}) + "\n")
+                self.indice.flush()
+                self.mensajes += len(lineas)
+                self.bloques += 1
+            except Exception as e:
+                self.error = e
+
+    def cerrar(self, completo=True):
+        """Completo: reemplaza el archivo anterior. Interrumpido: se descarta y el anterior queda."""
+        if completo: self._volcar()
+        self.cola.put(None)
+        self.hilo.join()
+        self.datos.close()
+        self.indice.close()
+        if completo and self.error is None and not self.fallidos:
+            os.replace(self.ruta + ".tmp", self.ruta)
+            os.replace(ruta_indice(self.ruta) + ".tmp", ruta_indice(self.ruta))
+            return
+        for ruta in (self.ruta + ".tmp", ruta_indice(self.ruta) + ".tmp"): os.remove(ruta)
+        if self.error is not None: print(f"[WARN] Archivo crudo descartado: {self.error}")
+        elif self.fallidos:
+            print(f"[WARN] {self.fallidos} crudos no se pudieron archivar: archivo crudo descartado (el anterior se conserva)")
+
+
+def leer_indice(ruta=ARCHIVO_CRUDO):
+    """(meta, [bloques]) o None si no hay archivo"""
+    try:
+        with open(ruta_indice(ruta), encoding="utf-8") as f:
+            lineas = [json.loads(l, object_hook=_desde_json) for l in f if l.strip()]
+    except (OSError, ValueError):
+        return None
+    if not lineas or lineas[0].get("version") != VERSION_FORMATO: return None
+    return lineas[0], lineas[1:]
+
+
+def leer_bloque(bloque, ruta=ARCHIVO_CRUDO):
+    """Los crudos de un bloque, en orden de lectura"""
+    with open(ruta, "rb") as f:
+        f.seek(bloque["offset"])
+        comprimido = f.read(bloque["bytes"])
+    if zlib.crc32(comprimido) != bloque["crc32"]:
+        raise ValueError(f"Bloque corrupto en el offset {bloque['offset']} de {ruta}")
+    texto = zlib.decompress(comprimido).decode("utf-8")
+    return [json.loads(linea, object_hook=_desde_json) for linea in texto.split("\n")]
+
+
+def resumen(ruta=ARCHIVO_CRUDO):
+    contenido = leer_indice(ruta)
+    if contenido is None: return "🗜️ Sin archivo crudo."
+    _, bloques = contenido
+    mensajes = sum(b["n"] for b in bloques)
+    tamano = sum(b["bytes"] for b in bloques)
+    sin_comprimir = sum(b["sin_comprimir"] for b in bloques)
+    por_100k = tamano / max(mensajes, 1) * 100000 / 2 ** 20
+    return (f"🗜️ Archivo crudo: {mensajes} mensajes en {len(bloques)} bloques, {tamano / 2 ** 20:.1f} MB "
+            f"({por_100k:.0f} MB por 100k mensajes, {sin_comprimir / max(tamano, 1):.1f}x) -> {ruta}")
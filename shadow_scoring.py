@@ -0,0 +1,183 @@
+"""
+Scoring en sombra campeón / retadores.
+
+El monitor arma la fila de features de cada correo una sola vez y el Comite la
+puntúa con el modelo activo (campeón) y con cada retador. Solo el campeón etiqueta.
+Los modelos cuyo preprocesador es idéntico (p.ej. entrenados sobre la misma caché
+de featurización) comparten además la matriz transformada, así que el costo extra
+por correo es únicamente la evaluación de cada clasificador retador.
+
+Scores, acuerdo y latencia por modelo se guardan en ARCHIVO_SOMBRA (SQLite) para
+compararlos offline: `python shadow_scoring.py [ruta]` imprime el resumen.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+import threshold_calibration
+
+ARCHIVO_SOMBRA = "sombra_modelos.sqlite"
+FILAS_POR_ESCRITURA = 5000  # Los scores se acumulan en memoria y se escriben por tandas
+UMBRALES_POR_DEFECTO = (0.75, 0.60)  # Si la versión del campeón no tiene umbrales calibrados
+
+# Cada fila puntuada lleva (ejecucion, evaluacion): el mismo par para todos los modelos que la
+# puntuaron, así la comparación empareja exactamente aunque un correo se puntúe dos veces
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS modelos (id INTEGER PRIMARY KEY, ruta TEXT, version TEXT, rol TEXT,
+                                    UNIQUE (ruta, version, rol));
+CREATE TABLE IF NOT EXISTS ejecuciones (id INTEGER PRIMARY KEY, inicio INTEGER);
+CREATE TABLE IF NOT EXISTS scores (ts INTEGER, huella TEXT, modelo INTEGER, prob REAL,
+                                   ejecucion INTEGER, evaluacion INTEGER);
+CREATE TABLE IF NOT EXISTS lotes (ts INTEGER, modelo INTEGER, n INTEGER, segundos REAL);
+CREATE INDEX IF NOT EXISTS scores_huella ON scores (huella);
+"""
+INDICE_EVALUACION = "CREATE INDEX IF NOT EXISTS scores_evaluacion ON scores (ejecucion, evaluacion)"
+
+
+def _abrir(ruta):
+    """Conexión con el esquema al día (las bases anteriores no tenían ejecucion/evaluacion)"""
+    conexion = sqlite3.connect(ruta, check_same_thread=False)
+    conexion.executescript(ESQUEMA)
+    columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(scores)")}
+    for columna in ("ejecucion", "evaluacion"):
+        if columna not in columnas: conexion.execute(f"ALTER TABLE scores ADD COLUMN {columna} INTEGER")
+    conexion.execute(INDICE_EVALUACION)
+    conexion.commit()
+    return conexion
+
+
+def categoria(prob, umbral_rojo, umbral_amarillo):
+    """0 = ignorado, 1 = revisar, 2 = urgente (mismos cortes que la vigilancia)"""
+    return 2 if prob >= umbral_rojo else (1 if prob >= umbral_amarillo else 0)
+
+
+def _partes(modelo):
+    """(preprocesador, clasificador final, huella del preprocesador) de un Pipeline de sklearn"""
+    pasos = getattr(modelo, "steps", None)
+    if not pasos or len(pasos) < 2: return None, modelo, None
+    preprocesador = modelo[:-1]
+    huella = hashlib.sha1(pickle.dumps(preprocesador, protocol=4)).hexdigest()
+    return preprocesador, pasos[-1][1], huella
+
+
+class Comite:
+    def __init__(self, campeon, version_campeon, retadores, umbral_rojo, umbral_amarillo,
+                 ruta_campeon="", ruta=ARCHIVO_SOMBRA):
+        """`retadores`: lista de (ruta, versión, modelo)"""
+        self.umbrales = (umbral_rojo, umbral_amarillo)
+        self.ruta = ruta
+        self.modelos = [(ruta_campeon, version_campeon, "campeon", campeon)] + \
+                       [(r, v, "retador", m) for r, v, m in retadores]
+        self.partes = [_partes(m) for *_, m in self.modelos]
+        self.conexion = _abrir(ruta)
+        self.ejecucion = self.conexion.execute("INSERT INTO ejecuciones (inicio) VALUES (?)",
+                                               (int(time.time()),)).lastrowid
+        self.evaluaciones = 0  # Filas puntuadas en esta ejecución (id de cada evaluación)
+        self.ids = []
+        for ruta_modelo, version, rol, _ in self.modelos:
+            self.conexion.execute("INSERT OR IGNORE INTO modelos (ruta, version, rol) VALUES (?, ?, ?)",
+                                  (ruta_modelo, version, rol))
+            self.ids.append(self.conexion.execute("SELECT id FROM modelos WHERE ruta=? AND version=? AND rol=?",
+                                                  (ruta_modelo, version, rol)).fetchone()[0])
+        self.conexion.commit()
+        self._cerrojo = threading.Lock()
+        self._scores, self._lotes = [], []
+        # Resumen de esta ejecución: por modelo [correos, acuerdos, suma |Δp|, segundos]
+        self.resumen = [[0, 0, 0.0, 0.0] for _ in self.modelos]
+        self.reutilizados = 0  # Correos con el score del campeón ya conocido (caché por conversación)
+
+    def puntuar(self, df, huellas, campeon=None):
+        """Probabilidades del campeón para el lote; registra las de todos los modelos.
+        `campeon`: sus probabilidades si ya se conocen (score reutilizado de la caché por
+        conversación): solo se evalúan los retadores, que así ven también esos correos."""
+        matrices = {}
+        probs, tiempos = [], []
+        for i, (preprocesador, clasificador, huella) in enumerate(self.partes):
+            if i == 0 and campeon is not None:
+                probs.append(np.asarray(campeon, dtype=float))
+                tiempos.append(None)
+                continue
+            inicio = time.perf_counter()
+            if preprocesador is None:
+                p = clasificador.predict_proba(df)[:, 1]
+            else:
+                if huella not in matrices: matrices[huella] = preprocesador.transform(df)
+                p = clasificador.predict_proba(matrices[huella])[:, 1]
+            tiempos.append(time.perf_counter() - inicio)
+            probs.append(p)
+
+        ts = int(time.time())
+        cat_campeon = [categoria(p, *self.umbrales) for p in probs[0]]
+        with self._cerrojo:
+            primera = self.evaluaciones
+            self.evaluaciones += len(huellas)
+            for i, (p_modelo, segundos) in enumerate(zip(probs, tiempos)):
+                modelo = self.ids[i]
+                self._scores.extend((ts, h, modelo, float(p), self.ejecucion, primera + j)
+                                    for j, (h, p) in enumerate(zip(huellas, p_modelo)))
+                if segundos is None: continue  # Campeón reutilizado: sin latencia que registrar
+                self._lotes.append((ts, modelo, len(huellas), segundos))
+                r = self.resumen[i]
+                r[0] += len(huellas)
+                r[1] += sum(categoria(p, *self.umbrales) == c for p, c in zip(p_modelo, cat_campeon))
+                r[2] += float(abs(p_modelo - probs[0]).sum())
+                r[3] += segundos
+            if campeon is not None: self.reutilizados += len(huellas)
+            if len(self._scores) >= FILAS_POR_ESCRITURA: self._volcar()
+        return probs[0]
+
+    def _volcar(self):
+        self.conexion.executemany("INSERT INTO scores (ts, huella, modelo, prob, ejecucion, evaluacion) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)", self._scores)
+        self.conexion.executemany("INSERT INTO lotes VALUES (?, ?, ?, ?)", self._lotes)
+        self.conexion.commit()
+        self._scores, self._lotes = [], []
+
+    def cerrar(self):
+        with self._cerrojo:
+            self._volcar()
+        self.conexion.close()
+        n_campeon, _, _, seg_campeon = self.resumen[0]
+        n = self.resumen[1][0]
+        if not n: return
+        reutilizados = f" ({self.reutilizados} con score del campeón de la caché por conversación)" \
+            if self.reutilizados else ""
+        print(f"🥊 Sombra: {len(self.modelos) - 1} retador(es) sobre {n} correos{reutilizados} | campeón "
+              f"{seg_campeon / max(n_campeon, 1) * 1e6:.0f} µs/correo ({self.ruta})")
+        for (ruta, version, _, _), (n, acuerdos, delta, segundos) in zip(self.modelos[1:], self.resumen[1:]):
+            print(f"   {os.path.basename(ruta)} [{version}]: acuerdo {acuerdos / n:.1%} | "
+                  f"Δp medio {delta / n:.3f} | +{segundos / n * 1e6:.0f} µs/correo")
+
+
+def resumen(ruta=ARCHIVO_SOMBRA, por_defecto=UMBRALES_POR_DEFECTO):
+    """Comparación offline de todo lo registrado: acuerdo de categoría y latencia por retador.
+    Cada correo se categoriza con los umbrales de la versión del campeón que lo puntuó
+    (calibrados si existen), los mismos que usó la vigilancia."""
+    conexion = _abrir(ruta)
+    umbrales = {id_: threshold_calibration.cargar_umbrales(ruta_modelo, version, por_defecto)[:2]
+                for id_, ruta_modelo, version in conexion.execute(
+                    "SELECT id, ruta, version FROM modelos WHERE rol = 'campeon'")}
+    conexion.create_function("categoria", 2, lambda p, campeon: categoria(p, *umbrales[campeon]))
+    filas = conexion.execute("""
+        SELECT m.ruta, m.version, COUNT(*), AVG(categoria(r.prob, mc.id) = categoria(c.prob, mc.id)),
+               AVG(ABS(r.prob - c.prob)),
+               (SELECT SUM(segundos) / SUM(n) FROM lotes WHERE modelo = m.id)
+        FROM scores r
+        JOIN modelos m ON m.id = r.modelo AND m.rol = 'retador'
+        JOIN scores c ON c.ejecucion = r.ejecucion AND c.evaluacion = r.evaluacion
+        JOIN modelos mc ON mc.id = c.modelo AND mc.rol = 'campeon'
+        GROUP BY m.id ORDER BY m.id""").fetchall()
+    conexion.close()
+    return filas
+
+
+if __name__ == "__main__":
+    for ruta, version, n, acuerdo, delta, seg in resumen(sys.argv[1] if len(sys.argv) > 1 else ARCHIVO_SOMBRA):
+        print(f"{ruta} [{version}]: {n} correos | acuerdo {acuerdo:.1%} | Δp medio {delta:.3f} | "
+              f"{(seg or 0) * 1e6:.0f} µs/correo")
@@ -0,0 +1,177 @@
+"""
+Vectorización de asuntos con memo LRU.
+
+Los asuntos se repiten muchísimo ("RE: RE: FW: Reporte diario", notificaciones de
+sistema, reportes diarios). VectorizadorAsuntos normaliza el asunto (sin prefijos de
+respuesta/reenvío, espacios colapsados) y guarda el vector disperso de cada asunto
+normalizado en un memo acotado: un asunto ya visto no se vuelve a tokenizar ni a
+generar bigramas. Es un transformador de sklearn, así que viaja dentro del Pipeline
+del modelo: lo usan igual el entrenamiento (02) y el scoring por lotes (03).
+
+El ajuste de TF-IDF también aprovecha la repetición: se cuenta cada asunto único una
+vez y se pondera por su frecuencia, con el mismo vocabulario e idf que TfidfVectorizer
+sobre el corpus completo.
+"""
+import functools
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+TAMANO_MEMO = 50000  # Asuntos normalizados distintos retenidos (LRU)
+PREFIJOS_RESPUESTA = re.compile(r'^\s*((re|rv|fw|fwd|tr|rif)\s*:\s*)+', re.IGNORECASE)
+
+
+def normalizar_asunto(asunto):
+    """'RE: RE:  FW: Reporte   diario' -> 'Reporte diario'"""
+    return " ".join(PREFIJOS_RESPUESTA.sub("", asunto or "").split())
+
+
+@functools.lru_cache(maxsize=TAMANO_MEMO)
+def _clave(asunto, minusculas):
+    normalizado = normalizar_asunto(asunto)
+    return normalizado.lower() if minusculas else normalizado
+
+
+class VectorizadorAsuntos(BaseEstimator, TransformerMixin):
+    def __init__(self, vectorizador=None, tamano_memo=TAMANO_MEMO):
+        self.vectorizador = vectorizador
+        self.tamano_memo = tamano_memo
+
+    # --- Ajuste ---------------------------------------------------------------
+    def fit(self, X, y=None):
+        base = self.vectorizador if self.vectorizador is not None else TfidfVectorizer()
+        claves, unicos = pd.factorize(pd.Series(self._normalizar(X), dtype=object))
+        pesos = np.bincount(claves, minlength=len(unicos))
+        if isinstance(base, TfidfVectorizer):
+            self.vectorizador_ = _ajustar_tfidf_ponderado(base, list(unicos), pesos)
+        else:
+            # HashingVectorizer y similares: sin estado (o sin atajo), ajuste normal
+            self.vectorizador_ = clone(base).fit(list(unicos))
+        self._reiniciar_memo()
+        return self
+
+    def get_feature_names_out(self, input_features=None):
+        return self.vectorizador_.get_feature_names_out()
+
+    # --- Transformación con memo -----------------------------------------------
+    def transform(self, X):
+        self._preparar()
+        asuntos = self._normalizar(X)
+        filas = [None] * len(asuntos)
+        faltan = {}  # asunto normalizado -> posiciones en el lote
+        with self._cerrojo:
+            for i, asunto in enumerate(asuntos):
+                fila = self._memo.get(asunto)
+                if fila is None:
+                    faltan.setdefault(asunto, []).append(i)
+                else:
+                    self._memo.move_to_end(asunto)
+                    filas[i] = fila
+        if faltan:
+            nuevas = sparse.csr_matrix(self.vectorizador_.transform(list(faltan)))
+            with self._cerrojo:
+                for j, (asunto, posiciones) in enumerate(faltan.items()):
+                    inicio, fin = nuevas.indptr[j], nuevas.indptr[j + 1]
+                    fila = self._memo[asunto] = (nuevas.indices[inicio:fin].copy(), nuevas.data[inicio:fin].copy())
+                    for i in posiciones: filas[i] = fila
+                while len(self._memo) > self.tamano_memo: self._memo.popitem(last=False)
+        with self._cerrojo:
+            self.filas += len(asuntos)
+            self.vectorizados += len(faltan)
+
+        n_columnas = (len(self.vectorizador_.vocabulary_) if hasattr(self.vectorizador_, "vocabulary_")
+                      else self.vectorizador_.n_features)
+        if not filas: return sparse.csr_matrix((0, n_columnas))
+        indptr = np.zeros(len(filas) + 1, dtype=np.int64)
+        np.cumsum([len(f[0]) for f in filas], out=indptr[1:])
+        return sparse.csr_matrix((np.concatenate([f[1] for f in filas]), np.concatenate([f[0] for f in filas]),
+                                  indptr), shape=(len(filas), n_columnas))
+
+    def _normalizar(self, X):
+        valores = X.iloc[:, 0] if isinstance(X, pd.DataFrame) else X
+        valores = valores.tolist() if hasattr(valores, "tolist") else list(valores)
+        # Si el vectorizador pasa a minúsculas, "Reporte" y "REPORTE" comparten entrada del memo
+        minusculas = bool(getattr(getattr(self, "vectorizador_", self.vectorizador), "lowercase", False))
+        return [_clave(a if isinstance(a, str) else ("" if a is None or a != a else str(a)), minusculas)
+                for a in valores]
+
+    # --- Memo y métricas -------------------------------------------------------
+    def _preparar(self):
+        if getattr(self, "_memo", None) is None: self._reiniciar_memo()
+
+    def _reiniciar_memo(self):
+        self._memo = OrderedDict()  # asunto normalizado -> (indices, datos) de la fila CSR
+        self._cerrojo = threading.Lock()
+        self.filas = 0         # Filas transformadas
+        self.vectorizados = 0  # Asuntos tokenizados de cero (el resto salió del memo o del mismo lote)
+
+    def __getstate__(self):
+        # El memo y el cerrojo no viajan en el joblib del modelo
+        estado = self.__dict__.copy()
+        for campo in ("_memo", "_cerrojo", "filas", "vectorizados"): estado.pop(campo, None)
+        return estado
+
+    def estadisticas(self):
+        self._preparar()
+        return {"filas": self.filas, "vectorizados": self.vectorizados, "memo": len(self._memo),
+                "tasa_aciertos": 1 - self.vectorizados / self.filas if self.filas else 0.0}
+
+    def resumen(self, desde=None):
+        """`desde`: estadisticas() tomadas antes, para informar solo lo ocurrido en esta ejecución"""
+        e = self.estadisticas()
+        if desde is not None:
+            e["filas"] -= desde["filas"]
+            e["vectorizados"] -= desde["vectorizados"]
+            e["tasa_aciertos"] = 1 - e["vectorizados"] / e["filas"] if e["filas"] else 0.0
+        return (f"🔤 Memo de asuntos: {e['tasa_aciertos']:.0%} de {e['filas']} filas sin re-tokenizar | "
+                f"{e['vectorizados']} vectorizados | {e['memo']}/{self.tamano_memo} en memo")
+
+
+def _ajustar_tfidf_ponderado(base, unicos, pesos):
+    """Igual que TfidfVectorizer.fit sobre el corpus completo, contando cada asunto único una vez.
+    Frecuencias de término y de documento = conteos de los únicos ponderados por repetición."""
+    tfidf = clone(base)
+    parametros = {k: v for k, v in tfidf.get_params().items() if k in CountVectorizer().get_params()}
+    conteo = CountVectorizer(**{**parametros, "max_features": None, "min_df": 1, "max_df": 1.0})
+    X = conteo.fit_transform(unicos).tocsc()
+    terminos = conteo.get_feature_names_out()
+    tf = np.asarray(X.T @ pesos).ravel()
+    df = np.asarray((X > 0).T @ pesos).ravel()
+
+    n_docs = int(pesos.sum())
+    maximo = tfidf.max_df if isinstance(tfidf.max_df, int) else tfidf.max_df * n_docs
+    minimo = tfidf.min_df if isinstance(tfidf.min_df, int) else tfidf.min_df * n_docs
+    mascara = (df <= maximo) & (df >= minimo)
+    if tfidf.max_features is not None and mascara.sum() > tfidf.max_features:
+        # Mismo desempate que CountVectorizer._limit_features (argsort sobre el vocabulario ordenado)
+        elegidos = np.where(mascara)[0][(-tf[mascara]).argsort()[:tfidf.max_features]]
+        mascara = np.zeros(len(tf), dtype=bool)
+        mascara[elegidos] = True
+
+    tfidf.vocabulary_ = {t: i for i, t in enumerate(terminos[mascara])}
+    tfidf.fixed_vocabulary_ = False
+    tfidf._tfidf = TfidfTransformer(norm=tfidf.norm, use_idf=tfidf.use_idf, smooth_idf=tfidf.smooth_idf,
+                                    sublinear_tf=tfidf.sublinear_tf)
+    tfidf._tfidf.n_features_in_ = int(mascara.sum())
+    if tfidf.use_idf:
+        df = df[mascara].astype(np.float64)
+        suavizado = int(tfidf.smooth_idf)
+        tfidf.idf_ = np.log((n_docs + suavizado) / (df + suavizado)) + 1
+    return tfidf
+
+
+def buscar_memo(modelo):
+    """El VectorizadorAsuntos dentro de un Pipeline / ColumnTransformer, o None (modelos antiguos)"""
+    if isinstance(modelo, VectorizadorAsuntos): return modelo
+    hijos = [paso for _, paso in getattr(modelo, "steps", [])] + \
+            [trans for _, trans, _ in getattr(modelo, "transformers_", [])]
+    for hijo in hijos:
+        encontrado = buscar_memo(hijo)
+        if encontrado is not None: return encontrado
+    return None
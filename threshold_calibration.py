@@ -0,0 +1,192 @@
+"""
+Calibración de umbrales sobre probabilidades out-of-fold.
+
+El entrenador guarda junto al modelo las probabilidades out-of-fold (<modelo>_oof.npz):
+cada fila puntuada por un modelo que no la vio. Aquí se barren todos los umbrales en
+una sola pasada vectorizada (un orden + sumas acumuladas) para obtener precisión,
+recall y volumen de alertas por umbral. Los umbrales elegidos se guardan con la
+versión del modelo en <modelo>_umbrales.json; la vigilancia y el backfill los leen al
+cargar el modelo y, si no corresponden a esa versión, usan sus constantes.
+
+Uso: python threshold_calibration.py [--modelo RUTA] [--precision-rojo 0.8] [--recall-amarillo 0.9]
+                                     [--rojo U --amarillo U] [--curvas curvas_umbral.csv] [--sin-guardar]
+"""
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+ARCHIVO_MODELO = "cerebro_priorizacion.joblib"
+PRECISION_OBJETIVO_ROJO = 0.80   # Urgente: el umbral más bajo con esta precisión
+RECALL_OBJETIVO_AMARILLO = 0.90  # Revisar: el umbral más alto que conserva este recall
+PASO_CURVAS = 0.01
+
+
+def ruta_oof(ruta_modelo):
+    return os.path.splitext(ruta_modelo)[0] + "_oof.npz"
+
+
+def ruta_umbrales(ruta_modelo):
+    return os.path.splitext(ruta_modelo)[0] + "_umbrales.json"
+
+
+def version_modelo(ruta):
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""): h.update(bloque)
+    return h.hexdigest()[:12]
+
+
+# --- Probabilidades out-of-fold ----------------------------------------------
+def guardar_oof(ruta_modelo, y, prob, dias=0):
+    """`dias`: días cubiertos por el dataset, para expresar el volumen de alertas por día"""
+    np.savez_compressed(ruta_oof(ruta_modelo), y=np.asarray(y, dtype=np.int8),
+                        prob=np.asarray(prob, dtype=np.float32), dias=dias,
+                        version=version_modelo(ruta_modelo))
+
+
+def cargar_oof(ruta_modelo):
+    """(y, prob, dias) del modelo actual, o None si faltan o son de otra versión"""
+    try:
+        datos = np.load(ruta_oof(ruta_modelo))
+        if str(datos["version"]) != version_modelo(ruta_modelo): return None
+        return datos["y"], datos["prob"], float(datos["dias"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+# --- Barrido vectorizado -------------------------------------------------------
+def barrer(y, prob, umbrales=None, dias=0):
+    """Métricas para cada umbral u (alerta si prob >= u) en una pasada sobre los datos:
+    cada fila cae en el tramo del mayor umbral que alcanza y las sumas acumuladas desde
+    el umbral más alto dan alertas y aciertos de todos los umbrales a la vez."""
+    if umbrales is None: umbrales = np.round(np.arange(0, 1 + PASO_CURVAS / 2, PASO_CURVAS), 6)
+    umbrales = np.asarray(umbrales, dtype=np.float64)
+    orden = np.argsort(umbrales, kind="stable")
+    tramo = np.searchsorted(umbrales[orden], np.asarray(prob, dtype=np.float64), side="right")
+    n_tramos = len(umbrales) + 1
+    alertas_ord = np.cumsum(np.bincount(tramo, minlength=n_tramos)[::-1])[::-1][1:]
+    tp_ord = np.cumsum(np.bincount(tramo, weights=y, minlength=n_tramos)[::-1])[::-1][1:]
+    alertas, tp = np.empty_like(alertas_ord), np.empty_like(tp_ord)
+    alertas[orden], tp[orden] = alertas_ord, tp_ord
+    positivos = max(int(np.sum(y)), 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(alertas > 0, tp / alertas, 1.0)
+    curvas = {"umbral": umbrales, "precision": precision, "recall": tp / positivos,
+              "alertas": alertas, "fraccion_alertas": alertas / max(len(tramo), 1)}
+    if dias: curvas["alertas_dia"] = alertas / dias
+    return curvas
+
+
+def elegir(y, prob, precision_rojo=PRECISION_OBJETIVO_ROJO, recall_amarillo=RECALL_OBJETIVO_AMARILLO):
+    """Umbrales a resolución completa (cada probabilidad distinta es un candidato); None si no hay"""
+    c = barrer(y, prob, np.unique(prob))
+    validos = (c["precision"] >= precision_rojo) & (c["alertas"] > 0)
+    rojo = float(c["umbral"][validos].min()) if validos.any() else None
+    con_recall = c["recall"] >= recall_amarillo
+    amarillo = float(c["umbral"][con_recall].max()) if con_recall.any() else None
+    if rojo is not None and amarillo is not None: amarillo = min(amarillo, rojo)
+    return rojo, amarillo
+
+
+def _punto(y, prob, umbral, dias):
+    c = barrer(y, prob, [umbral], dias)
+    return {k: float(v[0]) for k, v in c.items() if k != "umbral"}
+
+
+# --- Umbrales por versión de modelo -------------------------------------------------
+def guardar_umbrales(ruta_modelo, rojo, amarillo, criterio, y=None, prob=None, dias=0):
+    datos = {"version_modelo": version_modelo(ruta_modelo), "umbral_rojo": rojo, "umbral_amarillo": amarillo,
+             "criterio": criterio, "calibrado": datetime.datetime.now().isoformat(timespec="seconds")}
+    if y is not None:
+        datos["metricas"] = {"rojo": _punto(y, prob, rojo, dias), "amarillo": _punto(y, prob, amarillo, dias)}
+    tmp = ruta_umbrales(ruta_modelo) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, ruta_umbrales(ruta_modelo))
+    return datos
+
+
+def cargar_umbrales(ruta_modelo, version, por_defecto):
+    """(rojo, amarillo, origen): los calibrados para esta versión o `por_defecto`"""
+    try:
+        with open(ruta_umbrales(ruta_modelo), encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos.get("version_modelo") == version:
+            return float(datos["umbral_rojo"]), float(datos["umbral_amarillo"]), f"calibrados {datos['calibrado']}"
+        return por_defecto[0], por_defecto[1], "por defecto: la calibración es de otra versión del modelo"
+    except (OSError, ValueError, KeyError):
+        return por_defecto[0], por_defecto[1], "por defecto"
+
+
+def recalibrar(ruta_modelo):
+    """Tras reentrenar: aplica a las nuevas OOF el mismo criterio de la calibración anterior"""
+    try:
+        with open(ruta_umbrales(ruta_modelo), encoding="utf-8") as f:
+            criterio = json.load(f)["criterio"]
+    except (OSError, ValueError, KeyError):
+        return None
+    oof = cargar_oof(ruta_modelo)
+    if oof is None: return None
+    y, prob, dias = oof
+    if "precision_rojo" in criterio:
+        rojo, amarillo = elegir(y, prob, criterio["precision_rojo"], criterio["recall_amarillo"])
+        if rojo is None or amarillo is None:
+            print(f"[WARN] El nuevo modelo no cumple el criterio de calibración {criterio}: "
+                  "se usarán los umbrales por defecto hasta recalibrar.")
+            return None
+    else:
+        rojo, amarillo = criterio["rojo"], criterio["amarillo"]
+    return guardar_umbrales(ruta_modelo, rojo, amarillo, criterio, y, prob, dias)
+
+
+# --- CLI ---------------------------------------------------------------------
+def _argumento(nombre, tipo=float):
+    return tipo(sys.argv[sys.argv.index(nombre) + 1]) if nombre in sys.argv else None
+
+
+def main():
+    ruta_modelo = _argumento("--modelo", str) or ARCHIVO_MODELO
+    oof = cargar_oof(ruta_modelo)
+    if oof is None:
+        print(f"❌ No hay probabilidades out-of-fold para la versión actual de {ruta_modelo}: reentrena el modelo.")
+        return
+    y, prob, dias = oof
+    print(f"--- 🎚️ CALIBRACIÓN DE UMBRALES ({len(y)} correos out-of-fold, {int(y.sum())} urgentes) ---")
+
+    curvas = barrer(y, prob, dias=dias)
+    ruta_curvas = _argumento("--curvas", str)
+    if ruta_curvas:
+        columnas = list(curvas)
+        np.savetxt(ruta_curvas, np.column_stack([curvas[c] for c in columnas]), delimiter="|",
+                   header="|".join(columnas), comments="", fmt="%.6g")
+        print(f"📈 Curvas guardadas en {ruta_curvas}")
+    print(f"{'umbral':>6} | {'precisión':>9} | {'recall':>6} | {'alertas':>7}" + (" | por día" if dias else ""))
+    for i in range(0, len(curvas["umbral"]), max(int(round(0.05 / PASO_CURVAS)), 1)):
+        print(f"{curvas['umbral'][i]:>6.2f} | {curvas['precision'][i]:>9.1%} | {curvas['recall'][i]:>6.1%} | "
+              f"{curvas['alertas'][i]:>7}" + (f" | {curvas['alertas_dia'][i]:.1f}" if dias else ""))
+
+    if _argumento("--rojo") is not None:
+        rojo, amarillo = _argumento("--rojo"), _argumento("--amarillo") or _argumento("--rojo")
+        criterio = {"rojo": rojo, "amarillo": amarillo}
+    else:
+        criterio = {"precision_rojo": _argumento("--precision-rojo") or PRECISION_OBJETIVO_ROJO,
+                    "recall_amarillo": _argumento("--recall-amarillo") or RECALL_OBJETIVO_AMARILLO}
+        rojo, amarillo = elegir(y, prob, criterio["precision_rojo"], criterio["recall_amarillo"])
+        if rojo is None or amarillo is None:
+            print("⚠️ Ningún umbral cumple el criterio: ajusta --precision-rojo / --recall-amarillo.")
+            return
+    for nombre, umbral in (("🔴 Urgente", rojo), ("🟠 Revisar", amarillo)):
+        m = _punto(y, prob, umbral, dias)
+        print(f"{nombre} ≥ {umbral:.3f}: precisión {m['precision']:.1%} | recall {m['recall']:.1%} | "
+              f"{m['fraccion_alertas']:.1%} de los correos" + (f" ({m['alertas_dia']:.1f}/día)" if dias else ""))
+    if "--sin-guardar" in sys.argv: return
+    guardar_umbrales(ruta_modelo, rojo, amarillo, criterio, y, prob, dias)
+    print(f"✅ Umbrales guardados en {ruta_umbrales(ruta_modelo)}: la vigilancia los usa desde su próxima carga.")
+
+
+if __name__ == "__main__":
+    main()